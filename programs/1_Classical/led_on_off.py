@@ -16,34 +16,36 @@ Options: python chatting.py
 
         -h, --help       show this help message and exit
         --serial SERIAL  Sets the serial address of the Arduino
+        --no-reset       Opens the serial port without resetting the Arduino (DTR kept low)
 
 Author: JH 2022
 
 Version: 1.0
 '''
 
-import serial
 import sys
-import time
+import pathlib
 import argparse # For running the script with options
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import serial_transport as st
+
 # Obtain device location
 my_parser = argparse.ArgumentParser()
 my_parser.add_argument('--serial', action='store', type=str, required=True, help='Sets the serial address of the Arduino')
+my_parser.add_argument('--no-reset', action='store_true', help='Opens the serial port without resetting the Arduino (DTR kept low)')
 args = my_parser.parse_args()
 serial_addr = vars(args).get('serial')
+no_reset = vars(args).get('no_reset') # Keeps the Arduino running (no auto-reset)
 
 # Other parameters declarations
 baudrate = 38400      # Default in Arduino
 timeout = 0.1        # Serial timeout (in s).
 
-device = serial.Serial(serial_addr, baudrate, timeout=timeout)
-
-# Wait until the serial is ready
-# Note: for some computer models, particularly MacOS, the program cannot
-# talk to the serial directly after openin. Need to wait 1-2 second.
+# Wait until the Arduino is ready: it resets when the port is opened, and
+# answers *IDN? once it has booted (instead of a fixed 2 s wait)
 print("Opening the serial port...")
-time.sleep(2)
+device = st.open_ready(serial_addr, baudrate, timeout=timeout, reset=not no_reset)
 print("Done\n")
 
 print("LED basic on/off program")
@@ -57,9 +59,8 @@ while True:
         # Convert user input to lower case and check for a match
         if x.lower() == "ledon" or x.lower() == "ledoff":
             device.write(x.encode())
-            time.sleep(0.1)
-            # Read response, convert bits to string, remove EOL characters
-            response = device.readlines()[0].decode().strip()
+            # Block until the response arrives (without the EOL characters)
+            response = device.read_reply()
             print(response)
             continue
         else:
@@ -0,0 +1,64 @@
+"""
+Description: Automatic H offset of Bob's polariser (Auto Offset in runReceiver.py), with
+Alice's laser on and at H. Instead of a full scan read by eye, the motor is scanned
+coarsely over half a turn (the power repeats every 180 degrees), Malus' law is fitted to
+it (malus_fit.py), and the angles around the fitted minimum are scanned finely, where the
+relative change of power with the angle is largest. The fit of all the points gives the
+offset (the angle of maximum power, Bob's polariser parallel to Alice's), which is
+written into the Arduino (SETHOF), and the visibility. About 20 motor moves, with the
+SCAN command (see MotorControl.scan).
+
+Usage: Imported by runReceiver.py (runs on the motor thread).
+
+	result = find_offset(motor)     # {'offset', 'visibility', 'visibility_error', 'fit', 'angles', 'volts'}
+
+Author: Qcumber 2026
+
+Version: 1.0
+"""
+import numpy as np
+
+import malus_fit as mf
+
+COARSE_STEP = 20 # Coarse scan over 0 - 180 degrees, in steps of this (in degrees)
+FINE_SPAN = 10 # Fine scan from the fitted minimum - FINE_SPAN to + FINE_SPAN (in degrees)
+FINE_STEP = 2 # Steps of the fine scan (in degrees)
+
+def find_offset(motor, point=None, abort=None, background=0.0, coarse_step=COARSE_STEP, fine_span=FINE_SPAN, fine_step=FINE_STEP):
+	"""
+	Finds the H offset of motor (MotorControl) and sets it (SETHOF), then moves to H.
+	point(angle, voltage) is called for every measured point (e.g. to plot it), and the
+	search stops when abort() is true. background (in V) is subtracted for the visibility.
+	Returns a dict with the offset, the fitted visibility (and its uncertainty), the fit
+	and the measured points, or None if it was aborted.
+	"""
+	angles, volts = [], []
+	def measure(start, stop, step):
+		scan = motor.scan(start, stop, step)
+		for angle, voltage in scan:
+			angles.append(angle)
+			volts.append(voltage)
+			if point is not None:
+				point(angle, voltage)
+			if abort is not None and abort():
+				break
+		scan.close() # Stops the scan on the Arduino if it was aborted
+
+	measure(0, 180 - coarse_step, coarse_step)
+	if abort is not None and abort():
+		return None
+	coarse = mf.fit(angles, volts, background)
+	# Around the minimum (kept within the motor range, 0 - 360 degrees)
+	minimum = (coarse['phase'] + 90) % 180
+	if minimum < fine_span:
+		minimum += 180
+	centre = int(round(minimum))
+	measure(centre - fine_span, centre + fine_span, fine_step)
+	if abort is not None and abort():
+		return None
+
+	result = mf.fit(angles, volts, background)
+	offset = int(round(result['phase'])) % 180
+	motor.batch().set_offset(offset).set_pol(0).execute()
+	return {'offset': offset, 'visibility': result['visibility'], 'visibility_error': result['visibility_error'], 'fit': result,
+		'angles': np.array(angles), 'volts': np.array(volts)}
@@ -0,0 +1,92 @@
+"""
+Description: Fit of Malus' law to the power measured behind a polariser. The power through
+Bob's polariser, with Alice's laser polarised, is
+
+	V(angle) = background + mean + amplitude * cos(2 * (angle - phase))
+
+with the maximum at phase and the minimum 90 degrees away. The background (the reading with
+Alice's laser off, as in technical_testing/QWP visibility test.py) is subtracted first. The
+model is linear in (1, cos 2 angle, sin 2 angle), so the least squares fit is a single
+np.linalg.lstsq and needs no starting values. The visibility is amplitude / mean, i.e.
+(max - min) / (max + min) of the fitted curve without the background.
+
+Several samples per angle can be given (repeated angles, or one row of samples per angle):
+all of them are fitted at once, which is the same as fitting their averages weighted by
+their number. Spikes and dropouts are rejected: the points further from the fit than
+CLIP times the robust spread of the residuals (median absolute deviation) are left out,
+and the fit is repeated until no more points are rejected. The uncertainties come from
+the covariance of the fit, with the spread of the residuals as the noise.
+
+Usage: Imported by auto_offset.py and runReceiver.py.
+
+	result = fit(angles, volts, background)    # {'visibility', 'visibility_error', 'phase', ...}
+	result = fit(angles, samples)               # samples: one row of readings per angle
+	volts = model(angles, result)
+
+Author: Qcumber 2026
+
+Version: 1.0
+"""
+import numpy as np
+
+CLIP = 4 # Points further from the fit than this many robust standard deviations are outliers
+MAX_ROUNDS = 5 # Rounds of outlier rejection
+
+def fit(angles, volts, background=0.0, clip=CLIP):
+	"""
+	Least squares fit of Malus' law to volts measured at angles (in degrees). volts is one
+	reading per angle, or one row of readings per angle. Returns a dict with the mean,
+	amplitude, phase (angle of the maximum, 0 - 180), visibility, their uncertainties
+	(visibility_error, phase_error), the rms residual, and the points kept (mask) and
+	rejected (number). clip=None keeps every point.
+	"""
+	volts = np.asarray(volts, dtype=float)
+	angles = np.asarray(angles, dtype=float)
+	if volts.ndim > 1: # One row of samples per angle
+		angles = np.repeat(angles, volts.shape[1])
+	volts = volts.ravel() - background
+	if len(volts) < 3:
+		raise ValueError('Malus fit needs at least 3 points')
+	twice = np.radians(angles) * 2
+	design = np.c_[np.ones_like(twice), np.cos(twice), np.sin(twice)]
+
+	kept = np.isfinite(volts)
+	for rounds in range(MAX_ROUNDS):
+		params, *_ = np.linalg.lstsq(design[kept], volts[kept], rcond=None)
+		residuals = volts - design @ params
+		if clip is None or kept.sum() <= 4:
+			break
+		deviation = np.abs(residuals - np.median(residuals[kept]))
+		spread = 1.4826 * np.median(deviation[kept]) # Standard deviation of normal noise
+		outside = deviation > clip * spread if spread > 0 else np.zeros_like(kept)
+		if not (kept & outside).any():
+			break
+		kept = kept & ~outside
+		if kept.sum() < 3:
+			raise ValueError('Malus fit: too many outliers')
+	else: # Still rejecting after MAX_ROUNDS: fit the points that are kept
+		params, *_ = np.linalg.lstsq(design[kept], volts[kept], rcond=None)
+		residuals = volts - design @ params
+
+	mean, c, s = params
+	amplitude = np.hypot(c, s)
+	n = int(kept.sum())
+	rms = np.sqrt(np.mean(residuals[kept]**2))
+	# Covariance of (mean, c, s), and the errors propagated to the visibility and the phase
+	if n > 3 and amplitude > 0 and mean > 0:
+		covariance = np.sum(residuals[kept]**2) / (n - 3) * np.linalg.pinv(design[kept].T @ design[kept])
+		grad_v = np.array([-amplitude / mean**2, c / (amplitude * mean), s / (amplitude * mean)])
+		grad_p = np.degrees(np.array([0, -s, c]) / (2 * amplitude**2))
+		visibility_error = np.sqrt(grad_v @ covariance @ grad_v)
+		phase_error = np.sqrt(grad_p @ covariance @ grad_p)
+	else:
+		visibility_error = phase_error = np.nan
+	return {'mean': mean, 'amplitude': amplitude, 'phase': (np.degrees(np.arctan2(s, c)) / 2 + 180) % 180,
+		'visibility': amplitude / mean if mean > 0 else 0.0, 'visibility_error': visibility_error,
+		'phase_error': phase_error, 'background': background, 'rms': rms, 'kept': kept,
+		'rejected': len(volts) - n}
+
+def model(angles, result):
+	"""The fitted power at angles (in degrees), with the background"""
+	angles = np.radians(np.asarray(angles, dtype=float) - result['phase']) * 2
+	return result.get('background', 0.0) + result['mean'] + result['amplitude'] * np.cos(angles)
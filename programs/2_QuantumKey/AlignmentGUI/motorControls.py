@@ -1,6 +1,27 @@
 """
-Description: Package for servo motor controls. Python wrapper for Arduino serial commands 
-to talk to the motor. Contains a single 'MotorControl' class.
+Description: Package for servo motor controls. Python wrapper for Arduino serial commands
+to talk to the motor. Contains the 'MotorControl' class, 'MotorBatch' to send several
+commands in one round trip, and 'MotorWorker' to run them on a thread of their own:
+
+	angle, offset = motor.batch().set_pol(2).get_angle().get_offset().execute()
+
+The commands of a batch are written together (as many as fit in the Arduino's 64 byte
+serial buffer) and the replies are read in order, with one deadline for the batch. A write
+that is overwritten later in the same batch (e.g. SETANG followed by SETPOL) is dropped,
+and the offset, threshold and polarisation are remembered, so asking for them again (or
+setting them to the value they already have) needs no round trip.
+
+MotorWorker runs a MotorControl on its own thread: the commands are queued, run in order,
+and every call returns a concurrent.futures.Future at once (the GUIs never wait for the
+motor). A command queued with a key replaces the one with the same key that has not
+started yet, so e.g. quick angle changes only move the motor to the last one.
+
+	worker = MotorWorker(port)
+	future = worker.batch(lambda b: b.set_angle(90).get_angle(), key='angle')
+	future.add_done_callback(...)   # Or future.result(timeout)
+
+MotorControl.stream reads the sensor continuously with the STREAM command (2 byte frames,
+about 1900 readings/s at 38400 baud), decoded in bulk by decode_stream.
 
 Usage: Only for Alice and Bob. Slight modifications will need to be made to talk to Eve's motors.
 
@@ -8,100 +29,401 @@ Authors: Qcumber 2018, Xi Jie
 
 Version: 1.0
 """
-from turtle import write_docstringdict
-import serial
+import sys
 import time
+import queue
+import pathlib
+import threading
+import concurrent.futures
+import serial
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2])) # Shared modules in programs/
+import serial_transport as st
+
+rx_buffer = 64 # Serial receive buffer of the Arduino (in bytes): never more unanswered bytes than this
+cached = ('offset', 'threshold', 'pol') # Values only the program changes (kept in MotorControl.cache)
+
+def decode_stream(data):
+	"""
+	Decodes the frames sent by STREAM (1aaaaaaa 00000aaa, a the 10 bit reading). Returns the
+	readings and the bytes of an unfinished frame at the end, to be put in front of the next
+	data. Bytes that are not part of a frame (e.g. the OK at the end of the stream) are skipped.
+	"""
+	data = np.frombuffer(data, dtype=np.uint8)
+	heads = np.flatnonzero(data & 0x80)
+	rest = b''
+	if len(heads) and heads[-1] + 2 > len(data):
+		rest = data[heads[-1]:].tobytes()
+		heads = heads[:-1]
+	heads = heads[(data[heads + 1] & 0xF8) == 0] # The second byte only has 3 bits
+	return ((data[heads].astype(np.uint16) & 0x7F) << 3) | data[heads + 1], rest
+
+def to_int(value):
+	# The number the Arduino reads with atoi (None if it is not a number)
+	try:
+		return int(float(value))
+	except (TypeError, ValueError):
+		return None
+
+class MotorBatch(object):
+# Commands queued with the same methods as MotorControl, sent together by execute()
+
+	def __init__(self, motor):
+		self.motor = motor
+		self.ops = []
+		# Values known without asking: the cache of the motor, updated by the queued writes
+		self.known = dict(motor.cache)
+
+	def _queue(self, command, value=None, reads=(), writes=(), parse=None, known=None):
+		# known: the cached value this command reads (e.g. HOF? -> 'offset')
+		op = {'text': command + ' ' if value is None else f'{command} {value} ',
+			'reads': reads, 'writes': writes, 'parse': parse, 'sent': True, 'known': known,
+			'ok': command.startswith('SET'), 'result': None, 'effects': {}}
+		if known in self.known:
+			# A read of a value the Arduino cannot have changed
+			op['sent'] = False
+			op['result'] = self.known[known]
+		for param in writes:
+			# Drops an earlier write of the same parameter, if nothing reads it in between
+			for earlier in reversed(self.ops):
+				if param in earlier['reads']:
+					break
+				if earlier['sent'] and param in earlier['writes']:
+					earlier['sent'] = False
+					earlier['result'] = 'OK'
+					break
+		self.ops.append(op)
+		return self
+
+	def _set(self, command, value, param):
+		# Setter of a cached value (the Arduino prints it back as an integer)
+		value_int = to_int(value)
+		if value_int is not None and self.known.get(param) == str(value_int):
+			# Already set to this value: nothing to send
+			self.ops.append({'text': '', 'reads': (), 'writes': (), 'parse': None, 'sent': False,
+				'known': None, 'ok': True, 'result': 'OK', 'effects': {}})
+			return False
+		self._queue(command, value, writes=(param,))
+		self._update(param, None if value_int is None else str(value_int))
+		return True
+
+	def _update(self, param, value):
+		# The value of param after the last queued command (None: unknown)
+		self.ops[-1]['effects'][param] = value
+		if value is None:
+			self.known.pop(param, None)
+		else:
+			self.known[param] = value
+
+	def set_angle(self, angle):
+		#Sets the absolute angle of the motor stepper
+		self._queue('SETANG', angle, writes=('angle',))
+		self._update('pol', None)
+		return self
+
+	def get_angle(self):
+		#Gets the absolute angle of the motor stepper
+		return self._queue('ANG?', reads=('angle',))
+
+	def set_offset(self, angle):
+		#Sets the offset angle of the motor stepper at H polarisation
+		if self._set('SETHOF', angle, 'offset'):
+			self._update('pol', None) # POL? is relative to the offset
+		return self
+
+	def get_offset(self):
+		#Gets the offset angle of the motor stepper at H polarisation
+		return self._queue('HOF?', reads=('offset',), known='offset')
+
+	def set_pol(self, pol):
+		# Sets the polarization to 0,1,2,3 - H,D,V,A (the Arduino only reads the first character)
+		first = str(pol)[:1]
+		self._queue('SETPOL', pol, reads=('offset',), writes=('angle',))
+		self._update('pol', f"{int(first) if first in '0123' else 0}.00") # As printed by POL?
+		return self
+
+	def get_pol(self):
+		# Gets the polarization 0,1,2,3 - H,D,V,A
+		return self._queue('POL?', reads=('angle', 'offset'), known='pol')
+
+	def set_threshold(self, threshold):
+		#Sets the detector threshold from 0-1023. 200 is approx. 1V
+		self._set('SETTH', threshold, 'threshold')
+		return self
+
+	def get_threshold(self):
+		#Gets the detector threshold from 0-1023. 200 is approx. 1V
+		return self._queue('TH?', reads=('threshold',), known='threshold')
+
+	def get_voltage(self):
+		# Sensor voltage, depends on the angle (and on the laser)
+		return self._queue('VOLT?', reads=('angle', 'laser'),
+			parse=lambda reply: float(reply)/1024*5) # Convert from bit range to voltage (0-1023 --> 0-5V)
+
+	def power_on(self):
+		#Powers on laser
+		return self._queue('LASON', writes=('laser',))
+
+	def power_off(self):
+		#Powers off laser
+		return self._queue('LASOFF', writes=('laser',))
+
+	def execute(self, timeout=None):
+		"""
+		Sends the queued commands and returns the replies, one per queued command and in
+		the same order (getters: the reply, get_voltage: the voltage, setters: 'OK').
+		timeout is the deadline for the whole batch (reply_timeout per command by default).
+		"""
+		motor = self.motor
+		pending = [op for op in self.ops if op['sent']]
+		timeout = motor.reply_timeout * max(len(pending), 1) if timeout is None else timeout
+		deadline = time.monotonic() + timeout
+		try:
+			sent = 0
+			in_flight = 0 # Bytes sent and not answered yet
+			for op in pending:
+				# Writes as many commands as the Arduino can hold, in one go
+				chunk = ''
+				while sent < len(pending) and in_flight + len(pending[sent]['text']) <= rx_buffer:
+					chunk += pending[sent]['text']
+					in_flight += len(pending[sent]['text'])
+					sent += 1
+				if chunk:
+					motor.serial.write(chunk.encode())
+				reply = motor.serial.read_reply(max(deadline - time.monotonic(), 0))
+				# Setters end with OK (SETPOL may print "Input error detected." first)
+				while op['ok'] and reply != 'OK':
+					reply = motor.serial.read_reply(max(deadline - time.monotonic(), 0))
+				op['result'] = reply if op['parse'] is None else op['parse'](reply)
+				if op['known'] is not None:
+					op['effects'][op['known']] = reply
+				in_flight -= len(op['text'])
+		except BaseException:
+			# Unknown state: ask the Arduino again next time
+			motor.cache.clear()
+			motor.serial.reset_input_buffer()
+			raise
+		# What the Arduino has now, as read or set, in the order of the commands
+		for op in self.ops:
+			for param, value in op['effects'].items():
+				if value is None:
+					motor.cache.pop(param, None)
+				elif param in cached:
+					motor.cache[param] = value
+		return [op['result'] for op in self.ops]
 
 class MotorControl(object):
 # Module for communicating with the arduino analog pin
 
-	def __init__(self, port):
+	reply_timeout = 3 # Deadline for the Arduino replies (in s)
+	scan_timeout = 10 # Deadline for every point of a scan, including the move (in s)
+	stream_block = 128 # Bytes read at a time from STREAM (64 readings, about 33 ms)
+
+	def __init__(self, port, reset=True):
 		self.baudrate = 38400 # Arduino baudrate
-		self.serial = serial.Serial(port = port, baudrate = self.baudrate, timeout=3)
-		stuck_flag = True
-		while stuck_flag:
-			self.serial.write('ANG? '.encode())
-			if not self.serial.in_waiting:
-				# print("Stuck... Retrying")
-				if not self.serial.isOpen():
-					self.serial = serial.Serial(port, timeout=3)
-				continue
-			else:
-				time.sleep(1)
-				self.serial.reset_input_buffer()
-				print("Program Launched Successfully")
-				stuck_flag = not stuck_flag
+		# The Arduino resets when the port is opened, wait until it answers *IDN?
+		# (reset=False keeps DTR low, so an Arduino that is already running is not reset)
+		self.serial = st.open_ready(port, self.baudrate, timeout=0.1, reset=reset)
+		self.cache = {} # Offset, threshold and polarisation as last set or read (see MotorBatch)
+		print("Program Launched Successfully")
+
+	def batch(self):
+		# Commands sent in one go, e.g. motor.batch().get_angle().get_offset().execute()
+		return MotorBatch(self)
 
 	def close_port(self):
 		if self.serial.is_open:
 			self.serial.close()
 
 	def get_voltage(self):
-		self.serial.write('VOLT? '.encode())
-		voltage_bit = float(self.readline_fix()) # Remove /n, change str to float
-		voltage = voltage_bit/1024*5 # Convert from bit range to voltage (0-1023 --> 0-5V)
-		return voltage
+		return self.batch().get_voltage().execute()[0]
 
 	def set_angle(self,angle):
 		#Sets the absolute angle of the motor stepper
-		curr_offset = self.get_offset()
-		writeStr = 'SETANG ' + str(angle) + ' '
-		self.serial.write(writeStr.encode())
-		self.readline_fix()
+		self.batch().set_angle(angle).execute()
+
+	def scan(self, start, stop, step):
+		"""
+		Scans the motor from start to stop (in steps of step degrees) with the SCAN command,
+		and yields (angle, voltage) for every step as soon as the Arduino has measured it.
+		Closing the generator early stops the scan. An Arduino without SCAN (older firmware)
+		is scanned with SETANG and VOLT? instead.
+		"""
+		start, stop, step = int(start), int(stop), int(step)
+		self.cache.pop('pol', None) # The scan moves the motor
+		self.serial.reset_input_buffer()
+		self.serial.write(f'SCAN {start} {stop} {step} '.encode())
+		try:
+			while True:
+				line = self.serial.read_reply(self.scan_timeout)
+				if line == 'OK':
+					return
+				if line == 'Unknown command':
+					# The three values are unknown commands as well
+					for i in range(3):
+						self.readline_fix()
+					break
+				if line == 'Input error detected.':
+					continue # Step 0, scanned in steps of 1 degree
+				angle, voltage_bit = line.split()
+				yield float(angle), float(voltage_bit)/1024*5 # Convert from bit range to voltage
+		except GeneratorExit:
+			# Any command stops the scan, then the Arduino replies OK. If the scan has
+			# already ended, STOP runs on its own and replies OK as well, so *IDN? follows
+			# and everything up to its reply is discarded.
+			self.serial.write('STOP *IDN? '.encode())
+			identity = self.serial.identity or 'Quantum'
+			while self.serial.read_reply(self.scan_timeout) != identity:
+				pass
+			raise
+		# Older firmware: one angle at a time
+		sign = 1 if stop >= start else -1
+		for angle in range(start, stop + sign, max(abs(step), 1) * sign):
+			self.set_angle(angle)
+			yield float(angle), self.get_voltage()
+
+	def stream(self, interval=0):
+		"""
+		Streams the sensor with the STREAM command (a reading every interval ms, 0: as fast as
+		the serial line goes), and yields the voltages as NumPy arrays as they come. Closing the
+		generator stops the stream. An Arduino without STREAM (older firmware) is read with
+		VOLT?, one reading at a time.
+		"""
+		self.serial.reset_input_buffer()
+		self.serial.write(f'STREAM {int(interval)} '.encode())
+		line = self.serial.read_reply(self.reply_timeout)
+		if line == 'Unknown command':
+			self.readline_fix() # The interval is an unknown command as well
+			while True:
+				yield np.array([self.get_voltage()])
+		if line != 'OK':
+			raise serial.SerialException(f"Unexpected reply to STREAM: {line}")
+		rest = b'' # Unfinished frame
+		try:
+			while True:
+				data = self.serial.read_packet(self.stream_block, self.reply_timeout)
+				values, rest = decode_stream(rest + data)
+				yield values/1024*5 # Convert from bit range to voltage
+		except GeneratorExit:
+			# Any command stops the stream, then the Arduino replies OK after the last frames
+			self.serial.write('STOP '.encode())
+			data = rest
+			while not data.endswith(b'OK\r\n'):
+				data += self.serial.read_packet(self.stream_block, self.reply_timeout)
+			raise
 
 	def get_angle(self):
 		#Gets the absolute angle of the motor stepper
-		self.serial.write('ANG? '.encode())
-		angle = self.readline_fix()
-		return angle
+		return self.batch().get_angle().execute()[0]
 
 	def set_offset(self,angle):
 		#Sets the offset angle of the motor stepper at H polarisation
-		writeStr = 'SETHOF ' + str(angle) + ' '
-		self.serial.write(writeStr.encode())
-		self.readline_fix()
+		self.batch().set_offset(angle).execute()
 
 	def get_offset(self):
 		#Gets the offset angle of the motor stepper at H polarisation
-		self.serial.write('HOF? '.encode())
-		angle = self.readline_fix()
-		return angle
+		return self.batch().get_offset().execute()[0]
 
 	def set_pol(self, pol):
 		# Sets the polarization to 0,1,2,3 - H,D,V,A
-		writeStr = 'SETPOL ' + str(pol) + ' '
-		self.serial.write(writeStr.encode())
-		self.readline_fix()
+		self.batch().set_pol(pol).execute()
 
 	def get_pol(self):
 		# Gets the polarization 0,1,2,3 - H,D,V,A
-		self.serial.write('POL? '.encode())
-		pol = self.readline_fix()
-		return pol
+		return self.batch().get_pol().execute()[0]
 
 	def set_threshold(self,threshold):
 		#Sets the detector threshold from 0-1023. 200 is approx. 1V
-		writeStr = 'SETTH ' + str(threshold) + ' '
-		self.serial.write(writeStr.encode())
-		self.readline_fix()
+		self.batch().set_threshold(threshold).execute()
 
 	def get_threshold(self):
 		#Gets the detector threshold from 0-1023. 200 is approx. 1V
-		self.serial.write('TH? '.encode())
-		threshold = self.readline_fix()
-		return threshold
+		return self.batch().get_threshold().execute()[0]
 
 	def power_on(self):
 		#Powers on laser
-		self.serial.write("LASON ".encode())
-		self.readline_fix()
+		self.batch().power_on().execute()
 
 	def readline_fix(self):
-		while True:
-			if self.serial.in_waiting:
-				return self.serial.readline()[:-2].decode()
+		# Blocks until the reply line arrives (without the /r/n)
+		return self.serial.read_reply(self.reply_timeout)
 
 	def power_off(self):
 		#Powers off laser
-		self.serial.write("LASOFF ".encode())
-		self.readline_fix()
\ No newline at end of file
+		self.batch().power_off().execute()
+
+class MotorWorker(object):
+# A MotorControl on a thread of its own, the commands return Futures (see the description)
+
+	def __init__(self, port, reset=True, retries=3):
+		self.motor = None
+		self._error = None
+		self._queue = queue.Queue()
+		self._latest = {} # Key -> Future of the last command queued with this key
+		self._lock = threading.Lock()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+		self._thread.start()
+		# Opening the port is the first command (the Arduino boots in the meantime)
+		self.ready = self.submit(self._connect, port, reset, retries)
+
+	def _connect(self, port, reset, retries):
+		# A few attempts (e.g. the port is still held by a program that just closed it)
+		for attempt in range(retries):
+			try:
+				self.motor = MotorControl(port, reset)
+				return self.motor
+			except (serial.SerialException, OSError) as e:
+				self._error = e
+		raise self._error
+
+	def _motor(self):
+		if self.motor is None:
+			raise self._error or serial.SerialException("The motor is not connected")
+		return self.motor
+
+	def _run(self):
+		while True:
+			job = self._queue.get()
+			if job is None:
+				return
+			future, fn, args = job
+			if not future.set_running_or_notify_cancel():
+				continue # Replaced by a newer command
+			try:
+				future.set_result(fn(*args))
+			except BaseException as e:
+				future.set_exception(e)
+
+	def submit(self, fn, *args, key=None):
+		"""
+		Queues fn(*args) on the motor thread and returns its Future. A command with a key
+		replaces the queued command with the same key, if it has not started yet.
+		"""
+		future = concurrent.futures.Future()
+		with self._lock:
+			if key is not None:
+				earlier = self._latest.get(key)
+				if earlier is not None:
+					earlier.cancel() # Does nothing if it is already running
+				self._latest[key] = future
+			self._queue.put((future, fn, args))
+		return future
+
+	def call(self, name, *args, key=None):
+		# A MotorControl method, e.g. worker.call('set_threshold', 200)
+		return self.submit(lambda: getattr(self._motor(), name)(*args), key=key)
+
+	def batch(self, build, key=None):
+		# A batch, e.g. worker.batch(lambda b: b.get_angle().get_offset()), the Future gives the replies
+		return self.submit(lambda: build(self._motor().batch()).execute(), key=key)
+
+	def pending(self):
+		# Whether commands are waiting (e.g. for a long job, such as a stream, to give way)
+		return not self._queue.empty()
+
+	def close(self, timeout=5):
+		# Closes the port once the queued commands are done, and stops the thread
+		self.submit(lambda: self.motor.close_port() if self.motor is not None else None)
+		self._queue.put(None)
+		self._thread.join(timeout)
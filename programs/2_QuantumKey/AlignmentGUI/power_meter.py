@@ -0,0 +1,88 @@
+"""
+Description: History of the live power meter of runReceiver.py. The photodiode readings
+(streamed by the Arduino, see MotorControl.stream) are kept in a fixed-size NumPy ring
+buffer, so the memory and the cost of adding readings do not grow with the time the meter
+runs. For the strip chart, the history is reduced to the minimum and the maximum of a fixed
+number of groups of readings: pyqtgraph draws the same number of points (and still every
+peak) however long the history is.
+
+Usage: Imported by runReceiver.py.
+
+	history = RingBuffer(120000)
+	history.extend(volts, times)        # From the motor thread
+	t, v = history.decimated(1000)      # Min and max of 1000 groups (2000 points)
+	history.save('power.csv')           # Time (s since epoch) and voltage of every reading
+
+Author: Qcumber 2026
+
+Version: 1.0
+"""
+import threading
+import numpy as np
+
+class RingBuffer(object):
+	# The last size (time, value) pairs, added by one thread and read by another
+
+	def __init__(self, size):
+		self.size = size
+		self.times = np.zeros(size)
+		self.values = np.zeros(size)
+		self.count = 0 # Pairs added in total
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return min(self.count, self.size)
+
+	def extend(self, values, times):
+		values = np.asarray(values, dtype=float)
+		times = np.broadcast_to(np.asarray(times, dtype=float), values.shape)
+		skipped = max(len(values) - self.size, 0) # Only the last size pairs are kept
+		values, times = values[-self.size:], times[-self.size:]
+		with self._lock:
+			# From count as it is now (clear() may have reset it)
+			start = self.count + skipped
+			index = (start + np.arange(len(values))) % self.size
+			self.values[index] = values
+			self.times[index] = times
+			self.count = start + len(values)
+
+	def clear(self):
+		with self._lock:
+			self.count = 0
+
+	def last(self):
+		# The latest (time, value), None if there is none
+		with self._lock:
+			if self.count == 0:
+				return None
+			index = (self.count - 1) % self.size
+			return self.times[index], self.values[index]
+
+	def data(self):
+		"""Times and values of the history, oldest first (copies)"""
+		with self._lock:
+			start = self.count - len(self)
+			index = (start + np.arange(len(self))) % self.size
+			return self.times[index], self.values[index]
+
+	def decimated(self, bins=1000):
+		"""
+		The history reduced to the minimum and the maximum of bins groups of readings, in
+		the order they came (2 x bins points), or the whole history when it is shorter.
+		"""
+		times, values = self.data()
+		if len(values) <= 2*bins:
+			return times, values
+		# Equal groups, the oldest readings that do not fill a group are left out
+		n = len(values)//bins*bins
+		times, values = times[-n:].reshape(bins, -1), values[-n:].reshape(bins, -1)
+		imin, imax = values.argmin(axis=1), values.argmax(axis=1)
+		rows = np.arange(bins)[:, None]
+		index = np.c_[np.minimum(imin, imax), np.maximum(imin, imax)]
+		return times[rows, index].ravel(), values[rows, index].ravel()
+
+	def save(self, filename):
+		"""Writes the history into a CSV file (time in s since epoch, voltage in V)"""
+		times, values = self.data()
+		np.savetxt(filename, np.c_[times, values], fmt=['%.4f', '%.4f'], delimiter=',',
+			header='time (s),voltage (V)', comments='')
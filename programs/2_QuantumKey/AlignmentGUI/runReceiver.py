@@ -4,6 +4,15 @@ Created on May 2018, modified from the QITlab program.
 
 Usage: Run on receiver's (Bob) side. Used to calibrate polarization
 offsets and scan visibilities in tandem with `runSender.py`.
+The motor commands run on a thread of their own (motorControls.MotorWorker),
+so the window stays responsive while the motor moves or scans.
+Measure streams the photodiode (STREAM, about 1900 readings/s) into a ring
+buffer (power_meter.py), shown as a strip chart of the last minute; Save
+History writes it into power_HHMMSS.csv.
+Auto Offset finds the H offset from a coarse scan, a fit of Malus' law and
+a fine scan (auto_offset.py), with Alice's laser on and at H, and sets it.
+The visibility of a scan is fitted too (malus_fit.py), without the outliers
+and without the background (Measure Background, with Alice's laser off).
 
 Author: Qcumber2018
 
@@ -11,19 +20,26 @@ Version: 1.0
 """
 
 import sys
-import glob
-import serial
 import time
 import pathlib
 import os
 
 from PyQt5 import uic
 from PyQt5.QtWidgets import QMainWindow, QApplication
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QTimer, pyqtSignal
 import motorControls as mc
+import power_meter as pm
+import auto_offset as ao
+import malus_fit as mf
 import numpy as np
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2])) # Shared modules in programs/
+import port_discovery as pd
+
 REFRESH_RATE = 100 # 100 ms
+POWER_HISTORY = 120000 # Readings in the power history (about a minute of STREAM)
+POWER_BINS = 1000 # The strip chart shows the min and max of this many groups of readings
+BACKGROUND_SAMPLES = 16 # Readings averaged for the background
 os.chdir(pathlib.Path(__file__).parent.resolve())
 form_class = uic.loadUiType("guiRcv.ui")[0]
 
@@ -36,47 +52,27 @@ def insanity_check(number, min_value, max_value):
 	else:
 		return number
 
-# serial_ports function modified from:
-# https://stackoverflow.com/questions/12090503/listing-available-com-ports-with-python
-def serial_ports():
-	""" Lists serial port names
-
-		:raises EnvironmentError:
-			On unsupported or unknown platforms
-		:returns:
-			A list of the serial ports available on the system
-	"""
-	if sys.platform.startswith('win'):
-		ports = ['COM%s' % (i + 1) for i in range(256)]
-	elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-		# this excludes your current terminal "/dev/tty"
-		ports = glob.glob('/dev/ttyACM*')
-	elif sys.platform.startswith('darwin'):
-		ports = glob.glob('/dev/tty.*')
-	else:
-		raise EnvironmentError('Unsupported platform')
-
-	result = []
-	for port in ports:
-		try:
-			s = serial.Serial(port)
-			s.close()
-			result.append(port)
-		except (OSError, serial.SerialException):
-			pass
-	return result
-
 class MyWindowClass(QMainWindow, form_class):
 
+	motorDone = pyqtSignal(object, object) # Future of a motor command, (callback, failed)
+	scanPoint = pyqtSignal(int, float, float) # Index, angle, voltage
+	autoPoint = pyqtSignal(float, float) # Angle, voltage (Auto Offset)
+
 	def __init__(self, parent=None):
 
 		self.offset = 0
+		self.background = 0.0 # Reading with Alice's laser off (in V)
+		self.motor = None # MotorWorker
+		self.streamFuture = None
+		self.powerHistory = pm.RingBuffer(POWER_HISTORY)
 		# Whether or not we started the device
 		self.deviceRunning = False
 		self.measuring = False
 
 		# Whether or not we have scanned
 		self.scanned = False
+		self.scanning = False
+		self.scanAbort = False
 
 		# Declaring GUI window
 		QMainWindow.__init__(self, parent)
@@ -88,6 +84,7 @@ class MyWindowClass(QMainWindow, form_class):
 		---List of Buttons---
 		buttonStart : ON/OFF
 		measureButton : Mesasure
+		savePower : save the power history
 		resetButton : Reset
 		startScan : Scan
 		setOffset : Set Offset
@@ -95,37 +92,26 @@ class MyWindowClass(QMainWindow, form_class):
 		goToPol : go to polarisation
 		goToAngle : go to relative angle
 		setThButton: set detector threshold to detect incoming laser light
+		measureBackground: reading with Alice's laser off (for the visibility)
 		"""
 		self.buttonStart.clicked.connect(self.buttonStart_clicked)
 		self.resetButton.clicked.connect(self.reset_params)
 		self.measureButton.clicked.connect(self.measure)
+		self.savePower.clicked.connect(self.save_power)
 		self.goToPol.clicked.connect(self.set_polarisation)
 		self.goToAngle.clicked.connect(self.set_angle_gui)
 		self.startScan.clicked.connect(self.start_scan)
 		self.setOffset.clicked.connect(self.set_offset_gui)
+		self.autoOffset.clicked.connect(self.start_auto_offset)
 		self.setThButton.clicked.connect(self.set_threshold_gui)
+		self.measureBackground.clicked.connect(self.measure_background)
+		self.motorDone.connect(self.motor_done)
+		self.scanPoint.connect(self.scan_point)
+		self.autoPoint.connect(self.auto_point)
 
 
-		# Gets a list of avaliable serial ports to connect to and adds to combo box
-		self.ports = serial_ports()
-		for index, port in enumerate(self.ports):
-			try:
-				# Adds Classical/Quantum identifier based on HELP text
-				dev = serial.Serial(port, baudrate=38400, timeout=0.1)
-				time.sleep(2)
-				dev.reset_input_buffer()
-				dev.reset_output_buffer()
-				dev.write("*IDN? ".encode())
-				# Try ten times to identify serial device before giving up
-				for i in range(10):
-					if dev.in_waiting:
-						response = dev.readlines()[0].decode().strip()
-						self.ports[index] += " (" + response + ")"
-						break
-					time.sleep(0.05)
-				dev.close()
-			except:
-				pass
+		# Gets a list of avaliable serial ports (with the Arduino identities) and adds to combo box
+		self.ports = pd.port_labels()
 		self.deviceBox.addItems(self.ports)
 
 		# Initialise plots
@@ -134,6 +120,13 @@ class MyWindowClass(QMainWindow, form_class):
 		labelStyle = {'font': 'Arial', 'font-size': '16px'}
 		self.plotWidget.setLabel('left', 'Power', 'V',**labelStyle)
 		self.plotWidget.setLabel('bottom', 'Absolute Angle', '',**labelStyle)
+		self.powerPlot.plotItem.getAxis('left').setPen((0,0,0))
+		self.powerPlot.plotItem.getAxis('bottom').setPen((0,0,0))
+		self.powerPlot.setLabel('left', 'Power', 'V',**labelStyle)
+		self.powerPlot.setLabel('bottom', 'Time', 's',**labelStyle)
+		self.powerPlot.setYRange(0.0, 5.0)
+		self.powerPlot.showGrid(x=True, y=True)
+		self.powerCurve = self.powerPlot.plot([], [], pen={'color':(0,0,255),'width':1})
 
 
 		# Set timer
@@ -152,6 +145,7 @@ class MyWindowClass(QMainWindow, form_class):
 		self.xdata = np.arange(-180+self.offset,181+self.offset,1)
 		self.ydata = np.zeros(361)
 		self.plot = self.plotWidget.plot(self.xdata, self.ydata, pen={'color':(255,0,0),'width':2})
+		self.points = self.plotWidget.plot([], [], pen=None, symbol='o', symbolSize=6, symbolBrush=(0,0,255)) # Auto Offset
 		# Some cosmetics
 		self.plotWidget.setLimits(xMin = self.xdata[0], xMax = self.xdata[-1], yMin=0.0,yMax=5.0)
 		self.plotWidget.getAxis('bottom').setTicks([[(value,str(value)) for value in np.arange(-180+self.offset,181+self.offset,45).tolist()]])
@@ -161,6 +155,50 @@ class MyWindowClass(QMainWindow, form_class):
 		self.x_hdva = np.arange(0+self.offset,180+self.offset,45)
 		self.plot2 = self.plotWidget.plot()
 		"""
+	#########
+	# MOTOR #
+	#########
+	def motor_call(self, future, callback=None, failed=None):
+		# callback(result), or failed(error), is run in the GUI thread once the motor command is done
+		future.add_done_callback(lambda f: self.motorDone.emit(f, (callback, failed)))
+		return future
+
+	def motor_done(self, future, callbacks):
+		callback, failed = callbacks
+		if future.cancelled():
+			return # Replaced by a newer command
+		error = future.exception()
+		if error is None:
+			if callback is not None:
+				callback(future.result())
+		elif failed is not None:
+			failed(error)
+		else:
+			self.statusbar.showMessage(f"Motor Error: {error}")
+
+	def motor_started(self, replies):
+		angle, offset, threshold, pol = replies
+		self.curr_angle = float(angle)
+		self.offset  = int(offset)
+		self.threshold = int(threshold)
+		self.pol = round(float(pol))
+		self.update_threshold(self.threshold)
+		self.update_offset(self.offset)
+		self.angleInput.setValue(self.curr_angle)
+		self.update_pol(self.pol)
+		self.deviceRunning = True
+		self.statusbar.showMessage("Device Running")
+		self.buttonStart.setText("Stop")
+		self.buttonStart.setEnabled(True)
+		self.start_stream()
+
+	def motor_failed(self, error):
+		# The port could not be opened, or the Arduino did not reply
+		self.motor.close()
+		self.motor = None
+		self.statusbar.showMessage(f"Device Error: {error}")
+		self.buttonStart.setEnabled(True)
+
 	###########
 	# BUTTONS #
 	###########
@@ -168,28 +206,21 @@ class MyWindowClass(QMainWindow, form_class):
 
 		#Turning on device for the first time
 		if not self.deviceRunning:
-			# Start device
-			self.motor = mc.MotorControl(str(self.deviceBox.currentText().split()[0]))
-			# Initialising parameter and starting stuffs
-			self.statusbar.showMessage("Device Running")
-			self.buttonStart.setText("Stop")
-
-			#Initialising the motors
-			self.curr_angle = float(self.motor.get_angle())
-			self.offset  = int(self.motor.get_offset())
-			self.threshold = int(self.motor.get_threshold())
-			self.pol = round(float((self.motor.get_pol())))
-			self.update_threshold(self.threshold)
-			self.update_offset(self.offset)
-			self.update_angle(self.curr_angle)
-			self.update_pol(self.pol)
-			self.deviceRunning = not self.deviceRunning
+			# Start device (the port is opened on the motor thread)
+			self.motor = mc.MotorWorker(str(self.deviceBox.currentText().split()[0]))
+			self.statusbar.showMessage("Connecting... Please Wait")
+			self.buttonStart.setEnabled(False)
+
+			#Initialising the motors (one round trip, see MotorControl.batch), queued after the connection
+			self.motor_call(self.motor.batch(lambda b: b.get_angle().get_offset().get_threshold().get_pol()),
+				self.motor_started, self.motor_failed)
 		else:
 			#Stop the device
 			self.deviceRunning = not self.deviceRunning
 			self.statusbar.showMessage("Device Stopped")
 			# Change button appearance
-			self.motor.close_port()
+			self.motor.close() # After the queued commands
+			self.motor = None
 			self.buttonStart.setText("Start")
 			self.labelPower.setText("OFF")
 
@@ -198,45 +229,172 @@ class MyWindowClass(QMainWindow, form_class):
 		self.statusbar.showMessage("Resetting Parameters... Please Wait")
 		self.update_angle(0)
 		self.update_offset(0)
-		self.statusbar.showMessage("Resetting Parameters... Done")
 
 	def start_scan(self):
+		if self.scanning:
+			# Scan clicked again: stop the scan
+			self.scanAbort = True
+			self.statusbar.showMessage("Scanning... Stopping")
+			return
 		if self.deviceRunning:
 			#Find how many plot points
 			resolution = self.scanRes.value()
-			number_of_points = 360 // (resolution)
-			#Scan through the angles, plot graph and display plot
+			#Scan through the angles (on the Arduino, see MotorControl.scan), the plot is updated point by point
 			self.xdata = np.arange(-180+self.offset,181+self.offset,resolution)
-			self.ydata = np.zeros(number_of_points+1)
-			read_count = 0
-			self.statusbar.showMessage("Scanning... Please Wait")
-			while(read_count != (number_of_points+1)):
-				try:
-					#Update angle on GUI
-					self.update_angle(self.xdata[read_count])
-					self.voltage_A0 = float(self.motor.get_voltage())
-					power_str = str(self.voltage_A0)
-					#self.labelPower.setText(power_str + " V")
-					self.ydata[read_count] = self.voltage_A0
-					read_count += 1
-					#print(self.xdata[read_count], power_str,sep='\t')
-				except:
-					# Sometime the serial channel needs to clear some junks
-					pass
-			self.scanned = True
-			# Plot data
+			self.ydata = np.zeros(len(self.xdata))
+			self.scanCount = 0
+			self.scanError = None
 			self.plotWidget.setLimits(xMin = self.xdata[0], xMax = self.xdata[-1],yMin=0.0,yMax=5.0)
-			self.plot.setData(self.xdata, self.ydata)
 			self.plotWidget.getAxis('bottom').setTicks([[(value,str(value)) for value in np.arange(-180+self.offset,181+self.offset,45).tolist()]])
 			self.plotWidget.showGrid(x=True)
-			ymax = self.ydata.max()
-			ymin = self.ydata.min()
-			visibility = (ymax-ymin)/(ymax+ymin)
-			self.visibilityLabel.setText(f"Visibility is {visibility:.4f}")
+			self.plot.setData([], [])
+			self.points.setData([], [])
+			self.statusbar.showMessage("Scanning... Please Wait")
+			# The motor is busy: no other command until the scan is done
+			self.set_motor_buttons(False)
+			self.startScan.setText("Stop Scan")
+			self.scanning = True
+			self.scanAbort = False
+			self.motor_call(self.motor.submit(self.run_scan, self.xdata[0], self.xdata[-1], resolution),
+				self.scan_done, self.scan_failed)
+		else:
+			self.labelPower.setText("OFF")
+
+	def set_motor_buttons(self, enabled):
+		for button in (self.buttonStart, self.resetButton, self.measureButton, self.goToPol,
+				self.goToAngle, self.setOffset, self.setThButton, self.autoOffset, self.measureBackground):
+			button.setEnabled(enabled)
+
+	def run_scan(self, start, stop, step):
+		# Runs on the motor thread: the points are sent to the GUI thread with scanPoint
+		scan = self.motor.motor.scan(start, stop, step)
+		for index, (angle, voltage) in enumerate(scan):
+			self.scanPoint.emit(index, angle, voltage)
+			if self.scanAbort:
+				break
+		scan.close() # Stops the scan on the Arduino if it was aborted
+		return self.scanAbort
+
+	def scan_point(self, index, angle, voltage):
+		# One point of the scan (from run_scan)
+		if index < len(self.ydata):
+			self.xdata[index] = angle
+			self.ydata[index] = voltage
+			self.scanCount = index + 1
+			self.plot.setData(self.xdata[:self.scanCount], self.ydata[:self.scanCount])
+			self.angleInput.setValue(angle)
+
+	def scan_failed(self, error):
+		self.scanError = str(error)
+		self.scan_done(False)
+
+	def scan_done(self, aborted):
+		self.scanning = False
+		self.startScan.setText("Scan")
+		self.set_motor_buttons(True)
+		self.start_stream() # Measuring again
+		if self.scanError is not None:
+			self.statusbar.showMessage("Scanning... Failed: " + self.scanError)
+		elif aborted:
+			self.statusbar.showMessage("Scanning... Stopped")
+		else:
 			self.statusbar.showMessage("Scanning... Done")
+		if self.scanCount == 0:
+			return
+		self.scanned = True
+		self.curr_angle = self.xdata[self.scanCount-1]
+		# Fit of Malus' law, without the background and the outliers (see malus_fit.py)
+		try:
+			result = mf.fit(self.xdata[:self.scanCount], self.ydata[:self.scanCount], self.background)
+		except ValueError:
+			self.visibilityLabel.setText("Visibility is N/A")
+			return
+		self.visibilityLabel.setText(f"Visibility is {result['visibility']:.4f} +/- {result['visibility_error']:.4f}")
+		if result['rejected']:
+			self.statusbar.showMessage(self.statusbar.currentMessage() + f" ({result['rejected']} outliers left out of the fit)")
+
+	def measure_background(self):
+		#Reading with Alice's laser off, subtracted before the visibility is fitted
+		if self.deviceRunning:
+			self.statusbar.showMessage("Measuring Background... Please Wait")
+			self.motor_call(self.motor.batch(self.background_batch), self.background_measured)
+		else:
+			self.labelPower.setText("OFF")
+
+	def background_batch(self, batch):
+		# Several readings in one round trip (see MotorControl.batch)
+		for i in range(BACKGROUND_SAMPLES):
+			batch.get_voltage()
+		return batch
+
+	def background_measured(self, volts):
+		self.background = float(np.median(volts)) # Robust to a stray pulse of light
+		self.statusbar.showMessage(f"Measuring Background... Done ({self.background:.3f} V)")
+
+	def start_auto_offset(self):
+		if self.scanning:
+			# Auto Offset clicked again: stop the search
+			self.scanAbort = True
+			self.statusbar.showMessage("Auto Offset... Stopping")
+			return
+		if self.deviceRunning:
+			#Coarse scan, fit and fine scan (on the motor thread, see auto_offset.py), Alice at H
+			self.plotWidget.setLimits(xMin = 0, xMax = 360, yMin=0.0,yMax=5.0)
+			self.plotWidget.getAxis('bottom').setTicks([[(value,str(value)) for value in range(0,361,45)]])
+			self.plot.setData([], [])
+			self.autoAngles, self.autoVolts = [], []
+			self.points.setData([], [])
+			self.statusbar.showMessage("Auto Offset... Please Wait")
+			# The motor is busy: no other command until the offset is found
+			self.set_motor_buttons(False)
+			self.startScan.setEnabled(False)
+			self.autoOffset.setEnabled(True)
+			self.autoOffset.setText("Stop Auto Offset")
+			self.scanning = True
+			self.scanAbort = False
+			self.motor_call(self.motor.submit(self.run_auto_offset, self.motor),
+				self.auto_offset_done, self.auto_offset_failed)
 		else:
 			self.labelPower.setText("OFF")
 
+	def run_auto_offset(self, worker):
+		# Runs on the motor thread: the points are sent to the GUI thread with autoPoint
+		return ao.find_offset(worker.motor, self.autoPoint.emit, lambda: self.scanAbort, self.background)
+
+	def auto_point(self, angle, voltage):
+		self.autoAngles.append(angle)
+		self.autoVolts.append(voltage)
+		self.points.setData(self.autoAngles, self.autoVolts)
+		self.angleInput.setValue(angle)
+
+	def auto_offset_end(self):
+		self.scanning = False
+		self.autoOffset.setText("Auto Offset")
+		self.set_motor_buttons(True)
+		self.startScan.setEnabled(True)
+		self.start_stream() # Measuring again
+
+	def auto_offset_failed(self, error):
+		self.auto_offset_end()
+		self.statusbar.showMessage(f"Auto Offset... Failed: {error}")
+
+	def auto_offset_done(self, result):
+		self.auto_offset_end()
+		if result is None:
+			self.statusbar.showMessage("Auto Offset... Stopped")
+			return
+		# The Arduino has the new offset (SETHOF) and is at H
+		self.offset = result['offset']
+		self.offsetInput.setValue(self.offset)
+		self.pol = 0
+		self.polInput.setValue(self.pol)
+		self.curr_angle = self.offset
+		self.angleInput.setValue(self.curr_angle)
+		angles = np.arange(0, 361)
+		self.plot.setData(angles, mf.model(angles, result['fit']))
+		self.visibilityLabel.setText(f"Visibility is {result['visibility']:.4f} +/- {result['visibility_error']:.4f}")
+		self.statusbar.showMessage(f"Auto Offset... Done (offset {self.offset} degrees, {len(result['angles'])} points)")
+
 	"""
 	def set_angle(self):
 		#Change the absolute angle in GUI and here
@@ -257,11 +415,14 @@ class MyWindowClass(QMainWindow, form_class):
 		#Change the absolute angle in GUI and here
 		self.statusbar.showMessage("Updating Angle... Please Wait")
 		self.curr_angle = angle_value
-		self.motor.set_angle(angle_value)
-		self.curr_angle = float(self.motor.get_angle())
+		# Only the last of several quick moves is made (key, see MotorWorker.submit)
+		self.motor_call(self.motor.batch(lambda b: b.set_angle(angle_value).get_angle(), key='angle'), self.angle_updated)
+		return None
+
+	def angle_updated(self, replies):
+		self.curr_angle = float(replies[1])
 		self.angleInput.setValue(self.curr_angle) #QDoubleSpinBox - See guiRcv.ui file
 		self.statusbar.showMessage("Updating Angle... Done")
-		return None
 
 	def set_threshold_gui(self):
 		#Set detector threshold
@@ -274,8 +435,8 @@ class MyWindowClass(QMainWindow, form_class):
 		self.statusbar.showMessage("Updating Threshold... Please Wait")
 		self.threshold = threshold #Internal variable
 		self.thInput.setValue(threshold) #GUI Display
-		self.motor.set_threshold(threshold) #Arduino
-		self.statusbar.showMessage("Updating Threshold... Done")
+		self.motor_call(self.motor.call('set_threshold', threshold, key='threshold'), #Arduino
+			lambda reply: self.statusbar.showMessage("Updating Threshold... Done"))
 		return None
 
 	def update_offset(self,offset_value):
@@ -284,8 +445,8 @@ class MyWindowClass(QMainWindow, form_class):
 
 		self.offset = offset_value
 		self.offsetInput.setValue(offset_value)
-		self.motor.set_offset(offset_value)
-		self.statusbar.showMessage("Updating Offset... Done")
+		self.motor_call(self.motor.call('set_offset', offset_value, key='offset'),
+			lambda reply: self.statusbar.showMessage("Updating Offset... Done"))
 		return None
 
 	def update_pol(self,pol_value):
@@ -294,8 +455,8 @@ class MyWindowClass(QMainWindow, form_class):
 
 		self.pol = pol_value
 		self.polInput.setValue(pol_value)
-		self.motor.set_pol(pol_value)
-		self.statusbar.showMessage("Updating Polarization... Done")
+		self.motor_call(self.motor.call('set_pol', pol_value, key='angle'), # Moves the motor too
+			lambda reply: self.statusbar.showMessage("Updating Polarization... Done"))
 		return None
 
 	def set_offset_gui(self):
@@ -316,6 +477,8 @@ class MyWindowClass(QMainWindow, form_class):
 			if not self.measuring:
 				self.measuring = not self.measuring
 				self.measureButton.setText("Stop Measure")
+				self.powerHistory.clear()
+				self.start_stream()
 			else:
 				self.measuring = not self.measuring
 				self.measureButton.setText("Start Measure")
@@ -323,23 +486,64 @@ class MyWindowClass(QMainWindow, form_class):
 			self.measuring = False
 			self.labelPower.setText("OFF")
 
+	def start_stream(self):
+		# Streams the photodiode on the motor thread, while measuring (and not scanning)
+		if not self.measuring or not self.deviceRunning or self.scanning or self.streamFuture is not None:
+			return
+		self.streamFuture = self.motor_call(self.motor.submit(self.run_stream, self.motor),
+			self.stream_done, self.stream_failed)
+
+	def run_stream(self, worker):
+		# Runs on the motor thread, until measuring stops or another motor command is queued
+		stream = worker.motor.stream()
+		time_last = time.time()
+		for volts in stream:
+			time_now = time.time()
+			# The readings of a block are spread evenly since the previous block
+			self.powerHistory.extend(volts, time_last + (time_now - time_last) * np.arange(1, len(volts) + 1) / max(len(volts), 1))
+			time_last = time_now
+			if not self.measuring or worker.pending():
+				break
+		stream.close() # Stops the stream on the Arduino
+
+	def stream_done(self, result):
+		# The stream gave way to another command: carry on after it
+		self.streamFuture = None
+		self.start_stream()
+
+	def stream_failed(self, error):
+		self.streamFuture = None
+		self.measuring = False
+		self.measureButton.setText("Start Measure")
+		self.statusbar.showMessage(f"Measuring... Failed: {error}")
+
 	def update_measure(self):
-		#If we are measuring
-		if self.measuring:
-			try:
-				self.voltage_A0 = float(self.motor.get_voltage())
-				power_str = '%.2f'%(self.voltage_A0)
-				self.labelPower.setText(power_str + " V")
-			except:
-				# Sometime the serial channel needs to clear some junks
-				pass
-			#self.scanned = True
-		else:
+		#If we are measuring, the strip chart is redrawn (the readings come from run_stream)
+		last = self.powerHistory.last()
+		if self.measuring and self.deviceRunning and last is not None:
+			self.voltage_A0 = last[1]
+			power_str = '%.2f'%(self.voltage_A0)
+			self.labelPower.setText(power_str + " V")
+			times, volts = self.powerHistory.decimated(POWER_BINS)
+			self.powerCurve.setData(times - last[0], volts) # Seconds before the last reading
+		elif not self.measuring:
 			self.labelPower.setText("OFF")
 
+	def save_power(self):
+		# Writes the power history into power_HHMMSS.csv (time in s since epoch, voltage in V)
+		if len(self.powerHistory) == 0:
+			self.statusbar.showMessage("Saving History... Nothing measured yet")
+			return
+		filename = time.strftime("power_%H%M%S.csv")
+		self.powerHistory.save(filename)
+		self.statusbar.showMessage(f"Saving History... Done ({len(self.powerHistory)} readings in {filename})")
+
 	def cleanUp(self):
+		self.scanAbort = True # The motor thread is closed after the scan stops
 		if self.deviceRunning:
 			self.buttonStart_clicked()
+		elif self.motor is not None:
+			self.motor.close() # Still connecting
 		print("Closing the program ... Good bye!")
 		self.deviceRunning = False
 		time.sleep(0.5)
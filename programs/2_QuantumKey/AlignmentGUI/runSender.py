@@ -4,6 +4,8 @@ Created on May 2018, modified from the QITlab program.
 
 Usage: Run on sender's (Alice) side. Used to calibrate polarization
 offsets and scan visibilities in tandem with `runReceiver.py`.
+The motor commands run on a thread of their own (motorControls.MotorWorker),
+so the window stays responsive while the motor moves.
 
 Author: Qcumber2018
 
@@ -11,17 +13,19 @@ Version: 1.0
 """
 
 import sys
-import glob
 import time
 import pathlib
 import os
 
 from PyQt5 import uic
 from PyQt5.QtWidgets import QMainWindow, QApplication
+from PyQt5.QtCore import pyqtSignal
 import motorControls as mc
-import serial
 import numpy as np
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2])) # Shared modules in programs/
+import port_discovery as pd
+
 REFRESH_RATE = 0.1 # 100 ms
 os.chdir(pathlib.Path(__file__).parent.resolve())
 form_class = uic.loadUiType("guiSnd.ui")[0]
@@ -34,41 +38,14 @@ def insanity_check(number, min_value, max_value):
         return min_value
     else:
         return number
-# serial_ports function from:
-# https://stackoverflow.com/questions/12090503/listing-available-com-ports-with-python
-def serial_ports():
-    """ Lists serial port names
-
-        :raises EnvironmentError:
-            On unsupported or unknown platforms
-        :returns:
-            A list of the serial ports available on the system
-    """
-    if sys.platform.startswith('win'):
-        ports = ['COM%s' % (i + 1) for i in range(256)]
-    elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-        # this excludes your current terminal "/dev/tty"
-        ports = glob.glob('/dev/ttyACM*')
-    elif sys.platform.startswith('darwin'):
-        ports = glob.glob('/dev/tty.*')
-    else:
-        raise EnvironmentError('Unsupported platform')
-
-    result = []
-    for port in ports:
-        try:
-            s = serial.Serial(port)
-            s.close()
-            result.append(port)
-        except (OSError, serial.SerialException):
-            pass
-    return result
-
 class MyWindowClass(QMainWindow, form_class):
 
+    motorDone = pyqtSignal(object, object) # Future of a motor command, (callback, failed)
+
     def __init__(self, parent=None):
 
         self.offset = 0
+        self.motor = None # MotorWorker
         #self.laserOn = False
         # Whether or not we started the device
         self.deviceRunning = False
@@ -97,26 +74,10 @@ class MyWindowClass(QMainWindow, form_class):
         self.goToAngle.clicked.connect(self.set_angle_gui)
         self.setOffset.clicked.connect(self.set_offset_gui)
         self.toggle.clicked.connect(self.toggle_laser)
+        self.motorDone.connect(self.motor_done)
 
-        # Gets a list of avaliable serial ports to connect and adds to combo box
-        self.ports = serial_ports()
-        for index, port in enumerate(self.ports):
-            try:
-                # Adds Classical/Quantum identifier based on HELP text
-                dev = serial.Serial(port, baudrate=38400, timeout=0.1)
-                time.sleep(2)
-                dev.reset_input_buffer()
-                dev.reset_output_buffer()
-                dev.write("help ".encode())
-                for i in range(10):
-                    if dev.in_waiting:
-                        response = dev.readlines()[0].decode().strip().split()[0]
-                        self.ports[index] += " (" + response + ")"
-                        break
-                    time.sleep(0.05)
-                dev.close()
-            except:
-                pass
+        # Gets a list of avaliable serial ports (with the Arduino identities) and adds to combo box
+        self.ports = pd.port_labels()
         self.deviceBox.addItems(self.ports)
 
         """
@@ -148,6 +109,48 @@ class MyWindowClass(QMainWindow, form_class):
         self.plotWidget.setLimits(xMin = self.xdata[0], xMax = self.xdata[-1])
     """
 
+    #########
+    # MOTOR #
+    #########
+    def motor_call(self, future, callback=None, failed=None):
+        # callback(result), or failed(error), is run in the GUI thread once the motor command is done
+        future.add_done_callback(lambda f: self.motorDone.emit(f, (callback, failed)))
+        return future
+
+    def motor_done(self, future, callbacks):
+        callback, failed = callbacks
+        if future.cancelled():
+            return # Replaced by a newer command
+        error = future.exception()
+        if error is None:
+            if callback is not None:
+                callback(future.result())
+        elif failed is not None:
+            failed(error)
+        else:
+            self.statusbar.showMessage(f"Motor Error: {error}")
+
+    def motor_started(self, replies):
+        _, angle, offset, pol = replies
+        self.curr_angle = float(angle)
+        self.offset  = int(offset)
+        self.pol = round(float(pol))
+        #print((self.offset))
+        self.update_offset(self.offset)
+        self.angleInput.setValue(self.curr_angle)
+        self.update_pol(self.pol)
+        self.deviceRunning = True
+        self.statusbar.showMessage("Device Running")
+        self.buttonStart.setText("Stop")
+        self.buttonStart.setEnabled(True)
+
+    def motor_failed(self, error):
+        # The port could not be opened, or the Arduino did not reply
+        self.motor.close()
+        self.motor = None
+        self.statusbar.showMessage(f"Device Error: {error}")
+        self.buttonStart.setEnabled(True)
+
     ###########
     # BUTTONS #
     ###########
@@ -156,24 +159,16 @@ class MyWindowClass(QMainWindow, form_class):
         #Turning on device for the first time
         if not self.deviceRunning:
 
-          # Start device
-            self.motor = mc.MotorControl(str(self.deviceBox.currentText().split()[0]))
-            # Initialising parameter and starting stuffs
-            self.motor.power_off()
-            self.statusbar.showMessage("Device Running")
+          # Start device (the port is opened on the motor thread)
+            self.motor = mc.MotorWorker(str(self.deviceBox.currentText().split()[0]))
+            self.statusbar.showMessage("Connecting... Please Wait")
             self.laserOn = False
             self.labelPower.setText("OFF")
-            self.buttonStart.setText("Stop")
-
-            #Initialising the motors
-            self.curr_angle = float(self.motor.get_angle())
-            self.offset  = int(self.motor.get_offset())
-            self.pol = round(float((self.motor.get_pol())))
-            #print((self.offset))
-            self.update_offset(self.offset)
-            self.update_angle(self.curr_angle)
-            self.update_pol(self.pol)
-            self.deviceRunning = not self.deviceRunning
+            self.buttonStart.setEnabled(False)
+
+            #Laser off and initialising the motors (one round trip, see MotorControl.batch), queued after the connection
+            self.motor_call(self.motor.batch(lambda b: b.power_off().get_angle().get_offset().get_pol()),
+                self.motor_started, self.motor_failed)
         else:
             if self.laserOn:
                 self.toggle_laser()
@@ -181,22 +176,25 @@ class MyWindowClass(QMainWindow, form_class):
             self.deviceRunning = not self.deviceRunning
             self.statusbar.showMessage("Device Stopped")
             # Change button appearance
-            self.motor.close_port()
+            self.motor.close() # After the queued commands (laser off)
+            self.motor = None
             self.buttonStart.setText("Start")
 
             if self.laserOn:
                 self.toggle_laser()
 
     def toggle_laser(self):
+        if not self.deviceRunning:
+            return
         if self.laserOn:
             #now laser is on, turn off laser
-            self.motor.power_off()
+            self.motor_call(self.motor.call('power_off', key='laser'))
             self.labelPower.setText("OFF")
             self.laserOn = not self.laserOn
 
         else:
             #now laser if off, turn on laser
-            self.motor.power_on()
+            self.motor_call(self.motor.call('power_on', key='laser'))
             self.labelPower.setText("ON")
             self.laserOn = not self.laserOn
 
@@ -205,7 +203,6 @@ class MyWindowClass(QMainWindow, form_class):
         self.statusbar.showMessage("Resetting Parameters... Please Wait")
         self.update_angle(0)
         self.update_offset(0)
-        self.statusbar.showMessage("Resetting Parameters... Done")
 
     def set_angle_gui(self):
         #Set absolute angle
@@ -217,11 +214,14 @@ class MyWindowClass(QMainWindow, form_class):
         #Change the absolute angle in GUI and here
         self.statusbar.showMessage("Updating Angle... Please Wait")
         self.curr_angle = angle_value
-        self.motor.set_angle(angle_value)
-        self.curr_angle = float(self.motor.get_angle())
+        # Only the last of several quick moves is made (key, see MotorWorker.submit)
+        self.motor_call(self.motor.batch(lambda b: b.set_angle(angle_value).get_angle(), key='angle'), self.angle_updated)
+        return None
+
+    def angle_updated(self, replies):
+        self.curr_angle = float(replies[1])
         self.angleInput.setValue(self.curr_angle) # QDoubleSpinBox - See guiSnd.ui file
         self.statusbar.showMessage("Updating Angle... Done")
-        return None
 
     def update_offset(self,offset_value):
         #Change the angle in GUI and here
@@ -229,8 +229,8 @@ class MyWindowClass(QMainWindow, form_class):
 
         self.offset = offset_value
         self.offsetInput.setValue(offset_value)
-        self.motor.set_offset(offset_value)
-        self.statusbar.showMessage("Updating Offset... Done")
+        self.motor_call(self.motor.call('set_offset', offset_value, key='offset'),
+            lambda reply: self.statusbar.showMessage("Updating Offset... Done"))
         return None
     
     def update_pol(self,pol_value):
@@ -239,8 +239,8 @@ class MyWindowClass(QMainWindow, form_class):
 
         self.pol = pol_value
         self.polInput.setValue(pol_value)
-        self.motor.set_pol(pol_value)
-        self.statusbar.showMessage("Updating Polarization... Done")
+        self.motor_call(self.motor.call('set_pol', pol_value, key='angle'), # Moves the motor too
+            lambda reply: self.statusbar.showMessage("Updating Polarization... Done"))
         return None
 
     def set_offset_gui(self):
@@ -262,6 +262,8 @@ class MyWindowClass(QMainWindow, form_class):
 
         if self.deviceRunning:
             self.buttonStart_clicked()
+        elif self.motor is not None:
+            self.motor.close() # Still connecting
 
         print("Closing the program ... Good bye!")
         self.deviceRunning = False
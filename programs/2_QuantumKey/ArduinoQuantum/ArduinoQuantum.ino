@@ -75,12 +75,13 @@ void loop() {
   // Serial.println(serbuf); // Debug
   // Obtain which input command (enumerated)
   int enumc = -1; // default choice
-  int maxChoice = 21;
+  int maxChoice = 24;
   char sercmd[maxChoice][8] = {"HELP",             // 0
     "SETANG", "ANG?", "SETPOL", "POL?", "SETHOF",  // 5
     "HOF?", "POLSEQ", "RNDSEQ", "RNDBAS", "SEQ?",  // 10
     "LASON", "LASOFF", "VOLT?", "RUNSEQ", "TXSEQ", // 15
-    "RXSEQ", "CATCH", "TH?", "SETTH","*IDN?"};     // 20
+    "RXSEQ", "CATCH", "TH?", "SETTH","*IDN?",      // 20
+    "SCAN", "STOP", "STREAM"};                     // 23
   for (int c=0; c<maxChoice; c++){
     if (strcasecmp(sercmd[c],serbuf) == 0){ 
       enumc = c;// Obtain match
@@ -95,6 +96,9 @@ void loop() {
   char polseqbuf[seqLength] = ""; // Buffer to receive chartype pol sequences from serial 
   int polSeqMod[seqLength] = {0}; // Polarisation sequence within the range (0,3).       
   int sensorValue;
+  int scanStart;
+  int scanStop;
+  int scanStep;
   
   
   // Switching between different cases
@@ -123,6 +127,9 @@ void loop() {
       Serial.print(F("TH?         \t    Gets detector threshold for CATCH - 200=1V\n"));
       Serial.print(F("SETTH X     \t    Set laser detection threshold (0-1023) - 200=1V\n"));
       Serial.print(F("*IDN?       \t    Gets device name (Quantum/Classical)\n"));
+      Serial.print(F("SCAN X Y Z  \t    Scan the angle from X to Y in steps of Z, print angle and voltage\n"));
+      Serial.print(F("STREAM X    \t    Stream the sensor readings every X ms (0: as fast as possible)\n"));
+      Serial.print(F("STOP        \t    Stop the scan or the stream (any command does)\n"));
       break; 
       
     case 1: //SETANG X
@@ -260,6 +267,41 @@ void loop() {
     case 20: //*IDN?
       Serial.println("Quantum");
       break;
+
+    case 21: //SCAN X Y Z
+      // listen again (for the start, stop and step angles)
+      while (!Serial.available());
+      Serial.readBytesUntil(' ', valbuf, 15); // Until whitespace
+      scanStart = atoi(valbuf);
+      memset(valbuf, 0, sizeof(valbuf));
+      while (!Serial.available());
+      Serial.readBytesUntil(' ', valbuf, 15);
+      scanStop = atoi(valbuf);
+      memset(valbuf, 0, sizeof(valbuf));
+      while (!Serial.available());
+      Serial.readBytesUntil(' ', valbuf, 15);
+      scanStep = abs(atoi(valbuf));
+      if (scanStep == 0){
+        Serial.println("Input error detected.");
+        scanStep = 1; // If input error, scan in steps of 1 degree
+      }
+      if (scanStop < scanStart) scanStep = -scanStep; // Scanning backwards
+      scanAngles(scanStart, scanStop, scanStep);
+      Serial.println("OK");
+      break;
+
+    case 22: //STOP
+      Serial.println("OK"); // Not scanning, nothing to stop
+      break;
+
+    case 23: //STREAM X
+      // listen again (for sampling interval in ms)
+      while (!Serial.available());
+      Serial.readBytesUntil(' ', valbuf, 15); // Until whitespace
+      Serial.println(F("OK"));
+      streamSensor(atoi(valbuf));
+      Serial.println(F("OK")); // End of the stream
+      break;
      
     default:
       Serial.println("Unknown command");
@@ -304,6 +346,53 @@ unsigned long lasCatch(){
   return millis();
 }
 
+void scanAngles(int start, int stop, int step){
+  // Moves the motor from start to stop, and prints the angle and the sensor value
+  // ("angle value") at every step. Any command sent in the meantime stops the scan.
+  int angle;
+  int lastAngle;
+  bool stopped = false;
+  EEPROM_readAnything(EEloc_angleTarget, lastAngle);
+  for (angle = start; (step > 0) ? (angle <= stop) : (angle >= stop); angle += step){
+    if (Serial.available()){
+      stopped = true;
+      break;
+    }
+    myMotor.gotoAngle(angle);
+    lastAngle = angle;
+    Serial.print(angle);
+    Serial.print(' ');
+    Serial.println(analogRead(sensorLoc));
+  }
+  // Current angle is now the last target (a single EEPROM write for the whole scan)
+  EEPROM_writeAnything(EEloc_angleTarget, lastAngle);
+  if (stopped){
+    char stopbuf[16] = "";
+    Serial.readBytesUntil(' ', stopbuf, 15); // The command that stopped the scan (e.g. STOP)
+  }
+}
+
+void streamSensor(unsigned long interval) {
+  // Sends the sensor readings as 2 byte frames until a command comes in
+  // Frame: 1aaaaaaa 00000aaa (a: the 10 bit reading), as the frames of ArduinoEve.ino
+  // Only the first byte of a frame has the top bit set, so the frames can be found in the stream
+  byte frame[2];
+  int sensorValue;
+  unsigned long nextTime = millis();
+  while (!Serial.available()) {
+    if (interval > 0) {
+      if ((long)(millis() - nextTime) < 0) continue; // Not yet
+      nextTime += interval;
+    }
+    sensorValue = analogRead(sensorLoc);
+    frame[0] = 0x80 | (sensorValue >> 3);
+    frame[1] = sensorValue & 0x07;
+    Serial.write(frame, 2); // Blocks when the serial buffer is full (about 1920 frames/s at 38400 baud)
+  }
+  char stopbuf[16] = "";
+  Serial.readBytesUntil(' ', stopbuf, 15); // The command that stopped the stream (e.g. STOP)
+}
+
 int specialRandom(int array[], int arrayLength, int maxVal){
   // Fill in the array with specialised random numbers in [0, maxVal)   
   for(int i=0; i<arrayLength; i++){
@@ -10,45 +10,48 @@ Options: python recv_calibrate.py
 
         -h, --help       show this help message and exit
         --serial SERIAL  Sets the serial address of the Arduino
+        --no-reset       Opens the serial port without resetting the Arduino (DTR kept low)
 
 Author: Qcumber 2018
 
 Version: 1.0
 '''
 
-import serial
 import sys
-import time
+import pathlib
 import numpy as np
 import argparse # For running the script with options
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import serial_transport as st
+
 my_parser = argparse.ArgumentParser()
 my_parser.add_argument('--serial', action='store', type=str, required=True, help='Sets the serial address of the Arduino')
+my_parser.add_argument('--no-reset', action='store_true', help='Opens the serial port without resetting the Arduino (DTR kept low)')
 
 # Get the serial address
 args = my_parser.parse_args()
 serial_addr = vars(args).get('serial')
+no_reset = vars(args).get('no_reset') # Keeps the Arduino running (no auto-reset)
 
 # Parameters
 # 0,1,2,3 - H,V,D,A respectively
-recv_seq = '0000111122223333 '
+recv_seq = '0000111122223333' # No space after: POLSEQ takes 16 characters, a leftover space gets 'Unknown command'
 
 # Other parameters declarations
 baudrate = 38400    # Default in Arduino
 timeout = 0.1        # Serial timeout (in s).
+reply_timeout = 5    # Deadline for the Arduino replies (in s).
 
 # Starts the program
 print("Polarisation Calibrator (Receiver)")
 print("Uploading sequence to Arduino...")
 
 # Opens the sender side serial port
-receiver = serial.Serial(serial_addr, baudrate, timeout=timeout)
-
-# Wait until the serial is ready
-# Note: for some computer models, particularly MacOS, the program cannot
-# talk to the serial directly after openin. Need to wait 1-2 second.
+# Wait until the Arduino is ready: it resets when the port is opened, and
+# answers *IDN? once it has booted (instead of a fixed 2 s wait)
 print("Opening the serial port...")
-time.sleep(2)
+receiver = st.open_ready(serial_addr, baudrate, timeout=timeout, reset=not no_reset)
 print("Done\n")
 
 print("Flushing serial port")
@@ -63,10 +66,7 @@ seq = 'POLSEQ ' + recv_seq
 receiver.write(seq.encode())
 
 # Block until receive reply
-while True:
-    if receiver.in_waiting:
-        print((receiver.readlines()[0].decode())) # Should display OK
-        break
+print(receiver.read_reply(reply_timeout)) # Should display OK
 
 # Run the sequence
 # Polarization state always returns to 1 at the end
@@ -77,28 +77,18 @@ receiver.write(rxseq.encode())
 
 # Block until receive 1st reply
 while True:
-    if receiver.in_waiting:
-        # print('in_wait'.format(receiver.in_waiting))
-        # time.sleep(100)
-        #print("entering if block")
-        tmp = receiver.readlines() # Should display lots of nonsense
-        #print(("text:", tmp))
-        # for val in tmp:
-        #     print(f'val:{val}')
-        tmp2 = tmp[0].decode()
-        #print(("text2:", tmp2))
-        res_str = tmp2
-        #print(('res_str is: {}'.format(res_str)))
-        if res_str:
-            try:
-                resA = np.array(res_str.split()).astype(np.int32)
-                #print(("resA is: {}".format(str(resA))))
-            except ValueError as e: # To ignore all the debug lines
-                print(e)
-                continue
-        print("Measurement done")
-        print(" ")
-        break
+    res_str = receiver.read_reply(None) # Waits for the sender, may display lots of nonsense
+    #print(('res_str is: {}'.format(res_str)))
+    if res_str:
+        try:
+            resA = np.array(res_str.split()).astype(np.int32)
+            #print(("resA is: {}".format(str(resA))))
+        except ValueError as e: # To ignore all the debug lines
+            print(e)
+            continue
+    print("Measurement done")
+    print(" ")
+    break
 
 # Printing cosmetics
 print("                    Receiver         ")
@@ -10,44 +10,48 @@ Options: python recv_calibrate.py
 
         -h, --help       show this help message and exit
         --serial SERIAL  Sets the serial address of the Arduino
+        --no-reset       Opens the serial port without resetting the Arduino (DTR kept low)
 
 Author: Qcumber 2018
 
 Version: 1.0
 '''
 
-import serial
 import sys
-import time
+import pathlib
 import argparse # For running the script with options
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import serial_transport as st
+
 my_parser = argparse.ArgumentParser()
 my_parser.add_argument('--serial', action='store', type=str, required=True, help='Sets the serial address of the Arduino')
+my_parser.add_argument('--no-reset', action='store_true', help='Opens the serial port without resetting the Arduino (DTR kept low)')
 
 # Get the serial address
 args = my_parser.parse_args()
 serial_addr = vars(args).get('serial')
+no_reset = vars(args).get('no_reset') # Keeps the Arduino running (no auto-reset)
 
 # Parameters
 # 0,1,2,3 - H,V,D,A respectively
-sender_seq = '0123012301230123 '
+sender_seq = '0123012301230123' # No space after: POLSEQ takes 16 characters, a leftover space gets 'Unknown command'
 
 # Other parameters declarations
 baudrate = 38400      # Default in Arduino
 timeout = 0.1        # Serial timeout (in s).
+reply_timeout = 5    # Deadline for the Arduino replies (in s).
+seq_timeout = 30     # Deadline for TXSEQ to finish (in s).
 
 # Starts the program
 print("Polarisation Calibrator (Sender)")
 print("Uploading sequence to Arduino...")
 
 # Opens the sender side serial port
-sender = serial.Serial(serial_addr, baudrate, timeout=timeout)
-
-# Wait until the serial is ready
-# Note: for some computer models, particularly MacOS, the program cannot
-# talk to the serial directly after openin. Need to wait 1-2 second.
+# Wait until the Arduino is ready: it resets when the port is opened, and
+# answers *IDN? once it has booted (instead of a fixed 2 s wait)
 print("Opening the serial port...")
-time.sleep(2)
+sender = st.open_ready(serial_addr, baudrate, timeout=timeout, reset=not no_reset)
 print("Done\n")
 
 # Flushing buffers
@@ -62,10 +66,7 @@ seq = 'POLSEQ ' + sender_seq
 sender.write(seq.encode())
 
 # Block until receive reply
-while True:
-    if sender.in_waiting:
-        print((sender.readlines()[0].decode())) # Should display OK
-        break
+print(sender.read_reply(reply_timeout)) # Should display OK
 
 # Run the sequence
 # Polarization state always returns to 1 at the end
@@ -75,10 +76,7 @@ txseq = 'TXSEQ '
 sender.write(txseq.encode())
 
 # Block until receive reply
-while True:
-    if sender.in_waiting:
-        print((sender.readlines()[0].decode())) # Should display OK
-        break
+print(sender.read_reply(seq_timeout)) # Should display OK
 
 # Print last statement and exits the program
 print("Task done. Look at Receiver for the calibration result")
@@ -0,0 +1,348 @@
+'''
+Description: Monte Carlo simulation of our BB84 bench, to predict the key rate
+and the QBER for a threshold, a polarisation visibility and an eavesdropper
+before the experiment is set up. Whole arrays of pulses are simulated at once
+with NumPy, following the same steps as the real programs:
+  - Alice's RNDSEQ and Bob's RNDBAS sequences, Bob's RXSEQ readings (Malus'
+    law with a finite visibility, ADC background and noise, as arduino_sim.py),
+  - the readings turned into bits with the threshold of recvKeyQ
+    (keysift.threshold_bits) and sifted like keySiftAliceC/keySiftBobC
+    (keysift.match_bases, keysift.sift),
+  - Eve intercepting and resending a fraction of the pulses, and her logged
+    voltages decoded like runInterceptor.py (5 clusters, noise is the largest
+    cluster, one polarisation per run of signal readings, sync pulses dropped).
+Every combination of the parameters is simulated in its own process and the
+results are written as a CSV table (one line per combination).
+
+Usage: python bb84_montecarlo.py --threshold 300 400 500 --visibility 0.9 0.95
+--eve-intercept 0 0.5 1 --out sweep.csv
+
+Options: python bb84_montecarlo.py [-h]
+
+        -h, --help            show this help message and exit
+        --threshold TH [TH ...]
+                              Sets the threshold value(s) for basis differentiation (Bob)
+        --visibility V [V ...]
+                              Sets the polarisation visibility value(s) (default 0.95)
+        --eve-intercept P [P ...]
+                              Sets the fraction(s) of pulses Eve intercepts and resends (default 0)
+        --eve-tap T           Sets the fraction of light going to Eve's detectors (default 0)
+        --power P             Sets the detector reading for the full beam, in ADC counts (default 800)
+        --background B        Sets the detector reading without light (default 20)
+        --noise N             Sets the detector noise, in ADC counts (default 5)
+        --loss L              Sets the fraction of light lost between Alice and Bob (default 0)
+        --pulses N            Sets the number of pulses simulated per combination (default 10000000)
+        --eve-samples N       Sets the number of Eve's readings during a pulse (default 4)
+        --eve-gap N           Sets the number of Eve's readings between two pulses (default 2)
+        --capture-rounds N    Sets the number of rounds in one of Eve's captures (default 4)
+        --round-time T        Sets the duration of a 16 bit round, in s (default: firmware timing)
+        --workers N           Sets the number of processes (default: number of CPUs)
+        --seed SEED           Seeds the random numbers (for reproducible runs)
+        --out FILE            Writes the table into this file (default: printed)
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import os
+import sys
+import csv
+import time
+import pathlib
+import argparse # For running the script with options
+import itertools
+import concurrent.futures
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import keysift as ks
+import arduino_sim as sim
+
+my_parser = argparse.ArgumentParser()
+my_parser.add_argument('--threshold', action='store', type=int, nargs='+', required=True, help='Sets the threshold value(s) for basis differentiation (Bob)')
+my_parser.add_argument('--visibility', action='store', type=float, nargs='+', default=[0.95], help='Sets the polarisation visibility value(s) (default 0.95)')
+my_parser.add_argument('--eve-intercept', action='store', type=float, nargs='+', default=[0.0], help='Sets the fraction(s) of pulses Eve intercepts and resends (default 0)')
+my_parser.add_argument('--eve-tap', action='store', type=float, default=0.0, help="Sets the fraction of light going to Eve's detectors (default 0)")
+my_parser.add_argument('--power', action='store', type=float, default=800, help='Sets the detector reading for the full beam, in ADC counts (default 800)')
+my_parser.add_argument('--background', action='store', type=float, default=20, help='Sets the detector reading without light (default 20)')
+my_parser.add_argument('--noise', action='store', type=float, default=5, help='Sets the detector noise, in ADC counts (default 5)')
+my_parser.add_argument('--loss', action='store', type=float, default=0.0, help='Sets the fraction of light lost between Alice and Bob (default 0)')
+my_parser.add_argument('--pulses', action='store', type=int, default=10**7, help='Sets the number of pulses simulated per combination (default 10000000)')
+my_parser.add_argument('--eve-samples', action='store', type=int, default=4, help="Sets the number of Eve's readings during a pulse (default 4)")
+my_parser.add_argument('--eve-gap', action='store', type=int, default=2, help="Sets the number of Eve's readings between two pulses (default 2)")
+my_parser.add_argument('--capture-rounds', action='store', type=int, default=4, help="Sets the number of rounds in one of Eve's captures (default 4)")
+my_parser.add_argument('--round-time', action='store', type=float, help='Sets the duration of a 16 bit round, in s (default: firmware timing)')
+my_parser.add_argument('--workers', action='store', type=int, default=os.cpu_count(), help='Sets the number of processes (default: number of CPUs)')
+my_parser.add_argument('--seed', action='store', type=int, help='Seeds the random numbers (for reproducible runs)')
+my_parser.add_argument('--out', action='store', type=str, help='Writes the table into this file (default: printed)')
+
+# Parameters
+seqLength = sim.seqLength      # Pulses in a round (16 bit)
+frameLength = seqLength + 1    # Sync pulse + pulses, as seen by Eve
+round_time = 2 * sim.seqSyncBlink + seqLength * sim.seqStepTime # TXSEQ duration (in s)
+chunk_rounds = 8192   # Rounds simulated at once (bounds the memory use).
+num_clusters = 5      # Noise and the four polarisations, as in runInterceptor.py
+fit_samples = 20000   # Eve's readings used to find the clusters.
+kmeans_runs = 3       # Number of k-means starts (the best one is kept).
+kmeans_iter = 30      # Maximum number of Lloyd iterations.
+eve_analysers = (0, 1) # Polarisation of Eve's two analysers: 0(H), 1(D)
+
+# Table columns
+columns = ['threshold', 'visibility', 'eve_intercept', 'eve_tap', 'pulses', 'sift_ratio',
+           'qber', 'key_rate', 'eve_error', 'eve_decoded', 'pulses_per_s']
+
+''' Channel model '''
+
+def malusTable(visibility):
+    # Transmission through an analyser for a polarisation k*45 deg away (k = 0..3),
+    # as OpticalChannel.malus
+    table = visibility * np.cos(np.radians(45 * np.arange(4))) ** 2 + (1 - visibility) / 2
+    return table.astype(np.float32)
+
+def adc(level, p, rng):
+    # Photodiode readings (analogRead, 0 - 1023), as OpticalChannel.adc
+    reading = rng.standard_normal(level.shape, dtype=np.float32)
+    reading *= p['noise']   # In place: this is the bulk of the work
+    reading += level
+    reading += p['background']
+    np.rint(reading, out=reading)
+    np.clip(reading, 0, 1023, out=reading)
+    return reading.astype(np.int16)
+
+def quantumRounds(rounds, p, rng):
+    """
+    Simulates TXSEQ / RXSEQ for rounds x 16 pulses.
+    Returns Alice's polarisations (SEQ?), Bob's bases (SEQ?), the pulses
+    intercepted by Eve and Bob's readings.
+    """
+    n = rounds * seqLength
+    table = malusTable(p['visibility'])
+    rnd = rng.integers(0, 256, n, dtype=np.uint8)
+    polA = rnd & 3          # RNDSEQ: 0(H), 1(D), 2(V), 3(A)
+    basB = (rnd >> 2) & 1   # RNDBAS: 0(H), 1(D)
+    basE = (rnd >> 3) & 1   # Eve's basis
+    intercept = rng.random(n, dtype=np.float32) < p['eve_intercept']
+    # Eve finds the polarisation of her basis (or the orthogonal one) and sends it to Bob
+    found = rng.random(n, dtype=np.float32) < table[(polA - basE) & 3]
+    polB = np.where(intercept, basE + 2 * (~found), polA).astype(np.uint8)
+    level = p['power'] * (1 - p['loss']) * np.where(intercept, 1, 1 - p['eve_tap']).astype(np.float32)
+    volB = adc(level * table[(polB - basB) & 3], p, rng)
+    return polA, basB, intercept, volB
+
+def eveReadings(polA, intercept, p, rng):
+    """
+    Simulates Eve's VOLTS? log (key_logger.py) for the rounds of polA: the sync
+    pulse (D) and the 16 pulses of every round, eve_samples readings of each
+    pulse followed by eve_gap readings of the dark gap.
+    Returns both photodiode readings and the polarisation of every reading
+    (-1 when dark).
+    """
+    rounds = len(polA) // seqLength
+    table = malusTable(p['visibility'])
+    sync = np.full((rounds, 1), sim.seqInitTarget, dtype=np.uint8)
+    pols = np.hstack((sync, polA.reshape(rounds, seqLength)))
+    tapped = np.hstack((rng.random((rounds, 1)) < p['eve_intercept'], intercept.reshape(rounds, seqLength)))
+    # Intercepting, Eve gets the full beam (half on each photodiode)
+    share = p['power'] * np.where(tapped, 0.5, p['eve_tap'] / 2).astype(np.float32)
+    lit = np.ones(p['eve_samples'] + p['eve_gap'], dtype=bool)
+    lit[p['eve_samples']:] = False
+    readings = []
+    for analyser in eve_analysers:
+        level = (share * table[(pols - analyser) & 3])[:, :, None] * lit
+        readings.append(adc(level, p, rng).ravel())
+    truth = np.where(lit, pols[:, :, None].astype(np.int8), -1).ravel()
+    return readings[0], readings[1], truth
+
+''' Eve's decoding '''
+
+def nearest(data, centroids):
+    # Index of the closest centroid for every point
+    best = np.full(len(data), np.inf, dtype=np.float32)
+    labels = np.zeros(len(data), dtype=np.int64)
+    for i, centroid in enumerate(centroids):
+        dist = ((data - centroid) ** 2).sum(axis=1)
+        closer = dist < best
+        best[closer] = dist[closer]
+        labels[closer] = i
+    return labels, best
+
+def kmeans(data, k, rng):
+    """
+    Lloyd's algorithm with k-means++ starts (KMeans in kclassify2D).
+    Returns the centroids of the best of kmeans_runs starts.
+    """
+    best_inertia, best_centroids = np.inf, None
+    for run in range(kmeans_runs):
+        centroids = data[[rng.integers(len(data))]]
+        for i in range(1, k):
+            dist = nearest(data, centroids)[1].astype(np.float64)
+            weights = dist / dist.sum() if dist.sum() > 0 else None
+            centroids = np.vstack((centroids, data[rng.choice(len(data), p=weights)]))
+        for i in range(kmeans_iter):
+            labels, _ = nearest(data, centroids)
+            moved = np.array([data[labels == c].mean(axis=0) if np.any(labels == c) else centroids[c]
+                              for c in range(k)], dtype=np.float32)
+            if np.allclose(moved, centroids):
+                break
+            centroids = moved
+        labels, dist = nearest(data, centroids)
+        if dist.sum() < best_inertia:
+            best_inertia, best_centroids = dist.sum(), centroids
+    return best_centroids
+
+def fitClusters(x, y, truth, rng):
+    """
+    Finds Eve's clusters on the first readings, as done once per .dat file.
+    The readings are scaled like normalize in kclassify2D. Returns the cluster
+    of every possible pair of readings, the noise cluster (the largest one) and
+    the polarisation of every cluster, i.e. the assignment of the student who
+    picked the key that makes sense.
+    """
+    data = np.c_[x[:fit_samples], y[:fit_samples]].astype(np.float32)
+    scale = np.linalg.norm(data, axis=0)
+    scale[scale == 0] = 1
+    data /= scale
+    centroids = kmeans(data, num_clusters, rng)
+    labels, _ = nearest(data, centroids)
+    noise = np.argmax(np.bincount(labels, minlength=num_clusters))
+    truth = truth[:fit_samples]
+    polarisation = np.zeros(num_clusters, dtype=np.int8)
+    for c in range(num_clusters):
+        pols = truth[(labels == c) & (truth >= 0)]
+        if len(pols):
+            polarisation[c] = np.argmax(np.bincount(pols, minlength=4))
+    polarisation[noise] = -1
+    # The readings are ADC counts: look the clusters up instead of measuring distances
+    grid = np.arange(1024, dtype=np.float32)
+    points = np.c_[np.repeat(grid, 1024), np.tile(grid, 1024)] / scale
+    lookup = nearest(points, centroids)[0].astype(np.uint8).reshape(1024, 1024)
+    return lookup, noise, polarisation
+
+def eveDecode(x, y, clusters, p):
+    """
+    Decodes Eve's readings like runInterceptor.py: every run of signal (not
+    noise) readings gives the most common cluster of the run
+    (process_clustered_signals), the first of every 17 runs of a capture is a
+    sync pulse and is dropped. Returns the polarisation found for every pulse
+    (-1 when Eve has none, e.g. when runs were split or merged).
+    """
+    lookup, noise, polarisation = clusters
+    labels = lookup[x, y]
+    capture = p['capture_rounds'] * frameLength * (p['eve_samples'] + p['eve_gap']) # Readings in a capture
+    capture_pulses = p['capture_rounds'] * seqLength
+    num_pulses = len(x) // (frameLength * (p['eve_samples'] + p['eve_gap'])) * seqLength
+    signal = labels != noise
+    starts = signal.copy()
+    starts[1:] &= ~signal[:-1]
+    starts[::capture] = signal[::capture] # Captures are decoded separately
+    run_id = np.cumsum(starts)[signal] - 1
+    num_runs = run_id[-1] + 1 if len(run_id) else 0
+    # Most common cluster of every run (ties go to the lowest cluster number)
+    counts = np.bincount(run_id * num_clusters + labels[signal], minlength=num_runs * num_clusters)
+    mode = counts.reshape(num_runs, num_clusters).argmax(axis=1)
+    # Position of every run in its capture, without the sync pulses (del result_list[0::17])
+    run_capture = np.flatnonzero(starts) // capture
+    rank = np.arange(num_runs) - np.searchsorted(run_capture, run_capture)
+    pulse = rank - rank // frameLength - 1
+    keep = (rank % frameLength != 0) & (pulse < capture_pulses)
+    decoded = np.full(num_pulses, -1, dtype=np.int8)
+    decoded[run_capture[keep] * capture_pulses + pulse[keep]] = polarisation[mode[keep]]
+    return decoded
+
+''' Simulation '''
+
+def simulate(p):
+    """
+    Simulates p['pulses'] pulses (rounded up to whole captures) for one set of
+    parameters, returns a row of the table.
+    """
+    rng = np.random.default_rng(p['seed'])
+    eve = p['eve_intercept'] > 0 or p['eve_tap'] > 0
+    rounds = -(-p['pulses'] // seqLength)
+    rounds = -(-rounds // p['capture_rounds']) * p['capture_rounds']
+    chunk = max(1, chunk_rounds // p['capture_rounds']) * p['capture_rounds']
+    sifted = errors = eve_errors = eve_decoded = 0
+    clusters = None
+    time_start = time.time()
+    for done in range(0, rounds, chunk):
+        polA, basB, intercept, volB = quantumRounds(min(chunk, rounds - done), p, rng)
+        valA, basA = polA >> 1, polA & 1    # SEQ? digit = 2 x value + basis
+        resB = ks.threshold_bits(volB, p['threshold'])
+        match = ks.match_bases(basA, basB)
+        siftA = ks.sift(valA, match)
+        siftB = ks.sift(resB, match)
+        sifted += len(siftA)
+        errors += np.count_nonzero(siftA != siftB)
+        if eve:
+            x, y, truth = eveReadings(polA, intercept, p, rng)
+            if clusters is None:
+                clusters = fitClusters(x, y, truth, rng)
+            decoded = eveDecode(x, y, clusters, p)
+            siftE = decoded[match.astype(bool)]
+            eve_decoded += np.count_nonzero(decoded >= 0)
+            # rawKey_bin: 0(H), 1(D) -> 0, 2(V), 3(A) -> 1
+            eve_errors += np.count_nonzero((siftE < 0) | ((siftE >= 2) != siftA))
+    duration = time.time() - time_start
+    pulses = rounds * seqLength
+    return {'threshold': p['threshold'],
+            'visibility': p['visibility'],
+            'eve_intercept': p['eve_intercept'],
+            'eve_tap': p['eve_tap'],
+            'pulses': pulses,
+            'sift_ratio': sifted / pulses,
+            'qber': errors / sifted if sifted else float('nan'),
+            'key_rate': sifted / (rounds * p['round_time']),
+            'eve_error': eve_errors / sifted if eve and sifted else float('nan'),
+            'eve_decoded': eve_decoded / pulses if eve else float('nan'),
+            'pulses_per_s': pulses / duration if duration > 0 else float('inf')}
+
+def sweep(points, workers):
+    # Simulates every set of parameters, in a pool of processes
+    if workers <= 1 or len(points) == 1:
+        return [simulate(p) for p in points]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(simulate, points))
+
+def writeTable(rows, out):
+    # Compact CSV table, 4 significant digits
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([f"{row[c]:.4g}" if isinstance(row[c], float) else row[c] for c in columns])
+
+def main():
+    args = my_parser.parse_args()
+    for name in ('pulses', 'eve_samples', 'capture_rounds'):
+        if vars(args).get(name) < 1:
+            my_parser.error(f"--{name.replace('_', '-')} must be at least 1")
+    if args.eve_gap < 1:
+        my_parser.error('--eve-gap must be at least 1 (the pulses are separated by a dark gap)')
+    # One set of parameters per combination, each with its own random numbers
+    combinations = list(itertools.product(args.threshold, args.visibility, args.eve_intercept))
+    seeds = np.random.SeedSequence(args.seed).spawn(len(combinations))
+    points = [{'threshold': threshold, 'visibility': visibility, 'eve_intercept': eve_intercept,
+               'eve_tap': args.eve_tap, 'power': args.power, 'background': args.background,
+               'noise': args.noise, 'loss': args.loss, 'pulses': args.pulses,
+               'eve_samples': args.eve_samples, 'eve_gap': args.eve_gap,
+               'capture_rounds': args.capture_rounds,
+               'round_time': args.round_time if args.round_time else round_time, 'seed': seed}
+              for (threshold, visibility, eve_intercept), seed in zip(combinations, seeds)]
+    time_start = time.time()
+    rows = sweep(points, args.workers)
+    duration = time.time() - time_start
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            writeTable(rows, f)
+        print(f"Table written to {args.out}")
+    else:
+        writeTable(rows, sys.stdout)
+    total = sum([row['pulses'] for row in rows])
+    print(f"{len(rows)} combinations, {total} pulses in {duration:.1f} s ({total/duration:.3g} pulses/s)", file=sys.stderr)
+
+if __name__=='__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print ("\nProgram interrupted. Thank you for using the program!")
+        sys.exit()  # Exits the program
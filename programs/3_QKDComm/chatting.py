@@ -10,23 +10,29 @@ Options: python chatting.py [-h]
 
         -h, --help       show this help message and exit
         --serial SERIAL  Sets the serial address of the Arduino
+        --no-reset       Opens the serial port without resetting the Arduino (DTR kept low)
 
 Author: Qcumber 2018
 
 Version: 1.0
 '''
 
-import serial
 import sys
 import time
+import pathlib
 import argparse # For running the script with options
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import serial_transport as st
+
 my_parser = argparse.ArgumentParser()
 my_parser.add_argument('--serial', action='store', type=str, required=True, help='Sets the serial address of the Arduino')
+my_parser.add_argument('--no-reset', action='store_true', help='Opens the serial port without resetting the Arduino (DTR kept low)')
 
 # Get the serial address
 args = my_parser.parse_args()
 serial_addr = vars(args).get('serial')
+no_reset = vars(args).get('no_reset') # Keeps the Arduino running (no auto-reset)
 
 
 # Other parameters declarations
@@ -35,13 +41,10 @@ rep_wait_time = 0.3  # Wait time between packets (in s).
 timeout = 0.1        # Serial timeout (in s).
 
 # Opens the device side serial port
-device = serial.Serial(serial_addr, baudrate, timeout=timeout)
-
-# Wait until the serial is ready
-# Note: for some computer models, particularly MacOS, the program cannot
-# talk to the serial directly after openin. Need to wait 1-2 second.
+# Wait until the Arduino is ready: it resets when the port is opened, and
+# answers *IDN? once it has booted (instead of a fixed 2 s wait)
 print("Opening the serial port...")
-time.sleep(2)
+device = st.open_ready(serial_addr, baudrate, timeout=timeout, reset=not no_reset)
 print("Done\n")
 
 print("Qcumber ChatBox v1.00")
@@ -86,31 +89,30 @@ while True:
         device.reset_input_buffer() # Flush all the garbages
         device.write('RECV '.encode()) # Flag to recv
         while True:
-            if device.in_waiting:
-                hex_string = device.read(8)
-                device.write('RECV '.encode()) # Flag to recv
-                # Looking for start of text
-                if hex_string[:7] == b'2131313':
-                    print ("--- START OF TEXT ---")
-                    state = 1
-                elif state == 1:
-                    try:
-                        # Looking for end of text
-                        if hex_string == b'3030303':
-                            device.write('#'.encode()) # Flag to end listening
-                            print ("\n--- END OF TEXT ---")
-                            break
-                        # Check and modify the length of string to 8 HEX char
-                        hex_string = hex_string.decode()
-                        if len(hex_string) < 8:
-                            hex_string = hex_string.zfill(8)
-                        # Convert to ASCII string
-                        hex_list= list(map(''.join, list(zip(*[iter(hex_string)]*2))))
-                        ascii_string = "".join([chr(int("0x"+each_hex,0)) for each_hex in hex_list])
-                        sys.stdout.write(ascii_string)
-                        sys.stdout.flush()
-                    except ValueError:
-                        print("\n ERROR! UNABLE TO DECODE STRING!")
+            hex_string = device.read_packet(8)
+            device.write('RECV '.encode()) # Flag to recv
+            # Looking for start of text
+            if hex_string[:7] == b'2131313':
+                print ("--- START OF TEXT ---")
+                state = 1
+            elif state == 1:
+                try:
+                    # Looking for end of text
+                    if hex_string == b'3030303':
+                        device.write('#'.encode()) # Flag to end listening
+                        print ("\n--- END OF TEXT ---")
+                        break
+                    # Check and modify the length of string to 8 HEX char
+                    hex_string = hex_string.decode()
+                    if len(hex_string) < 8:
+                        hex_string = hex_string.zfill(8)
+                    # Convert to ASCII string
+                    hex_list= list(map(''.join, list(zip(*[iter(hex_string)]*2))))
+                    ascii_string = "".join([chr(int("0x"+each_hex,0)) for each_hex in hex_list])
+                    sys.stdout.write(ascii_string)
+                    sys.stdout.flush()
+                except ValueError:
+                    print("\n ERROR! UNABLE TO DECODE STRING!")
     except KeyboardInterrupt:
         device.write('#'.encode()) # Flag to force end listening
         print ("\nThank you for using the program!")
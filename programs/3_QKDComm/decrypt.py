@@ -1,39 +1,80 @@
 '''
 Description: Python wrapper program to decrypt an encrypted message using the secure key
-generated by recv/send_32bitQKD.py. The key is expanded with Mersenne Twister PRNG.
+generated by recv/send_32bitQKD.py. The key is expanded with Mersenne Twister PRNG
+(see keystream.py).
 
-Usage: Start the program and follow the printed insructions.
+Usage: Start the program and follow the printed insructions. Files (or pipes)
+of any size encrypted by encrypt.py can be decrypted with --in / --out, e.g.
+python decrypt.py --key 1a2b3c4d --in log.enc --out log.dat --binary
+
+Options: python decrypt.py [-h] [--key KEY] [--in IN] [--out OUT] [--binary]
+
+        -h, --help   show this help message and exit
+        --key KEY    Sets the secure key (in 32 bit hex) instead of asking for it
+        --in IN      Decrypts this file instead of a typed message ("-" for stdin)
+        --out OUT    Writes the decrypted file here (default: stdout)
+        --binary     Reads raw bytes instead of hex (with --in / --out)
 
 Author: Qcumber 2018
 
 Version: 1.0
 '''
 
-import numpy as np
-import random
+import sys
+import pathlib
+import argparse # For running the script with options
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import keystream as kst
+
+my_parser = argparse.ArgumentParser()
+my_parser.add_argument('--key', action='store', type=str, help='Sets the secure key (in 32 bit hex) instead of asking for it')
+my_parser.add_argument('--in', action='store', type=str, help='Decrypts this file instead of a typed message ("-" for stdin)')
+my_parser.add_argument('--out', action='store', type=str, help='Writes the decrypted file here (default: stdout)')
+my_parser.add_argument('--binary', action='store_true', help='Reads raw bytes instead of hex (with --in / --out)')
+args = my_parser.parse_args()
+
+key = vars(args).get('key')
+in_file = vars(args).get('in')
+out_file = vars(args).get('out')
+if key is not None and kst.parse_key(key) is None:
+    my_parser.error('--key must be the secure key in 32 bit hex (8 hex digits, e.g. 1a2b3c4d)')
+
+if in_file is not None or out_file is not None:
+    # File mode: the messages go to stderr, stdout may be the decrypted data
+    if key is None:
+        my_parser.error('--key (32 bit hex) is needed to decrypt a file')
+    fin = sys.stdin.buffer if in_file in (None, '-') else open(in_file, 'rb')
+    fout = sys.stdout.buffer if out_file in (None, '-') else open(out_file, 'wb')
+    try:
+        count = kst.crypt_stream(fin, fout, kst.parse_key(key), hex_in=not args.binary)
+    except ValueError as e:
+        print(f"The encrypted file is not valid hex ({e}). Use --binary for raw bytes", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if fin is not sys.stdin.buffer:
+            fin.close()
+        if fout is not sys.stdout.buffer:
+            fout.close()
+    print(f"Decrypted {count} bytes", file=sys.stderr)
+    sys.exit()
 
 print("\nWelcome to decrypt! Please enter the encrypted text:")
 encryptedMessage = input()
 
-print("\nNow, please enter the key (in 32 bit hex):")
-key = input()
-if len(key) == 8 and len(encryptedMessage)%2 == 0:
-    # Convert to int representation
-    key_int = int("0x"+key, 0)
-    # Using the key as the seed
-    random.seed(key_int)
-    # Get an array of expanded key. Each element corresponds to a byte
-    expKey_arr = [int(random.getrandbits(8)) for i in range(len(encryptedMessage)//2)]
-    # Construct each byte of encrypted message to an array
-    encrypted_arr = list(map(''.join, list(zip(*[iter(encryptedMessage)]*2))))
-    xorMessage = [int(encrypted_arr[i],16)^expKey_arr[i] for i in range(len(encryptedMessage)//2)]
+if key is None:
+    print("\nNow, please enter the key (in 32 bit hex):")
+    key = input()
+key_int = kst.parse_key(key) # Int representation (None if it is not 32 bit hex)
+if key_int is not None and len(encryptedMessage)%2 == 0:
+    # XOR with the expanded key (using the key as the seed)
+    xorMessage = kst.crypt(bytes.fromhex(encryptedMessage), key_int)
     # Convert back to ascii
-    message = [chr(xorMessage[i]) for i in range(len(encryptedMessage)//2)]
-    message = ''.join(message)
+    message = xorMessage.decode('latin-1')
     print("\nThe decrypted message is:")
     print(message)
     print("\nCongratulations! Thank you for using the program!")
 else :
-    print("Either the key is not 4 bytes, or the message length is incorrect. Please try again")
+    print("Either the key is not 4 bytes in hex, or the message length is incorrect. Please try again")
     print(len(key))
     print(len(encryptedMessage))
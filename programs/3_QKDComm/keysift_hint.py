@@ -11,8 +11,12 @@ Version: 1.0
 
 import sys
 import time
+import pathlib
 import numpy as np
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import keysift as ks
+
 # Function to convert to hex, with a predefined nbits
 def tohex(val, nbits):
   return hex((val + (1 << nbits)) % (1 << nbits))
@@ -53,35 +57,19 @@ while True:
             print("Binary representation:",\
                 basisB_bin[:4], basisB_bin[4:8], basisB_bin[8:12], basisB_bin[12:16])
 
-            matchbs_int = ~ (basisA_int ^ basisB_int) # Negative of exclusive OR.
-            matchbs_hex = tohex(matchbs_int, 16) # 16 bits
-            matchbs_int = int(matchbs_hex, 0) # Need convert again from hex
-            # Note: This is to trim down the integer back to 16 bit.
-            # The negation in the bitwise operation introduces a sign flip at the 17th bit.
-            matchbs_bin = np.binary_repr(matchbs_int, width=16) # Binary string
+            matchbs_bin = ks.to_str(ks.match_bases(basisA_bin, basisB_bin)) # Negative of exclusive OR.
             print ("\nThe matched basis is given below. Send this to Bob!")
-            print("Hex representation:", matchbs_hex[2:].zfill(4))
+            print("Hex representation:", ks.bits_to_hex(ks.to_bits(matchbs_bin)))
             print("Binary representation:",\
                 matchbs_bin[:4], matchbs_bin[4:8], matchbs_bin[8:12], matchbs_bin[12:16])
 
             # Performing sifting process
-            siftmask_bin = ''
-            for i in range(16): # 16 bits
-                if matchbs_bin[i] == '0' :
-                    siftmask_bin += 'X'
-                elif matchbs_bin[i] == '1':
-                    siftmask_bin += unkey_bin[i]
+            siftmask_bin = ks.sift_mask_str(unkey_bin, matchbs_bin)
             print("\nMatched key bits:",\
                 siftmask_bin[:4], siftmask_bin[4:8], siftmask_bin[8:12], siftmask_bin[12:16])
             # Remove all the X'es
-            siftkey_bin = ''
-            siftkey_len = 0
-            for bit in siftmask_bin:
-                if bit == 'X':
-                    pass
-                else:
-                    siftkey_bin += bit
-                    siftkey_len += 1
+            siftkey_bin = ks.sift_str(unkey_bin, matchbs_bin)
+            siftkey_len = len(siftkey_bin)
             siftkey_bin = siftkey_bin.zfill(16) # pad to make length 16 bit
 
             # Print final result
@@ -123,23 +111,12 @@ while True:
                 matchbs_bin[:4], matchbs_bin[4:8], matchbs_bin[8:12], matchbs_bin[12:16])
 
             # Performing sifting process
-            siftmask_bin = ''
-            for i in range(16): # 16 bits
-                if matchbs_bin[i] == '0' :
-                    siftmask_bin += 'X'
-                elif matchbs_bin[i] == '1':
-                    siftmask_bin += unkey_bin[i]
+            siftmask_bin = ks.sift_mask_str(unkey_bin, matchbs_bin)
             print("\nMatched key bits:",\
                 siftmask_bin[:4], siftmask_bin[4:8], siftmask_bin[8:12], siftmask_bin[12:16])
             # Remove all the X'es
-            siftkey_bin = ''
-            siftkey_len = 0
-            for bit in siftmask_bin:
-                if bit == 'X':
-                    pass
-                else:
-                    siftkey_bin += bit
-                    siftkey_len += 1
+            siftkey_bin = ks.sift_str(unkey_bin, matchbs_bin)
+            siftkey_len = len(siftkey_bin)
             siftkey_bin = siftkey_bin.zfill(16) # pad to make length 16 bit
 
             # Print final result
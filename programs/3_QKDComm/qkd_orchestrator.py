@@ -0,0 +1,356 @@
+'''
+Description: Runs complete BB84 sessions with Alice, Bob (and optionally Eve)
+attached to the same computer, from one asyncio event loop. Instead of the
+fixed sleeps used by send_32bitQKD.py / recv_32bitQKD.py (wait_till_sync,
+rep_wait_time), every step waits for the reply it depends on:
+  - the Arduinos are ready when they answer *IDN? (no 2 s sleep),
+  - Bob's RXSEQ is sent (and flushed) before Alice's TXSEQ is started,
+  - each IR packet is sent once the receiving Classical Arduino (and Eve's)
+    has returned the previous one (a lost packet is sent again).
+Many sessions can be run back to back to measure the key rate of a bench.
+
+Usage: Connect all the Arduinos to this computer and run the program once
+(no need for the send/recv programs). Eve's Classical Arduino logs the IR
+packets like listener.py, Eve's Arduino logs the photodiode voltages during
+the quantum rounds like key_logger.py.
+
+Options: python qkd_orchestrator.py [-h]
+
+        -h, --help           show this help message and exit
+        --alice-c SERIAL     Sets the serial address of Alice's Classical Arduino
+        --alice-q SERIAL     Sets the serial address of Alice's Quantum Arduino
+        --bob-c SERIAL       Sets the serial address of Bob's Classical Arduino
+        --bob-q SERIAL       Sets the serial address of Bob's Quantum Arduino
+        --eve-c SERIAL       Sets the serial address of Eve's Classical Arduino (optional)
+        --eve-q SERIAL       Sets the serial address of Eve's Arduino (optional)
+        --threshold TH       Sets the threshold value for basis differentiation (Bob)
+        --key-bits N         Sets the number of sifted key bits per session (default 32)
+        --sessions N         Runs this many sessions back to back (default 1)
+        --pipeline           Overlaps the next quantum round with the key sifting of the
+                             current one
+        --eve-file FILE      Logs Eve's voltages into this file
+        --sim                Runs on simulated Arduinos (arduino_sim.py) instead of the
+                             serial ports, at full speed (Eve included)
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import sys
+import time
+import pathlib
+import asyncio
+import argparse # For running the script with options
+import serial
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import keysift as ks
+import serial_transport as st
+import arduino_sim as sim
+
+my_parser = argparse.ArgumentParser()
+my_parser.add_argument('--alice-c', action='store', type=str, help="Sets the serial address of Alice's Classical Arduino")
+my_parser.add_argument('--alice-q', action='store', type=str, help="Sets the serial address of Alice's Quantum Arduino")
+my_parser.add_argument('--bob-c', action='store', type=str, help="Sets the serial address of Bob's Classical Arduino")
+my_parser.add_argument('--bob-q', action='store', type=str, help="Sets the serial address of Bob's Quantum Arduino")
+my_parser.add_argument('--eve-c', action='store', type=str, help="Sets the serial address of Eve's Classical Arduino (optional)")
+my_parser.add_argument('--eve-q', action='store', type=str, help="Sets the serial address of Eve's Arduino (optional)")
+my_parser.add_argument('--threshold', action='store', type=int, required=True, help='Sets the threshold value for basis differentiation')
+my_parser.add_argument('--key-bits', action='store', type=int, default=32, help='Sets the number of sifted key bits per session (default 32)')
+my_parser.add_argument('--sessions', action='store', type=int, default=1, help='Runs this many sessions back to back (default 1)')
+my_parser.add_argument('--pipeline', action='store_true', help='Overlaps the next quantum round with the key sifting of the current one')
+my_parser.add_argument('--eve-file', action='store', type=str, help="Logs Eve's voltages into this file")
+my_parser.add_argument('--sim', action='store_true', help='Runs on simulated Arduinos (arduino_sim.py) instead of the serial ports')
+
+# Parameters
+baudrate = 38400      # Default in Arduino
+timeout = 0.1         # Serial timeout (in s).
+reply_timeout = 5     # Deadline for the Arduino replies (in s).
+seq_timeout = 30      # Deadline for TXSEQ / RXSEQ to finish (in s).
+ir_timeout = 2        # Deadline for an IR packet to arrive (in s).
+ir_retries = 3        # Number of times a lost IR packet is sent again.
+ready_timeout = 10    # Time given to the Arduinos to boot and answer *IDN? (in s).
+arm_time = 0.05       # RXSEQ and RECV have no reply: time to parse them before the sender starts (in s).
+refresh_rate = 0.05   # Time between Eve's voltage readings (in s).
+
+# Packet contents
+HEADER = {'A': b'\x07\x07\x07A', 'B': b'\x07\x07\x07B'}
+STX = b'\x02\x13\x13\x13'
+ETX = b'\x03\x03\x03\x03'
+
+''' Helper functions '''
+
+def packetToBytes(hex_string):
+    # The Arduino prints the IR packet in hex, without the leading zeros
+    return bytes.fromhex(hex_string.strip().zfill(8))
+
+class Device(object):
+    # One Arduino, with awaitable replies (the blocking reads run in a worker thread)
+
+    def __init__(self, name, port):
+        self.name = name
+        self.transport = st.SerialTransport(port, baudrate, timeout=timeout)
+        self.port = self.transport.port
+
+    async def write(self, data):
+        # Writes and waits until the bytes have left the computer
+        if isinstance(data, str):
+            data = data.encode()
+        self.transport.write(data)
+        await asyncio.to_thread(self.transport.serial.flush)
+
+    async def reply(self, timeout=reply_timeout):
+        return await asyncio.to_thread(self.transport.read_reply, timeout)
+
+    async def packet(self, size=8, timeout=ir_timeout, gap=None):
+        return await asyncio.to_thread(self.transport.read_packet, size, timeout, gap)
+
+    async def command(self, cmd, timeout=reply_timeout):
+        await self.write(cmd)
+        return await self.reply(timeout)
+
+    async def identify(self, expected):
+        # The Arduino resets when the port is opened, ask until it answers (see serial_transport.wait_ready)
+        try:
+            idn = await asyncio.to_thread(self.transport.wait_ready, ready_timeout)
+        except serial.SerialTimeoutException:
+            raise serial.SerialTimeoutException(f"{self.name} ({self.port}) does not answer *IDN?")
+        if idn != expected:
+            raise RuntimeError(f"{self.name} ({self.port}) is a {idn!r} Arduino, expected {expected!r}")
+        print(f"{self.name} ready on {self.port}")
+        return idn
+
+    def close(self):
+        self.transport.close()
+
+class Bench(object):
+    # All the Arduinos of the bench, and the BB84 steps between them
+
+    def __init__(self, ports, threshold, eve_file=None):
+        self.threshold = threshold
+        self.aliceC = Device("Alice (classical)", ports['alice_c'])
+        self.aliceQ = Device("Alice (quantum)", ports['alice_q'])
+        self.bobC = Device("Bob (classical)", ports['bob_c'])
+        self.bobQ = Device("Bob (quantum)", ports['bob_q'])
+        self.eveC = Device("Eve (classical)", ports['eve_c']) if ports.get('eve_c') else None
+        self.eveQ = Device("Eve (quantum)", ports['eve_q']) if ports.get('eve_q') else None
+        self.eve_file = open(eve_file, "a") if eve_file else None
+        self.eve_packets = []   # What Eve heard on the IR channel
+        self.eve_missed = 0     # IR packets Eve did not hear
+        self.eve_volts = []     # What Eve measured on the quantum channel
+        self.ir_packets = 0     # Number of IR packets sent
+        self.ir_resent = 0      # Number of IR packets sent again
+
+    def devices(self):
+        return [dev for dev in (self.aliceC, self.aliceQ, self.bobC, self.bobQ, self.eveC, self.eveQ) if dev is not None]
+
+    async def open(self):
+        # All the boards boot in parallel
+        jobs = [self.aliceC.identify('Classical'), self.aliceQ.identify('Quantum'),
+                self.bobC.identify('Classical'), self.bobQ.identify('Quantum')]
+        if self.eveC is not None:
+            jobs.append(self.eveC.identify('Classical'))
+        if self.eveQ is not None:
+            jobs.append(self.eveQ.identify('QuantumEve'))
+        await asyncio.gather(*jobs)
+
+    def close(self):
+        for dev in self.devices():
+            dev.close()
+        if self.eve_file is not None:
+            self.eve_file.close()
+
+    ''' Quantum channel '''
+
+    async def eveListenQ(self, done):
+        # Eve reads her photodiodes until the quantum round is over
+        while not done.is_set():
+            await self.eveQ.write('VOLTS? ')
+            volt_now1 = await self.eveQ.reply()
+            volt_now2 = await self.eveQ.reply()
+            self.eve_volts.append((volt_now1, volt_now2))
+            if self.eve_file is not None:
+                self.eve_file.write(volt_now1 + " " + volt_now2 + " " + "\n")
+            await asyncio.sleep(refresh_rate)
+
+    async def quantumRound(self):
+        # One 16 bit round: returns Alice's values and bases, Bob's results and bases
+        await asyncio.gather(self.aliceQ.command('RNDSEQ '), self.bobQ.command('RNDBAS '))
+        seqA_str, basB_str = await asyncio.gather(self.aliceQ.command('SEQ? '), self.bobQ.command('SEQ? '))
+        valA_str = "".join([str(int(d) // 2) for d in seqA_str])
+        basA_str = "".join([str(int(d) % 2) for d in seqA_str])
+        # Bob must be waiting for the sync pulse before Alice sends it
+        await self.bobQ.write('RXSEQ ')
+        await asyncio.sleep(arm_time)
+        done = asyncio.Event()
+        eve = asyncio.create_task(self.eveListenQ(done)) if self.eveQ is not None else None
+        try:
+            tx_reply, mes_str = await asyncio.gather(self.aliceQ.command('TXSEQ ', seq_timeout),
+                                                     self.bobQ.reply(seq_timeout))
+        finally:
+            done.set()
+            if eve is not None:
+                await eve
+        # Higher than threshold -> 0, lower than threshold -> 1
+        resB_str = ks.to_str(ks.threshold_bits(mes_str.split(), self.threshold))
+        return valA_str, basA_str, resB_str, basB_str
+
+    ''' Classical channel '''
+
+    async def eveHearC(self, size):
+        # Eve's capture of the packet just sent (armed with the receiver, see sendPacketC)
+        try:
+            # A packet is printed in one go (8 characters take 2 ms)
+            hex_string = (await self.eveC.packet(size, timeout=0.5, gap=0.01)).decode()
+        except serial.SerialTimeoutException:
+            self.eve_missed += 1
+            print("Eve missed an IR packet")
+            await self.eveC.write('#') # Missed it: flag to end listening
+            try:
+                await self.eveC.reply(timeout=1) # Listening interrupted!
+            except serial.SerialTimeoutException:
+                pass
+            return
+        try:
+            self.eve_packets.append(packetToBytes(hex_string))
+        except ValueError:
+            self.eve_missed += 1    # Not a packet (e.g. noise)
+            print(f"Eve heard {hex_string!r} instead of an IR packet")
+
+    async def sendPacketC(self, sender, receiver, packet):
+        # Sends one 4 byte IR packet, and waits until the receiver (and Eve) got it.
+        # RECV returns after one packet, so Eve is armed for every packet, like the
+        # receiver, and the next packet is only sent once she has had it as well.
+        self.ir_packets += 1
+        size = len(f"{int.from_bytes(packet, 'big'):X}") # Printed without the leading zeros
+        await receiver.write('RECV ')
+        if self.eveC is not None:
+            await self.eveC.write('RECV ')
+        await asyncio.sleep(arm_time)
+        for attempt in range(ir_retries + 1):
+            await sender.write(b'SEND ' + packet)
+            try:
+                received = packetToBytes((await receiver.packet(size)).decode())
+            except serial.SerialTimeoutException:
+                self.ir_resent += 1
+                continue    # The receiver is still listening, send it again
+            if received != packet:
+                raise RuntimeError(f"{receiver.name} received {received!r} instead of {packet!r}")
+            if self.eveC is not None:
+                await self.eveHearC(size)
+            return received
+        await receiver.write('#') # Flag to end listening
+        if self.eveC is not None:
+            await self.eveHearC(size)
+        raise serial.SerialTimeoutException(f"{receiver.name} did not receive the IR packet {packet!r}")
+
+    async def sendMessageC(self, sender, receiver, who, message_str):
+        # Sends a message (header, then 4 bytes, or STX + 4 byte packets + ETX)
+        await self.sendPacketC(sender, receiver, HEADER[who])
+        if len(message_str) == 4:
+            await self.sendPacketC(sender, receiver, message_str.encode())
+            return message_str
+        await self.sendPacketC(sender, receiver, STX)
+        for str_ptr in range(0, len(message_str), 4):
+            await self.sendPacketC(sender, receiver, message_str[str_ptr:str_ptr+4].ljust(4).encode())
+        await self.sendPacketC(sender, receiver, ETX)
+        return message_str
+
+    async def keySiftC(self, rounds, round_id):
+        # Key sifting over the IR channel, for one or more quantum rounds
+        valA_bits = ks.to_bits("".join([r[0] for r in rounds]))
+        basA_bits = ks.to_bits("".join([r[1] for r in rounds]))
+        resB_bits = ks.to_bits("".join([r[2] for r in rounds]))
+        basB_bits = ks.to_bits("".join([r[3] for r in rounds]))
+        await self.sendMessageC(self.aliceC, self.bobC, 'A', f"R{round_id % 4096:03x}")
+        await self.sendMessageC(self.bobC, self.aliceC, 'B', ks.bits_to_hex(basB_bits))
+        matchbs_bits = ks.match_bases(basA_bits, basB_bits)
+        await self.sendMessageC(self.aliceC, self.bobC, 'A', ks.bits_to_hex(matchbs_bits))
+        return ks.sift(valA_bits, matchbs_bits), ks.sift(resB_bits, matchbs_bits)
+
+    ''' Sessions '''
+
+    async def session(self, key_bits, pipeline=False):
+        # One BB84 session, until Alice and Bob have key_bits sifted bits
+        keyA_bits = np.zeros(0, dtype=np.uint8)
+        keyB_bits = np.zeros(0, dtype=np.uint8)
+        round_id = 0
+        time_start = time.time()
+        rounds = [await self.quantumRound()]
+        while rounds:
+            # With pipeline, the next quantum round runs while this one is sifted,
+            # unless this round is expected to complete the key (8 of 16 bits sifted)
+            next_round = None
+            if pipeline and len(keyA_bits) + 8 < key_bits:
+                next_round = asyncio.create_task(self.quantumRound())
+            siftA_bits, siftB_bits = await self.keySiftC(rounds, round_id)
+            keyA_bits = np.concatenate((keyA_bits, siftA_bits))
+            keyB_bits = np.concatenate((keyB_bits, siftB_bits))
+            round_id += 1
+            if next_round is not None:
+                rounds = [await next_round]
+            elif len(keyA_bits) < key_bits:
+                rounds = [await self.quantumRound()]
+            else:
+                rounds = []
+        duration = time.time() - time_start
+        keyA_bits = keyA_bits[:key_bits] # Trim to key_bits
+        keyB_bits = keyB_bits[:key_bits]
+        return {'keyA': ks.bits_to_hex(keyA_bits),
+                'keyB': ks.bits_to_hex(keyB_bits),
+                'errors': int((keyA_bits != keyB_bits).sum()),
+                'rounds': round_id,
+                'time': duration,
+                'rate': key_bits / duration}
+
+async def run(args):
+    if args.sim:
+        ports = sim.make_bench()
+    else:
+        ports = {name: vars(args).get(name) for name in ('alice_c', 'alice_q', 'bob_c', 'bob_q', 'eve_c', 'eve_q')}
+    bench = Bench(ports, args.threshold, args.eve_file)
+    try:
+        print("Waiting for the Arduinos...")
+        await bench.open()
+        results = []
+        for n in range(args.sessions):
+            print(f"\nSession {n+1}/{args.sessions}")
+            result = await bench.session(args.key_bits, args.pipeline)
+            results.append(result)
+            print(f"Alice's key (in hex): {result['keyA']}")
+            print(f"Bob's key (in hex):   {result['keyB']}")
+            print(f"{args.key_bits} bits in {result['rounds']} rounds, {result['time']:.1f} s "
+                  f"({result['rate']:.2f} bits/s), {result['errors']} errors")
+        # Throughput summary
+        total_time = sum([r['time'] for r in results])
+        total_errors = sum([r['errors'] for r in results])
+        print(f"\n{len(results)} sessions, {len(results)*args.key_bits} bits in {total_time:.1f} s "
+              f"({len(results)*args.key_bits/total_time:.2f} bits/s)")
+        print(f"QBER: {total_errors/(len(results)*args.key_bits):.3f}")
+        print(f"IR packets: {bench.ir_packets} sent, {bench.ir_resent} sent again")
+        if bench.eveC is not None:
+            print(f"Eve heard {len(bench.eve_packets)} IR packets, missed {bench.eve_missed}")
+        if bench.eveQ is not None:
+            print(f"Eve logged {len(bench.eve_volts)} voltage readings")
+        return results
+    finally:
+        bench.close()
+
+def main():
+    args = my_parser.parse_args()
+    if not args.sim and None in (args.alice_c, args.alice_q, args.bob_c, args.bob_q):
+        my_parser.error('--alice-c, --alice-q, --bob-c and --bob-q are required (or use --sim)')
+    if args.key_bits < 1:
+        my_parser.error('--key-bits must be at least 1')
+    if args.sessions < 1:
+        my_parser.error('--sessions must be at least 1')
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print ("\nProgram interrupted. Thank you for using the program!")
+        sys.exit()  # Exits the program
+
+if __name__=='__main__':
+    main()
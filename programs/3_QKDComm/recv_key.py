@@ -11,42 +11,45 @@ Options: python recv_key.py
         --serial SERIAL     Sets the serial address of the Arduino
         --threshold THRESHOLD
                             Sets the threshold value for basis differentiation
+        --no-reset          Opens the serial port without resetting the Arduino (DTR kept low)
 
 Author: Qcumber 2018
 
 Version: 1.0
 '''
 
-import serial
 import sys
-import time
+import pathlib
 import argparse # For running the script with options
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import serial_transport as st
+
 my_parser = argparse.ArgumentParser()
 my_parser.add_argument('--serial', action='store', type=str, required=True, help='Sets the serial address of the Arduino')
 my_parser.add_argument('--threshold', action='store', type=int, required=True, help='Sets the threshold value for basis differentiation')
+my_parser.add_argument('--no-reset', action='store_true', help='Opens the serial port without resetting the Arduino (DTR kept low)')
 args = my_parser.parse_args()
 
 # Get the serial address
 serial_addr = vars(args).get('serial')
 baudrate = 38400      # Default in Arduino
 timeout = 0.1        # Serial timeout (in s).
+reply_timeout = 5    # Deadline for the Arduino replies (in s).
 # Parameter
 rep_wait_time = 0.3  # Wait time between packets (in s).
 threshold = vars(args).get('threshold') # Threshold for basis differentiation.
+no_reset = vars(args).get('no_reset') # Keeps the Arduino running (no auto-reset)
 
 # Function to convert to hex, with a predefined nbits
 def tohex(val, nbits):
   return hex((val + (1 << nbits)) % (1 << nbits))
 
 # Opens the receiver side serial port
-receiver = serial.Serial(serial_addr, baudrate, timeout=timeout)
-
-# Wait until the serial is ready
-# Note: for some computer models, particularly MacOS, the program cannot
-# talk to the serial directly after openin. Need to wait 1-2 second.
+# Wait until the Arduino is ready: it resets when the port is opened, and
+# answers *IDN? once it has booted (instead of a fixed 2 s wait)
 print("Opening the serial port...")
-time.sleep(2)
+receiver = st.open_ready(serial_addr, baudrate, timeout=timeout, reset=not no_reset)
 print("Done\n")
 
 # Starts the program
@@ -57,10 +60,7 @@ print("Randomising basis bits using Arduino")
 receiver.write('RNDBAS '.encode())
 
 # Block until receive reply
-while True:
-    if receiver.in_waiting:
-        print((receiver.readlines()[0].decode())) # Should display OK
-        break
+print(receiver.read_reply(reply_timeout)) # Should display OK
 
 print("Arduino says he/she likes to choose the following bits:")
 
@@ -68,10 +68,7 @@ print("Arduino says he/she likes to choose the following bits:")
 receiver.write('SEQ? '.encode())
 
 # Block until receive 1st reply
-while True:
-    if receiver.in_waiting:
-        bas_str = receiver.readlines()[0].decode()[:-1] # Remove the /n
-        break
+bas_str = receiver.read_reply(reply_timeout)
 
 # Giving the reply in HEX format
 bas_hex = tohex(int("0b"+bas_str, 0), 16) # Get int, and convert to 16 bit hex
@@ -82,10 +79,7 @@ print("\nRunning the sequence and performing measurement...")
 receiver.write('RXSEQ '.encode())
 
 # Block until receive reply
-while True:
-    if receiver.in_waiting:
-        meas_str = receiver.readlines()[0].decode()[:-1] # Remove the /n
-        break
+meas_str = receiver.read_reply(None) # Waits for the sender
 
 # Obtain the measured bits
 meas_arr = meas_str.split()
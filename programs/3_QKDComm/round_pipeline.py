@@ -0,0 +1,62 @@
+'''
+Description: Round scheduler for the QKD wrappers. Overlaps the quantum
+transmission of round k+1 (on the Quantum Arduino) with the key sifting
+exchange of round k (on the Classical Arduino).
+
+Usage: Imported by send_32bitQKD.py and recv_32bitQKD.py (--pipeline).
+Both sides must run the same schedule: whether the next quantum round is
+started is decided from the key length *before* sifting the current round,
+and both sides always hold the same number of sifted bits at that point.
+So Alice never starts a TXSEQ that Bob is not listening to, and vice versa.
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import threading
+
+class RoundThread(threading.Thread):
+    # Runs one quantum round in the background and keeps its result
+
+    def __init__(self, quantum_round):
+        # Daemon, so that Ctrl+C is not held up by a blocking serial read
+        threading.Thread.__init__(self, daemon=True)
+        self.quantum_round = quantum_round
+        self.data = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.data = self.quantum_round()
+        except Exception as e:
+            self.error = e
+
+    def result(self):
+        # Block until the round is done, re-raise its error in the caller
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.data
+
+def run_pipelined(quantum_round, classical_round, done):
+    """
+    quantum_round()                 : runs one quantum round, returns its data
+    classical_round(round_id, data) : sifts the round with the other party
+    done()                          : True when enough key bits are collected
+
+    Round k+1 runs on a worker thread while round k is sifted on the calling
+    thread. At most one extra quantum round is run at the end; its bits are
+    sifted as usual (and can be trimmed by the caller).
+    """
+    round_id = 0
+    data = quantum_round()
+    while data is not None:
+        worker = None
+        if not done():
+            worker = RoundThread(quantum_round)
+            worker.start()
+        classical_round(round_id, data)
+        data = worker.result() if worker is not None else None
+        round_id += 1
+    return round_id
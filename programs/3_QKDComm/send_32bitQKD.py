@@ -1,6 +1,6 @@
 '''
 Description: Python wrapper program to send 32 bits QKD keys via
-quantum and classial channel.
+quantum and classial channel. Longer keys can be generated with --key-bits.
 
 Usage: Used in conjunction with `recv_32bitQKD.py`. The 'recv' program
 must be started first before the 'send' program.
@@ -10,27 +10,52 @@ Options: python send_32bitQKD.py [-h]
         -h, --help         show this help message and exit
         --Cserial CSERIAL  Sets the serial address of the Classical Arduino
         --Qserial QSERIAL  Sets the serial address of the Quantum Arduino
+        --key-bits N       Sets the number of sifted key bits to generate (default 32)
+        --key-file FILE    Streams the sifted key bits into this file as they are generated
+        --pipeline         Overlaps the next quantum round with the key sifting of the
+                           current one (must be used on both sides)
+        --batch K          Sifts the bases of K quantum rounds in one classical exchange
+                           (must be the same on both sides)
+        --no-reset         Opens the serial port without resetting the Arduino (DTR kept low)
 
 Author: Qcumber 2018
 
 Version: 1.0
 '''
 
-import serial
 import sys
 import time
-import numpy as np
+import pathlib
 
 import argparse # For running the script with options
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import keysift as ks
+import serial_transport as st
+import round_pipeline as rp
+
 my_parser = argparse.ArgumentParser()
 my_parser.add_argument('--cserial', action='store', type=str, required=True, help='Sets the serial address of the Classical Arduino')
 my_parser.add_argument('--qserial', action='store', type=str, required=True, help='Sets the serial address of the Quantum Arduino')
+my_parser.add_argument('--key-bits', action='store', type=int, default=32, help='Sets the number of sifted key bits to generate (default 32)')
+my_parser.add_argument('--key-file', action='store', type=str, help='Streams the sifted key bits into this file as they are generated')
+my_parser.add_argument('--pipeline', action='store_true', help='Overlaps the next quantum round with the key sifting of the current one')
+my_parser.add_argument('--batch', action='store', type=int, default=1, help='Sifts the bases of this many quantum rounds in one classical exchange (default 1)')
+my_parser.add_argument('--no-reset', action='store_true', help='Opens the serial port without resetting the Arduino (DTR kept low)')
 
 # Get the serial address
 args = my_parser.parse_args()
 serial_addrC = vars(args).get('cserial') #contentC
 serial_addrQ = vars(args).get('qserial') #contentQ
+key_bits = vars(args).get('key_bits') # Length of the final key (in bits)
+key_file = vars(args).get('key_file') # File to stream the key into
+pipeline = vars(args).get('pipeline') # Pipelined rounds (both sides must agree)
+batch = vars(args).get('batch') # Quantum rounds per key sifting exchange (both sides must agree)
+no_reset = vars(args).get('no_reset') # Keeps the Arduino running (no auto-reset)
+if key_bits < 1:
+    my_parser.error('--key-bits must be at least 1')
+if batch < 1:
+    my_parser.error('--batch must be at least 1')
 
 # Parameter
 rep_wait_time = 0.3  # Wait time between IR packets (in s).
@@ -38,10 +63,6 @@ wait_till_sync = 0.5   # Time to wait for Bob (until we are sure he is ready).
 
 ''' Helper functions '''
 
-# Function to convert to hex, with a predefined nbits
-def tohex(val, nbits):
-    return hex((val + (1 << nbits)) % (1 << nbits))
-
 def send4BytesC(message_str):
     if len(message_str) == 4:
         deviceC.write('SEND '.encode()) # Send identifier [BEL]x3 + A
@@ -58,16 +79,13 @@ def recv4BytesC():
     deviceC.write('RECV '.encode()) # Flag to recv (the header)
     state = 0   # 0: waiting for STX, 1: transmitting/ wait for ETX
     while True: # Block until receives a reply
-        if deviceC.in_waiting:
-            hex_string = deviceC.read(8).decode()
-            print(f'hex_string: {hex_string}') #Debug
-            print("state:", state)
-            if hex_string == '7070742':  # 07-[BEL], 42-B (Header from Bob)
-                # print ("Received message!") # Debug
-                deviceC.write('RECV '.encode())   # Receive the message
-                state = 1
-            elif state == 1:
-                break
+        hex_string = deviceC.read_packet(8).decode()
+        if hex_string == '7070742':  # 07-[BEL], 42-B (Header from Bob)
+            # print ("Received message!") # Debug
+            deviceC.write('RECV '.encode())   # Receive the message
+            state = 1
+        elif state == 1:
+            break
     # Convert to ASCII string
     hex_list = list(map(''.join, list(zip(*[iter(hex_string)]*2))))
     ascii_string = "".join([chr(int("0x"+each_hex,0)) for each_hex in hex_list])
@@ -75,22 +93,56 @@ def recv4BytesC():
     time.sleep(rep_wait_time)  # Wait a bit so that "Eve" can listen more carefully :P
     return ascii_string
 
+def sendFramedC(message_str):
+    # Sends a longer message (multiple of 4 bytes) framed with STX/ETX, as in chatting.py
+    deviceC.write('SEND '.encode()) # Send identifier [BEL]x3 + A
+    deviceC.write(b'\x07\x07\x07' + 'A'.encode())
+    time.sleep(rep_wait_time)
+    deviceC.write('SEND '.encode()) # Flag to send
+    deviceC.write(b'\x02\x13\x13\x13') # Start of text
+    time.sleep(rep_wait_time)
+    for str_ptr in range(0, len(message_str), 4):
+        deviceC.write('SEND '.encode()) # Flag to send
+        deviceC.write(message_str[str_ptr:str_ptr+4].encode())
+        time.sleep(rep_wait_time)
+    deviceC.write('SEND '.encode()) # Flag to send
+    deviceC.write(b'\x03\x03\x03\x03') # End of text
+    print(message_str)
+
+def recvFramedC():
+    # Receives a longer message framed with STX/ETX, as in chatting.py
+    deviceC.reset_input_buffer() # Flush all the garbages
+    deviceC.write('RECV '.encode()) # Flag to recv (the header)
+    state = 0   # 0: waiting for header, 1: waiting for STX, 2: transmitting/ wait for ETX
+    ascii_string = ""
+    while True: # Block until receives the whole message
+        hex_string = deviceC.read_packet(8).decode()
+        deviceC.write('RECV '.encode()) # Flag to recv (the next packet)
+        if hex_string == '7070742':  # 07-[BEL], 42-B (Header from Bob)
+            state = 1
+        elif state == 1 and hex_string[:7] == '2131313': # Start of text
+            state = 2
+        elif state == 2:
+            if hex_string == '3030303': # End of text
+                deviceC.write('#'.encode()) # Flag to end listening
+                break
+            # Convert to ASCII string
+            hex_list = list(map(''.join, list(zip(*[iter(hex_string.zfill(8))]*2))))
+            ascii_string += "".join([chr(int("0x"+each_hex,0)) for each_hex in hex_list])
+    print(ascii_string)
+    time.sleep(rep_wait_time)  # Wait a bit so that "Eve" can listen more carefully :P
+    return ascii_string
+
 def sendKeyQ():
     print("Generating random polarisation sequence...")
     # Randomising polarisation choice and run the sequence
     deviceQ.write('RNDSEQ '.encode())
     # Block until receive reply
-    while True:
-        if deviceQ.in_waiting:
-            print(deviceQ.readlines()[0].decode().strip()) # Should display OK
-            break
+    print(deviceQ.read_reply(reply_timeout)) # Should display OK
     # Find out what is the key
     deviceQ.write('SEQ? '.encode())
-    # Block until receive 1st reply
-    while True:
-        if deviceQ.in_waiting:
-            reply_str = deviceQ.readlines()[0].decode().strip() # Remove the /n
-            break
+    # Block until receive reply
+    reply_str = deviceQ.read_reply(reply_timeout)
     # Obtain the binary string repr for val and bas bits
     val_str = ""
     bas_str = ""
@@ -101,68 +153,111 @@ def sendKeyQ():
     print("Running the sequence...")
     deviceQ.write('TXSEQ '.encode())
     # Block until receive reply
-    while True:
-        if deviceQ.in_waiting:
-            print(deviceQ.readlines()[0].decode().strip()) # Should display OK
-            break
+    print(deviceQ.read_reply(seq_timeout)) # Should display OK
     # Return the value and basis binary strings
     print(val_str, bas_str)
     return val_str, bas_str
 
-def keySiftAliceC(valA_str, basA_str):
-    # Send ready confirmation to Alice
-    send4BytesC("RDY!")
+def sendReadyC(round_id=None):
+    # Send ready confirmation to Bob (with the round number when pipelined)
+    if round_id is None:
+        send4BytesC("RDY!")
+    else:
+        send4BytesC(f"R{round_id % 4096:03x}")
+
+def keySiftAliceC(valA_str, basA_str, round_id=None):
+    sendReadyC(round_id)
     print("Let's do it! Performing key sifting with Bob...")
-    # Zeroth step: convert the bin string repr to 32 bit int
-    valA_int = int("0b"+valA_str, 0)
-    basA_int = int("0b"+basA_str, 0)
+    # Zeroth step: convert the bin string repr to bit arrays
+    valA_bits = ks.to_bits(valA_str)
+    basA_bits = ks.to_bits(basA_str)
     # First step: Listens to Bob's basis
     basB_hex = recv4BytesC()   # in hex
-    basB_int = int("0x"+basB_hex, 0)
+    basB_bits = ks.hex_to_bits(basB_hex, 16)
     # Second step: Compare Alice and Bob's basis
-    matchbs_int = ~ (basA_int ^ basB_int) # Perform matching operation
+    matchbs_bits = ks.match_bases(basA_bits, basB_bits) # Perform matching operation
     # Third step: Send this matched basis back to Bob
-    matchbs_hex = tohex(matchbs_int, 16) # Get the hex from int
-    matchbs_int = int(matchbs_hex, 0) # Need to convert again from hex
-    send4BytesC(matchbs_hex[2:].zfill(4)) # Sends this hex to Bob
-    # Fourth step: Perform key sifting (in binary string)
-    matchbs_str = np.binary_repr(matchbs_int, width=16)
-    siftmask_str = ''
-    for i in range(16): # 16 bits
-        if matchbs_str[i] == '0' :
-            siftmask_str += 'X'
-        elif matchbs_str[i] == '1':
-            siftmask_str += valA_str[i]
-    # Remove all the X'es
-    siftkey_str = ''
-    for bit in siftmask_str:
-        if bit == 'X':
-            pass
-        else:
-            siftkey_str += bit
+    send4BytesC(ks.bits_to_hex(matchbs_bits)) # Sends this hex to Bob
+    # Fourth step: Perform key sifting
+    siftmask_str = ks.sift_mask_str(valA_bits, matchbs_bits)
+    siftkey_str = ks.to_str(ks.sift(valA_bits, matchbs_bits))
+    # Return the final sifted key
+    print(siftmask_str, siftkey_str)
+    return siftkey_str
+
+def keySiftAliceBatchC(rounds, round_id=None):
+    # Batched key sifting: Bob sends the bases of all the rounds in one framed
+    # message, and Alice replies with all the matched bases in one framed message
+    sendReadyC(round_id)
+    print("Let's do it! Performing key sifting with Bob for", len(rounds), "rounds...")
+    # Zeroth step: concatenate the rounds into bit arrays
+    valA_bits = ks.to_bits("".join([val_str for val_str, bas_str in rounds]))
+    basA_bits = ks.to_bits("".join([bas_str for val_str, bas_str in rounds]))
+    # First step: Listens to Bob's bases (4 hex per round)
+    basB_hex = recvFramedC()
+    if len(basB_hex) != 4 * len(rounds):
+        raise RuntimeError(f"Expected bases for {len(rounds)} rounds from Bob, got {basB_hex}")
+    basB_bits = ks.hex_to_bits(basB_hex)
+    # Second step: Compare Alice and Bob's bases
+    matchbs_bits = ks.match_bases(basA_bits, basB_bits)
+    # Third step: Send all the matched bases back to Bob
+    sendFramedC(ks.bits_to_hex(matchbs_bits))
+    # Fourth step: Perform key sifting
+    siftmask_str = ks.sift_mask_str(valA_bits, matchbs_bits)
+    siftkey_str = ks.to_str(ks.sift(valA_bits, matchbs_bits))
     # Return the final sifted key
     print(siftmask_str, siftkey_str)
     return siftkey_str
 
+def quantumRoundsQ():
+    # Runs one batch of quantum rounds (a single round without --batch)
+    rounds = []
+    for i in range(batch):
+        time.sleep(wait_till_sync) # Wait until Bob is ready to receive key
+        rounds.append(sendKeyQ())
+    return rounds
+
+def keySiftRoundsC(rounds, round_id=None):
+    # Key sifting for the rounds returned by quantumRoundsQ
+    if len(rounds) == 1:
+        return keySiftAliceC(*rounds[0], round_id=round_id)
+    return keySiftAliceBatchC(rounds, round_id=round_id)
+
+def storeKey(key):
+    # Adds the sifted bits to the secure key (and streams them into the key file)
+    # Returns True once the key is long enough
+    global seckey_bin, rate
+    if keyfile is not None:
+        keyfile.write(key[:max(0, key_bits-len(seckey_bin))]) # Never beyond key_bits (nor the extra pipelined round)
+        keyfile.flush()
+    seckey_bin = seckey_bin + key
+    rate = len(seckey_bin) / (time.time() - time_start)
+    if len(seckey_bin) >= key_bits: # If the key is long enough, stop operation
+        return True
+    print("Done! You've got", len(key), "bits. Total length:", len(seckey_bin), "/", key_bits, "bits.", f"({rate:.2f} bits/s)")
+    return False
+
 # Other parameters declarations
 baudrate = 38400      # Default in Arduino
 timeout = 0.1        # Serial timeout (in s).
+reply_timeout = 5    # Deadline for the Arduino replies (in s).
+seq_timeout = 30     # Deadline for TXSEQ to finish (in s).
 
 # Opens the sender side serial port
-deviceC = serial.Serial(serial_addrC, baudrate, timeout=timeout)
-deviceQ = serial.Serial(serial_addrQ, baudrate, timeout=timeout)
-
-# Wait until the serial is ready
-# Note: for some computer models, particularly MacOS, the program cannot
-# talk to the serial directly after openin. Need to wait 1-2 second.
+# Wait until the Arduinos are ready: they reset when the port is opened, and
+# answer *IDN? once they have booted (instead of a fixed 2 s wait)
 print("Opening the serial port...")
-time.sleep(2)
+deviceC = st.open_ready(serial_addrC, baudrate, timeout=timeout, reset=not no_reset)
+deviceQ = st.open_ready(serial_addrQ, baudrate, timeout=timeout, reset=not no_reset)
 print("Done\n")
 
 # Secure key string (binary)
 seckey_bin = ""
 n_attempt = 1
 
+# Key file, the sifted bits are appended as a binary string
+keyfile = open(key_file, "w") if key_file else None
+
 # Start of the UI
 print("Hi Alice, are you ready? Let's make the key!")
 
@@ -176,34 +271,40 @@ try:
     print("Bob replies", recv4BytesC())
 
     print("\nPublic channel seems okay... Sending the quantum keys...")
+    time_start = time.time() # For the key generation rate
 
     # Performing key distribution
-    while True:
-        print("\nAttempt", n_attempt)
-        time.sleep(wait_till_sync) # Wait until Bob is ready to receive key
-        val_str, bas_str = sendKeyQ()
-        #time.sleep(wait_till_sync) # Wait until Bob is ready to perform QKD
-        key = keySiftAliceC(val_str, bas_str)
-        seckey_bin = seckey_bin + key
-        if len(seckey_bin) >= 32: # If the key is longer than 32 bits, stop operation
-            break
-        else:
-            print("Done! You've got", len(key), "bits. Total length:", len(seckey_bin), "bits.")
+    if pipeline:
+        # The next quantum round runs while the current one is being sifted
+        def classical_round(round_id, rounds):
+            print("\nAttempt", round_id + 1)
+            storeKey(keySiftRoundsC(rounds, round_id=round_id))
+        rp.run_pipelined(quantumRoundsQ, classical_round, lambda: len(seckey_bin) >= key_bits)
+    else:
+        while True:
+            print("\nAttempt", n_attempt)
+            rounds = quantumRoundsQ()
+            key = keySiftRoundsC(rounds)
+            if storeKey(key):
+                break
             n_attempt +=1
 
     print("DONE. The task is completed.")
 
     # You've got the key!
-    seckey_bin = seckey_bin[:32] # Trim to 32 bits
-    seckey_hex = tohex(int("0b"+seckey_bin, 0), 32)
-    # Some intrepreter introduces L at the end (which probably means long). Will remove them (cosmetic reason)
-    if seckey_hex[-1] == "L":
-        seckey_hex = seckey_hex[:-1]
-    print("The 32 bit secret key is (in hex):", seckey_hex[2:].zfill(8))
+    seckey_bin = seckey_bin[:key_bits] # Trim to key_bits
+    seckey_hex = ks.bits_to_hex(ks.to_bits(seckey_bin))
+    print(f"Generated {key_bits} bits in {time.time()-time_start:.1f} s ({rate:.2f} bits/s).")
+    if keyfile is not None:
+        keyfile.close()
+        print("The key bits are saved in:", key_file)
+    print(f"The {key_bits} bit secret key is (in hex):", seckey_hex)
     print("\n Congrats. Use the key wisely. Thank you!")
 
 except KeyboardInterrupt:
     # End of program
     deviceC.write('#'.encode()) # Flag to force end listening
+    if keyfile is not None:
+        print("Key bits generated so far are saved in:", key_file)
     print ("\nProgram interrupted. Thank you for using the program!")
     sys.exit()  # Exits the program
@@ -9,23 +9,28 @@ Options: python send_key.py
 
         -h, --help            show this help message and exit
         --serial SERIAL     Sets the serial address of the Arduino
+        --no-reset          Opens the serial port without resetting the Arduino (DTR kept low)
 
 Author: Qcumber 2018
 
 Version: 1.0
 '''
 
-import serial
 import sys
-import time
+import pathlib
 import argparse # For running the script with options
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import serial_transport as st
+
 my_parser = argparse.ArgumentParser()
 my_parser.add_argument('--serial', action='store', type=str, required=True, help='Sets the serial address of the Arduino')
+my_parser.add_argument('--no-reset', action='store_true', help='Opens the serial port without resetting the Arduino (DTR kept low)')
 
 # Get the serial address
 args = my_parser.parse_args()
 serial_addr = vars(args).get('serial')
+no_reset = vars(args).get('no_reset') # Keeps the Arduino running (no auto-reset)
 
 # Function to convert to hex, with a predefined nbits
 def tohex(val, nbits):
@@ -34,15 +39,14 @@ def tohex(val, nbits):
 # Other parameters declarations
 baudrate = 38400      # Default in Arduino
 timeout = 0.1        # Serial timeout (in s).
+reply_timeout = 5    # Deadline for the Arduino replies (in s).
+seq_timeout = 30     # Deadline for TXSEQ to finish (in s).
 
 # Opens the sender side serial port
-sender = serial.Serial(serial_addr, baudrate, timeout=timeout)
-
-# Wait until the serial is ready
-# Note: for some computer models, particularly MacOS, the program cannot
-# talk to the serial directly after openin. Need to wait 1-2 second.
+# Wait until the Arduino is ready: it resets when the port is opened, and
+# answers *IDN? once it has booted (instead of a fixed 2 s wait)
 print("Opening the serial port...")
-time.sleep(2)
+sender = st.open_ready(serial_addr, baudrate, timeout=timeout, reset=not no_reset)
 print("Done\n")
 
 # Starts the program
@@ -53,10 +57,7 @@ print("Randomising key bits and basis bits using Arduino")
 sender.write('RNDSEQ '.encode())
 
 # Block until receive reply
-while True:
-    if sender.in_waiting:
-        print(sender.readlines()[0].decode()) # Should display OK
-        break
+print(sender.read_reply(reply_timeout)) # Should display OK
 
 print("Arduino says he/she likes to choose the following bits:")
 
@@ -64,10 +65,7 @@ print("Arduino says he/she likes to choose the following bits:")
 sender.write('SEQ? '.encode())
 
 # Block until receive 1st reply
-while True:
-    if sender.in_waiting:
-        reply_str = sender.readlines()[0][:-1].decode() # Remove the /n
-        break
+reply_str = sender.read_reply(reply_timeout)
 
 # Obtain the binary string repr for val and bas bits
 val_str = ""
@@ -87,10 +85,7 @@ print("\nRunning the sequence...")
 sender.write('TXSEQ '.encode())
 
 # Block until receive reply
-while True:
-    if sender.in_waiting:
-        print(sender.readlines()[0].decode()) # Should display OK
-        break
+print(sender.read_reply(seq_timeout)) # Should display OK
 
 # Print last statement and exits the program
 print("Task done. Please perform key sifting with Bob via public channel.")
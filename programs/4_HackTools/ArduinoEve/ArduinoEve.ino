@@ -46,6 +46,7 @@ const int seqReadTime = 150;  // 100 ms (hopefully in the middle of the laser pu
 const int seqSyncBlink = 300;  // 200 ms (to initialise the signal)
 //int moveType;
 int moveStepper(int moveType = 1, int motor = 0, int steps = 30); //2:approachAngle, anything else: gotoAngle 
+void streamSensors(unsigned long interval); // Defined after specialMod
 
 // To deal with floating point rounding off error
 // in the conversion between angle and steps,
@@ -85,11 +86,12 @@ void loop() {
   // Serial.println(serbuf); // Debug
   // Obtain which input command (enumerated)
   int enumc = -1; // default choice
-  int maxChoice = 15;
+  int maxChoice = 17;
   char sercmd[maxChoice][8] = {"HELP",                //0
     "SETANG1", "ANG1?", "SETPOL1", "POL1?", "VOLTS?", //5
     "SETANG2", "ANG2?", "SETPOL2", "POL2?", "*IDN?",  //10
-    "HOF1?", "SETHOF1", "HOF2?", "SETHOF2"};          //14
+    "HOF1?", "SETHOF1", "HOF2?", "SETHOF2", "STREAM", //15
+    "STOP"};                                          //16
   for (int c=0; c<maxChoice; c++){
     if (strcasecmp(sercmd[c],serbuf) == 0){ 
       enumc = c;// Obtain match
@@ -128,6 +130,8 @@ void loop() {
       Serial.print(F("POL2?        \t    Ask for current polarisation\n"));
       Serial.print(F("VOLT2?       \t   (Deprecated) Ask for sensor voltage\n"));
       Serial.print(F("*IDN?       \t    Gets device name (Quantum/Classical)\n"));
+      Serial.print(F("STREAM X     \t    Stream both sensor readings every X ms (0: as fast as possible)\n"));
+      Serial.print(F("STOP         \t    Stop the stream (any command does)\n"));
       break; 
       
     case 1: //SETANG1 X
@@ -245,6 +249,19 @@ void loop() {
       EEPROM_writeAnything(EEloc_polOffset2, polOffset2);
       Serial.println(F("OK"));
       break;
+
+    case 15: //STREAM X
+      // listen again (for sampling interval in ms)
+      while (!Serial.available());
+      Serial.readBytesUntil(' ', valbuf, 15); // Until whitespace
+      Serial.println(F("OK"));
+      streamSensors(atoi(valbuf));
+      Serial.println(F("OK")); // End of the stream
+      break;
+
+    case 16: //STOP
+      Serial.println(F("OK")); // Not streaming, nothing to stop
+      break;
     
     default:
       Serial.println("Unknown command");
@@ -263,6 +280,30 @@ int specialMod(int num, int mod){
   return result;
 }
 
+void streamSensors(unsigned long interval) {
+  // Sends both sensor readings as 3 byte frames until a command comes in
+  // Frame: 1aaaaaaa 0aaabbbb 00bbbbbb (a: sensor 1, b: sensor 2, 10 bits each)
+  // Only the first byte of a frame has the top bit set, so the frames can be found in the stream
+  byte frame[3];
+  int sensorValue1;
+  int sensorValue2;
+  unsigned long nextTime = millis();
+  while (!Serial.available()) {
+    if (interval > 0) {
+      if ((long)(millis() - nextTime) < 0) continue; // Not yet
+      nextTime += interval;
+    }
+    sensorValue1 = analogRead(sensorLoc1);
+    sensorValue2 = analogRead(sensorLoc2);
+    frame[0] = 0x80 | (sensorValue1 >> 3);
+    frame[1] = ((sensorValue1 & 0x07) << 4) | (sensorValue2 >> 6);
+    frame[2] = sensorValue2 & 0x3F;
+    Serial.write(frame, 3); // Blocks when the serial buffer is full (about 1280 frames/s at 38400 baud)
+  }
+  char stopbuf[16] = "";
+  Serial.readBytesUntil(' ', stopbuf, 15); // The command that stopped the stream (e.g. STOP)
+}
+
 int moveStepper(int moveType, int motor, int steps) {
   int current;
   int target;
@@ -0,0 +1,105 @@
+'''
+Description: Automatic search of the cluster letters of H, D, V, A for the
+interceptor, instead of typing them in and trying the keys by hand. Every
+assignment of the four signal clusters (noise stays A) gives a raw key; it is
+sifted with the matched-basis mask caught by listener.py, the first 32 sifted
+bits are taken as the secure key, and the ciphertext is decrypted with it
+(same keystream as decrypt.py). The candidates are ranked by how printable the
+decrypted text is. Only the bit of a polarisation matters for the key (H, D
+-> 0, V, A -> 1), so the 24 assignments give 6 different keys, each tried
+from every 16 bit round of the capture (Eve may have started logging early).
+
+Usage: Imported by runInterceptor.py ('Solve' button).
+
+        labels = process_clustered_signals(labels2D)
+        results = search(labels, mask_hex, cipher_hex)   # Best first
+        results[0]['assignment'], results[0]['key'], results[0]['message']
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import os
+import sys
+import string
+import pathlib
+import itertools
+import concurrent.futures
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2])) # Shared modules in programs/
+import keysift as ks
+import keystream as kst
+
+round_bits = 16     # Bits per transmission round
+key_bits = 32       # Bits of the secure key (see recv/send_32bitQKD.py)
+printable = np.zeros(256, dtype=bool)   # Printable ASCII, tabs and line breaks
+printable[32:127] = True
+printable[[9, 10, 13]] = True
+letters = np.zeros(256, dtype=bool)     # Letters and spaces (to break ties)
+letters[[ord(c) for c in string.ascii_letters + ' ']] = True
+
+def assignments(num_classes=5):
+    """All assignments (letters of H, D, V, A and noise, e.g. 'BCDEA'), noise is A"""
+    signal = string.ascii_uppercase[1:num_classes]
+    return [''.join(p) + 'A' for p in itertools.permutations(signal, 4)]
+
+def raw_bits(labels, assignment):
+    """Raw key bits of the decoded labels: 0 for H, D, 1 for V, A (unassigned labels dropped)"""
+    polAssignment = [string.ascii_uppercase.index(c) for c in assignment[:4]]
+    lookup = np.full(max(max(polAssignment), int(np.max(labels, initial=0))) + 1, -1)
+    lookup[polAssignment] = [0, 0, 1, 1]
+    bits = lookup[np.asarray(labels, dtype=np.int64)]
+    return bits[bits >= 0].astype(np.uint8)
+
+def text_score(data):
+    """Fraction of printable characters, and of letters and spaces"""
+    data = np.frombuffer(data, dtype=np.uint8)
+    if len(data) == 0:
+        return 0.0, 0.0
+    return float(printable[data].mean()), float(letters[data].mean())
+
+def score(candidate):
+    """
+    Tries one candidate (assignment, raw key bits, mask bits, ciphertext):
+    sifts the key from every round offset and decrypts. Returns one result
+    (dict) per offset.
+    """
+    assignment, bits, mask, cipher = candidate
+    results = []
+    nbits = len(mask) // round_bits * round_bits
+    for offset in range(0, len(bits) - nbits + 1, round_bits):
+        sifted = ks.sift(bits[offset:offset+nbits], mask[:nbits])
+        if len(sifted) < key_bits:
+            break   # Not enough matched bases for a key
+        key = ks.bits_to_hex(sifted[:key_bits])
+        message = kst.crypt(cipher, int(key, 16))
+        printed, lettered = text_score(message)
+        results.append({'assignment': assignment, 'offset': offset // round_bits, 'key': key,
+                        'printable': printed, 'letters': lettered,
+                        'message': message.decode('latin-1')})
+    return results
+
+def search(labels, mask_hex, cipher_hex, workers=None, num_classes=5):
+    """
+    Ranks the cluster assignments of decoded labels (process_clustered_signals),
+    best first. mask_hex is the matched-basis mask, cipher_hex the ciphertext.
+    workers > 1 tries the candidates in a pool of processes.
+    """
+    mask = ks.hex_to_bits(mask_hex)
+    cipher = bytes.fromhex(cipher_hex.strip())
+    # Assignments giving the same raw key are only tried once
+    candidates = {}
+    for assignment in assignments(num_classes):
+        bits = raw_bits(labels, assignment)
+        candidates.setdefault(bits.tobytes(), (assignment, bits, mask, cipher))
+    candidates = list(candidates.values())
+    workers = os.cpu_count() if workers is None else workers
+    if workers <= 1 or len(candidates) == 1:
+        scored = [score(c) for c in candidates]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            scored = list(pool.map(score, candidates))
+    results = [result for part in scored for result in part]
+    return sorted(results, key=lambda r: (r['printable'], r['letters']), reverse=True)
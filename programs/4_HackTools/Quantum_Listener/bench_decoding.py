@@ -0,0 +1,130 @@
+'''
+Description: Benchmark of decoding.py against the loops it replaced in
+runInterceptor.py (copied below as they were). A synthetic capture of cluster
+labels is made (noise = 0, pulses of a few readings with the odd wrong label,
+a sync pulse every 17 pulses), and both versions are timed and checked to
+give the same results. The header removal loop is O(n x headers), so it is
+only run on the first --slow-samples readings (light or not, as it expects
+the same number of rising and falling edges).
+
+Usage: python bench_decoding.py [--samples N]
+
+Options: python bench_decoding.py [-h]
+
+        -h, --help            show this help message and exit
+        --samples N           Sets the number of readings (default 1000000)
+        --slow-samples N      Sets the number of readings for the header removal loop (default 20000)
+        --seed SEED           Seeds the random numbers
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import time
+import argparse # For running the script with options
+from collections import Counter
+import numpy as np
+
+import decoding as dc
+
+# The versions from runInterceptor.py
+
+def find_noise(x):
+    """guesses the noise floor as the most frequently occuring value"""
+    noise = Counter(x).most_common(1)[0][0]
+    return noise
+
+def tally(x,y,noise):
+    x = np.array(x)
+    y = np.array(y)
+    noiseX = find_noise(x)
+    noiseY = find_noise(y)
+    noTally = np.logical_xor(x>noise,y>noise)
+    for i in np.where(noTally):
+        x[i] = noiseX
+        y[i] = noiseY
+    return x, y
+
+def remove_adjacent_duplicates(a):
+    undup = []
+    for i in np.arange(len(a)):
+        if i==0: #no previous element to compare with, first element gets included automatically
+            undup.append(a[i])
+        else:
+            if a[i] != a[i-1]:
+                undup.append(a[i])
+    return np.array(undup)
+
+def remove_header(signals,numConstant=3):
+    ds = np.diff(signals)
+    starts = np.where(ds>0)[0]
+    stops = np.where(ds<0)[0]
+    header_starts=starts[stops-starts>numConstant]+1
+    header_stops=stops[stops-starts>numConstant]
+    headerless_signal = [signal for i, signal in enumerate(signals) if not np.any((i>=header_starts)&(i<=header_stops))]
+    return headerless_signal
+
+def process_clustered_signals(signals):
+    nonzero_idx = np.nonzero(signals)[0]
+    consecutives_idx = np.split(nonzero_idx, np.where(np.diff(nonzero_idx) != 1)[0]+1)
+    result_list = []
+    for groups_idx in consecutives_idx:
+        result =  Counter(signals[groups_idx]).most_common(1)[0][0]
+        result_list.append(result)
+    del result_list[0::17]
+    return (result_list)
+
+def capture(n, rng):
+    """Synthetic labels (n readings) and readings of the two photodiodes"""
+    labels = np.zeros(n, dtype=np.int64)
+    pos = 0
+    while pos < n:
+        pos += rng.integers(2, 8)   # Dark gap
+        length = rng.integers(2, 8) # Pulse
+        labels[pos:pos+length] = rng.integers(1, 5)
+        pos += length
+    labels = labels[:n]
+    # Some readings of a pulse go to another cluster (ties within a pulse included)
+    wrong = (labels != 0) & (rng.random(n) < 0.2)
+    labels[wrong] = rng.integers(1, 5, np.count_nonzero(wrong))
+    # ADC readings, with light on one photodiode only now and then
+    x = np.where(labels != 0, rng.integers(100, 1000, n), rng.integers(15, 25, n)).astype(float)
+    y = np.where((labels != 0) ^ (rng.random(n) < 0.01), rng.integers(100, 1000, n), rng.integers(15, 25, n)).astype(float)
+    return labels, x, y
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    my_parser = argparse.ArgumentParser()
+    my_parser.add_argument('--samples', action='store', type=int, default=1000000, help='Sets the number of readings (default 1000000)')
+    my_parser.add_argument('--slow-samples', action='store', type=int, default=20000, help='Sets the number of readings for the header removal loop (default 20000)')
+    my_parser.add_argument('--seed', action='store', type=int, help='Seeds the random numbers')
+    args = my_parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    labels, x, y = capture(args.samples, rng)
+    short = (labels[:args.slow_samples] != 0).astype(int)
+    short[-1] = 0
+
+    cases = [
+        ('process_clustered_signals', process_clustered_signals, dc.process_clustered_signals, (labels,)),
+        ('remove_adjacent_duplicates', remove_adjacent_duplicates, dc.remove_adjacent_duplicates, (labels,)),
+        ('remove_header', remove_header, dc.remove_header, (short,)),
+        ('tally', tally, dc.tally, (x, y, 30)),
+        ('find_noise', find_noise, dc.find_noise, (x,)),
+    ]
+    print(f"{'function':<28}{'readings':>10}{'loop (s)':>12}{'numpy (s)':>12}{'speedup':>10}  same")
+    for name, old, new, data in cases:
+        expected, oldTime = timed(old, *data)
+        result, newTime = timed(new, *data)
+        if isinstance(expected, tuple):
+            same = all(np.array_equal(a, b) for a, b in zip(expected, result))
+        else:
+            same = np.array_equal(np.asarray(expected), np.asarray(result))
+        print(f"{name:<28}{len(data[0]):>10}{oldTime:>12.4f}{newTime:>12.4f}{oldTime/max(newTime, 1e-9):>10.0f}  {same}")
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,137 @@
+'''
+Description: Small NumPy k-means for Eve's 2D photodiode readings (noise and
+the four polarisations), used by the interceptor and the live decoder. fit()
+clusters a whole capture (Lloyd's algorithm, k-means++ starts), OnlineKMeans
+keeps the centroids up to date as new readings come in (mini-batch k-means).
+classify() first merges the identical readings (the ADC only gives integers,
+so a capture of millions of readings has few distinct points) and clusters
+them with their counts as weights. Starting from the centroids of an earlier
+capture of the same setup (init), it converges in a couple of iterations.
+
+Usage: Imported by runInterceptor.py and live_decoder.py.
+
+        centroids, labels = fit(data, 5)
+        centroids, labels = classify(data, 5, init=saved_centroids)
+        km = OnlineKMeans(centroids, counts)
+        labels = km.partial_fit(new_data)
+        order = angle_order(centroids, noise)   # The same letters for the same setup
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import numpy as np
+
+def nearest(data, centroids):
+    """Returns the closest centroid of every point, and the squared distance to it"""
+    data = np.asarray(data, dtype=float).reshape(-1, 2)
+    # Only 5 centroids: one pass per centroid is faster than a (n, k, 2) array
+    best = np.full(len(data), np.inf)
+    labels = np.zeros(len(data), dtype=int)
+    for i, (cx, cy) in enumerate(centroids):
+        dist = (data[:, 0] - cx) ** 2 + (data[:, 1] - cy) ** 2
+        closer = dist < best
+        best[closer] = dist[closer]
+        labels[closer] = i
+    return labels, best
+
+def seed(data, k, rng, weights=None):
+    """k-means++ starting centroids: each new one is far from the previous ones"""
+    weights = np.ones(len(data)) if weights is None else weights
+    centroids = data[[rng.choice(len(data), p=weights / weights.sum())]]
+    for i in range(1, k):
+        dist = nearest(data, centroids)[1] * weights
+        if dist.sum() > 0:
+            pick = rng.choice(len(data), p=dist / dist.sum())
+        else:
+            pick = rng.integers(len(data)) # Fewer distinct points than clusters
+        centroids = np.vstack((centroids, data[pick]))
+    return centroids
+
+def fit(data, k=5, init=None, iterations=100, starts=10, rng=None, weights=None):
+    """
+    Clusters data (n x 2) into k clusters. init gives the starting centroids
+    (one run), otherwise the best of starts k-means++ starts is kept.
+    weights counts every point that many times (see classify).
+    Returns the centroids and the cluster of every point.
+    """
+    data = np.asarray(data, dtype=float).reshape(-1, 2)
+    weights = np.ones(len(data)) if weights is None else np.asarray(weights, dtype=float)
+    rng = rng if rng is not None else np.random.default_rng()
+    inits = [np.asarray(init, dtype=float)] if init is not None else [seed(data, k, rng, weights) for i in range(starts)]
+    best = None
+    for centroids in inits:
+        centroids = centroids.copy()
+        for i in range(iterations):
+            labels, dist = nearest(data, centroids)
+            counts = np.bincount(labels, weights, k)
+            sums = np.c_[np.bincount(labels, weights * data[:, 0], k), np.bincount(labels, weights * data[:, 1], k)]
+            moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1e-300)[:, None], centroids)
+            if np.allclose(moved, centroids):
+                break
+            centroids = moved
+        labels, dist = nearest(data, centroids)
+        inertia = (weights * dist).sum()
+        if best is None or inertia < best[0]:
+            best = (inertia, centroids, labels)
+    return best[1], best[2]
+
+def angle_order(centroids, noise=0):
+    """
+    Order of the clusters for their letters: the noise (index noise) first, then the
+    others by the direction of their centre (signal2 against signal1), so that the letters
+    do not depend on the random start of k-means. centroids[order] are in letter order.
+    """
+    centroids = np.asarray(centroids, dtype=float).reshape(-1, 2)
+    others = np.array([i for i in range(len(centroids)) if i != noise], dtype=int)
+    angles = np.arctan2(centroids[others, 1], centroids[others, 0])
+    return np.r_[noise, others[np.argsort(angles, kind='stable')]]
+
+def unique_points(data):
+    """The distinct points of data (n x 2), the index of every point in them, and their counts"""
+    data = np.ascontiguousarray(data, dtype=float).reshape(-1, 2)
+    # One complex number per point: np.unique on 1D data is much faster than with axis=0
+    points, inverse, counts = np.unique(data.view(np.complex128).ravel(), return_inverse=True, return_counts=True)
+    return points.view(float).reshape(-1, 2), inverse.ravel(), counts
+
+def classify(data, k=5, init=None, iterations=100, starts=10, rng=None):
+    """
+    Clusters data (n x 2) into k clusters, on the distinct points weighted by
+    their counts. init gives the starting centroids (e.g. from an earlier
+    capture), a k-means++ fit is done instead if a cluster ends up empty.
+    Returns the centroids and the cluster of every point.
+    """
+    points, inverse, counts = unique_points(data)
+    if init is not None:
+        centroids, labels = fit(points, k, init, iterations, rng=rng, weights=counts)
+        if len(np.unique(labels)) == k:
+            return centroids, labels[inverse]
+    centroids, labels = fit(points, k, None, iterations, starts, rng, counts)
+    return centroids, labels[inverse]
+
+class OnlineKMeans(object):
+    # Mini-batch k-means: every batch moves the centroids towards the points assigned to them
+
+    def __init__(self, centroids, counts=None, memory=1000):
+        # memory caps the weight of the past, so that the centroids follow slow drifts
+        self.centroids = np.array(centroids, dtype=float)
+        k = len(self.centroids)
+        self.counts = np.ones(k) if counts is None else np.array(counts, dtype=float)
+        self.memory = memory
+
+    def predict(self, data):
+        return nearest(data, self.centroids)[0]
+
+    def partial_fit(self, data):
+        """Assigns the points of data (n x 2) to clusters and updates the centroids"""
+        data = np.asarray(data, dtype=float).reshape(-1, 2)
+        labels = self.predict(data)
+        k = len(self.centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.c_[np.bincount(labels, data[:, 0], k), np.bincount(labels, data[:, 1], k)]
+        self.counts = np.minimum(self.counts + counts, self.memory)
+        # Running mean: the centroid moves by n/N of the distance to the batch mean
+        hit = counts > 0
+        self.centroids[hit] += (sums[hit] - counts[hit, None] * self.centroids[hit]) / self.counts[hit, None]
+        return labels
@@ -0,0 +1,114 @@
+'''
+Description: Vectorised decoding of Eve's clustered readings for
+runInterceptor.py (and live_decoder.py). The functions give the same results
+as the loops they replace, Counter.most_common ties included (the value seen
+first wins), but work on whole arrays: runs are found with np.diff, and the
+most common label of every run with np.bincount on run numbers. A capture of
+millions of readings is decoded in milliseconds (see bench_decoding.py).
+
+Usage: Imported by runInterceptor.py and live_decoder.py.
+
+        noise = find_noise(x)                       # Most common reading
+        x, y = tally(x, y, 0.0025)                  # Both photodiodes see light, or none
+        result = process_clustered_signals(labels)  # One label per pulse, sync pulses dropped
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import numpy as np
+
+frame_pulses = 17   # Sync pulse + 16 bit sequence
+
+def first_most_common(values, counts, first):
+    """
+    The value with the largest count, the one seen first among equal counts
+    (as Counter.most_common(1)). first is the index of the first occurrence
+    of every value.
+    """
+    best = np.flatnonzero(counts == counts.max())
+    return values[best[np.argmin(first[best])]]
+
+def find_noise(x):
+    """guesses the noise floor as the most frequently occuring value"""
+    x = np.asarray(x).ravel()
+    if x.dtype.kind in 'iuf' and len(x) and x.min() >= 0 and x.max() < 1 << 16 and np.all(x == np.round(x)):
+        # ADC readings: counted with np.bincount (no sorting)
+        counts = np.bincount(x.astype(np.int64))
+        values = np.flatnonzero(counts == counts.max())
+        first = np.array([np.argmax(x == value) for value in values])
+        return x[first.min()]
+    values, first, counts = np.unique(x, return_index=True, return_counts=True)
+    return first_most_common(values, counts, first)
+
+def tally(x, y, noise):
+    """
+    ensures that when x is a signal, y is a signal too
+    otherwise, set both x and y to the noise level
+    """
+    x = np.array(x)
+    y = np.array(y)
+    noTally = np.logical_xor(x>noise, y>noise)
+    x[noTally] = find_noise(x)
+    y[noTally] = find_noise(y)
+    return x, y
+
+def remove_adjacent_duplicates(a):
+    """Keeps the first element of every run of equal elements"""
+    a = np.asarray(a)
+    if len(a) == 0:
+        return a.copy()
+    return a[np.r_[True, a[1:] != a[:-1]]]
+
+def remove_header(signals, numConstant=3):
+    """
+    Removes the header that has the signature of a high voltage being numConstant number of points
+    """
+    signals = np.asarray(signals)
+    ds = np.diff(signals)
+    # Finds non-zero signal regions
+    starts = np.where(ds>0)[0]
+    stops = np.where(ds<0)[0]
+    # Finds header regions
+    header_starts = starts[stops-starts>numConstant]+1
+    header_stops = stops[stops-starts>numConstant]
+    # Removes header regions: +1 where a header starts, -1 after it stops
+    inside = np.zeros(len(signals)+1, dtype=np.int64)
+    np.add.at(inside, header_starts, 1)
+    np.add.at(inside, header_stops+1, -1)
+    return signals[np.cumsum(inside[:-1]) == 0]
+
+def run_modes(signals):
+    """
+    Most common label of every run of non-zero labels (ties: the label seen
+    first in the run, as Counter.most_common). Returns an array, one label per run.
+    """
+    signals = np.asarray(signals)
+    nonzero_idx = np.flatnonzero(signals)
+    if len(nonzero_idx) == 0:
+        return signals[:0]
+    # Run number of every non-zero label
+    run = np.cumsum(np.r_[True, np.diff(nonzero_idx) != 1]) - 1
+    labels = signals[nonzero_idx].astype(np.int64)
+    numRuns, numLabels = run[-1]+1, labels.max()+1
+    counts = np.bincount(run*numLabels + labels, minlength=numRuns*numLabels).reshape(numRuns, numLabels)
+    modes = np.argmax(counts, axis=1)   # Smallest label among ties
+    # Runs with a tie: the first label of the run that has the largest count wins
+    best = counts == counts.max(axis=1)[:, None]
+    tied = best.sum(axis=1) > 1
+    candidates = np.flatnonzero(tied[run] & best[run, labels])
+    if len(candidates):
+        tiedRun = run[candidates]
+        first = np.r_[True, tiedRun[1:] != tiedRun[:-1]]
+        modes[tiedRun[first]] = labels[candidates[first]]
+    return modes.astype(signals.dtype)
+
+def process_clustered_signals(signals):
+    """
+    Decodes clustered readings into one label per pulse (a run of non-zero
+    labels), and removes the initialisation signals (idx 0, 17, etc)
+    """
+    result = run_modes(signals)
+    keep = np.arange(len(result)) % frame_pulses != 0
+    return list(result[keep])
@@ -0,0 +1,119 @@
+'''
+Description: Batch mode of runInterceptor.py: decodes many captures of Eve's
+photodiodes (e.g. one per team) without the GUI, in a pool of processes.
+Every capture goes through the same steps as Start, Decode! and Apply
+(interceptor_core.decode_file), and the raw keys, sifted keys and cluster
+reports are written to JSON and/or CSV. With a ciphertext, the polarisation
+assignment is found automatically (as Solve, see assignment_search.py).
+
+Usage: python interceptor_batch.py 'key_logger/*.dat' --mask 5a3c9f01 --json results.json
+(or python runInterceptor.py --batch ...). The masks of several captures can be
+given in a CSV file with the columns file, mask (and optionally cipher).
+
+Options: python interceptor_batch.py [-h] FILES [FILES ...]
+
+        -h, --help           show this help message and exit
+        FILES                Captures to decode (.dat or .cap, glob patterns allowed)
+        --mask MASK          Sets the matched-basis mask caught by listener.py (hex), for all the captures
+        --masks FILE         Reads the mask (and ciphertext) of every capture from this CSV file (columns file, mask, cipher)
+        --cipher CIPHER      Sets the intercepted ciphertext (hex), to find the assignment automatically
+        --assign LETTERS     Sets the cluster letters of H, D, V, A and noise (default DBECA)
+        --noise N            Sets the reading above which there is light (default 0.0025)
+        --workers N          Sets the number of processes (default: number of CPUs)
+        --json FILE          Writes the results into this JSON file
+        --csv FILE           Writes the results into this CSV file (one line per capture)
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import os
+import csv
+import sys
+import glob
+import json
+import pathlib
+import argparse # For running the script with options
+import concurrent.futures
+
+import interceptor_core as core
+
+csv_columns = ['file', 'samples', 'pulses', 'assignment', 'raw_key', 'raw_key_bin', 'raw_key_hex',
+               'mask', 'sifted_key_bin', 'sifted_key_hex', 'key', 'round', 'message', 'clusters', 'error']
+
+def decode(job):
+    # One capture (in a worker process), errors are reported instead of raised
+    filename, mask, cipher, assignment, noise = job
+    try:
+        return core.decode_file(filename, mask, assignment, cipher, noise)
+    except Exception as e:
+        return {'file': filename, 'error': f"{type(e).__name__}: {e}"}
+
+def read_masks(filename):
+    """Mask and ciphertext of every capture, from a CSV file (columns file, mask, cipher)"""
+    with open(filename, newline='') as f:
+        return {str(pathlib.Path(row['file'])): (row.get('mask') or None, row.get('cipher') or None)
+                for row in csv.DictReader(f)}
+
+def write_csv(results, out):
+    writer = csv.DictWriter(out, csv_columns, extrasaction='ignore')
+    writer.writeheader()
+    for result in results:
+        row = dict(result)
+        if 'clusters' in row:
+            # Cluster means, e.g. A:(0.00,0.00) B:(0.96,0.31) ...
+            row['clusters'] = ' '.join(f"{c['cluster']}:({c['signal1']:.4g},{c['signal2']:.4g})" for c in row['clusters'])
+        writer.writerow(row)
+
+def main():
+    my_parser = argparse.ArgumentParser()
+    my_parser.add_argument('files', nargs='+', help='Captures to decode (.dat or .cap, glob patterns allowed)')
+    my_parser.add_argument('--mask', action='store', type=str, help='Sets the matched-basis mask caught by listener.py (hex), for all the captures')
+    my_parser.add_argument('--masks', action='store', type=str, help='Reads the mask (and ciphertext) of every capture from this CSV file (columns file, mask, cipher)')
+    my_parser.add_argument('--cipher', action='store', type=str, help='Sets the intercepted ciphertext (hex), to find the assignment automatically')
+    my_parser.add_argument('--assign', action='store', type=str, default=core.default_assignment, help=f'Sets the cluster letters of H, D, V, A and noise (default {core.default_assignment})')
+    my_parser.add_argument('--noise', action='store', type=float, default=core.noise_level, help=f'Sets the reading above which there is light (default {core.noise_level})')
+    my_parser.add_argument('--workers', action='store', type=int, default=os.cpu_count(), help='Sets the number of processes (default: number of CPUs)')
+    my_parser.add_argument('--json', action='store', type=str, help='Writes the results into this JSON file')
+    my_parser.add_argument('--csv', action='store', type=str, help='Writes the results into this CSV file (one line per capture)')
+    args = my_parser.parse_args()
+    if len(args.assign) != 5:
+        my_parser.error('--assign needs 5 letters (H, D, V, A and noise)')
+
+    # Glob patterns are not expanded by every shell (e.g. on Windows)
+    files = []
+    for pattern in args.files:
+        files += sorted(glob.glob(pattern)) or [pattern]
+    masks = read_masks(args.masks) if args.masks else {}
+    jobs = []
+    for filename in files:
+        mask, cipher = masks.get(str(pathlib.Path(filename)), (None, None))
+        jobs.append((filename, mask or args.mask, cipher or args.cipher, args.assign.upper(), args.noise))
+
+    print(f"Decoding {len(jobs)} captures...", file=sys.stderr)
+    if args.workers <= 1 or len(jobs) == 1:
+        results = [decode(job) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(decode, jobs))
+
+    for result in results:
+        if 'error' in result:
+            print(f"{result['file']}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{result['file']}: {result['pulses']} pulses, raw key {result['raw_key_hex']}, "
+                  f"sifted key {result.get('sifted_key_hex', '-')}", file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            write_csv(results, f)
+    if not args.json and not args.csv:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__=='__main__':
+    sys.exit(main())
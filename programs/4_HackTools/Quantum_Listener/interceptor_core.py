@@ -0,0 +1,228 @@
+"""
+Description: The clustering and decoding steps of runInterceptor.py, without the GUI (no Qt or
+pyqtgraph), for runInterceptor.py itself and for the batch mode (interceptor_batch.py).
+decode_file runs the whole chain on one capture: tally, clustering, pulse decoding, raw key,
+sifting with the mask caught by listener.py, and optionally the assignment search with the
+intercepted ciphertext (assignment_search.py).
+
+Usage: Imported by runInterceptor.py and interceptor_batch.py.
+
+	labels2D, classes, means, spreads = kclassify2D(x, y)
+	result = decode_file('key_logger/153012.dat', mask_hex='5a3c', assignment='DBECA')
+
+Author: Qcumber 2018, JH 2022
+
+Version 1.0
+"""
+
+import sys
+import string
+import pathlib
+import numpy as np
+from tabulate import tabulate
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2])) # Shared modules in programs/
+import keysift as ks
+import eve_capture as ec
+
+import cluster2d # NumPy k-means (in this folder)
+import assignment_search as asearch # Automatic polarisation assignment (in this folder)
+from live_decoder import polarisations
+from decoding import find_noise, tally, process_clustered_signals # Vectorised decoding (in this folder)
+
+noise_level = 0.0025 # Readings above this are light
+default_assignment = 'DBECA' # Cluster letters of H, D, V, A and noise (as in the GUI)
+
+def tohex(val, nbits):
+	# Function to convert to hex, with a predefined nbits
+	return hex((val + (1 << nbits)) % (1 << nbits))
+
+def apply_mask_16(unkey_bin,matchbs_bin):
+	"""
+	Applies mask matchbs_hex to unkey_bin
+	"""
+	return ks.sift_str(unkey_bin[:16], matchbs_bin[:16])
+
+def apply_mask_n16(unkey_bin,matchbs_bin):
+	"""
+	Sifts n x 16 bit binary unkey_bin in groups of 16.
+	"""
+	# Only complete groups of 16 bits are sifted
+	nbits = len(matchbs_bin)//16*16
+	if len(unkey_bin) < nbits:
+		raise ValueError('The mask is longer than the raw key')
+	return ks.sift_str(unkey_bin[:nbits], matchbs_bin[:nbits])
+
+def kclassify(data, numClasses=5):
+	"""
+	Classify 1-dimensional data into classes using KMeans algorithm
+	5 classes are a default, refering to noise, and the four polarisations to be detected.
+
+	Returns
+	labels: list of classes to which each data point belongs to, len(data) long
+	means: list of class means, len(np.unique(labels)) long
+	"""
+	# Classify (as 2D points on a line)
+	centroids, labels = cluster2d.classify(np.c_[data, np.zeros(len(data))], numClasses)
+
+	# Class Means
+	means = []
+	# spreads = []
+	for label in np.unique(labels):
+		means.append(np.mean(data[labels==label]))
+		# spreads.append(np.std(data[labels==label]))
+	return np.array(labels), np.array(means)
+
+def kclassify2D(x: np.ndarray,y: np.ndarray, numClasses=5, init=None):
+	"""
+	Classify 2-dimensional data into classes using KMeans algorithm
+	5 classes are a default, refering to noise, and the four polarisations to be detected.
+	init: starting cluster centres (in the units of x and y), e.g. from an earlier capture
+	"""
+
+	data=np.c_[x,y].reshape([-1,2])
+
+	# Normalise (each column to unit length)
+	norm = np.linalg.norm(data, axis=0)
+	norm[norm==0] = 1
+	dataNormed = data/norm
+	# Classify
+	_, labels = cluster2d.classify(dataNormed, numClasses, None if init is None else np.asarray(init)/norm)
+	# Making sure noise is classified as group A (index 0)
+	# Identify noise as the group with the largest size
+	# This may result in rare bugs where noise signals is not the mode, but unlikely
+	# Leaving in debug print commands for future debugging use
+	bincount = np.bincount(labels)
+	noise = np.argmax(bincount)
+	if noise != 0:
+		#print('Enetered wrong noise block.')
+		#print(f'labels: {labels}')
+
+		# Identify group wrongly classified as A
+		old_A_idx = np.where(labels == 0)
+		new_A_idx = np.where(labels == noise)
+		#print(f'old_A_idx: {old_A_idx}')
+		#print(f'new_A_idx: {new_A_idx}')
+
+		# Swap values with wrongly classified group
+		labels[new_A_idx] = 0
+		labels[old_A_idx] = noise
+
+		#print(f'new labels: {labels}')
+
+	# Order the other groups by the direction of their centre (signal2 against signal1), so that
+	# the letters do not depend on the random start of KMeans (same letters for the same setup)
+	counts = np.maximum(np.bincount(labels, minlength=numClasses), 1)
+	centres = np.c_[np.bincount(labels, data[:,0], numClasses), np.bincount(labels, data[:,1], numClasses)]/counts[:,None]
+	order = cluster2d.angle_order(centres) # As the live decoder (live_decoder.py)
+	relabel = np.empty(numClasses, dtype=int)
+	relabel[order] = np.arange(numClasses)
+	labels = relabel[labels]
+
+	# Class & Means, Spreads
+	classes = np.unique(labels)
+	counts = np.bincount(labels)[classes]
+	means = np.c_[np.bincount(labels, data[:,0])[classes], np.bincount(labels, data[:,1])[classes]]/counts[:,None]
+	squares = np.c_[np.bincount(labels, data[:,0]**2)[classes], np.bincount(labels, data[:,1]**2)[classes]]/counts[:,None]
+	spreads = np.sqrt(np.maximum(squares - means**2, 0))
+	# print('kmeans labels = {}'.format(list(labels)))
+	return labels, classes, means, spreads
+
+def load_centroids(filename):
+	"""Cluster centres saved by save_centroids or live_decoder.py (None if there are none)"""
+	try:
+		saved = np.loadtxt(filename).reshape(-1,2)
+	except (OSError, ValueError):
+		return None
+	# Rows: scale, noise levels, centroids (scaled)
+	return saved[2:]*saved[0]
+
+def save_centroids(filename, x, y, centroids):
+	"""Saves the cluster centres of a capture in the format of live_decoder.py"""
+	data = np.c_[x,y]
+	scale = np.sqrt((data**2).mean(axis=0))
+	scale[scale==0] = 1
+	noise_xy = [find_noise(x), find_noise(y)]
+	np.savetxt(filename, np.vstack((scale, noise_xy, centroids/scale)))
+
+def hist(signals, numbins=200):
+	"""
+	Returns bin-centered histogram
+	"""
+	freq, bins = np.histogram(signals,numbins)
+	step = bins[1]-bins[0]
+	bins = bins[:-1]+step/2
+	return freq, bins, step
+
+def manualClassify(voltage, voltageClasses):
+	"""
+	returns the class in aClasses that matches most to an element in a
+	voltageClasses = [0,v0,v1,v2,v3]
+	"""
+	# relabels indices 1,2,3,4 to polarisation labels 0,1,2,3
+	# polarisationLabels = [0,0,1,2,3]
+	# argmin finds the element position in voltageClasses that best matches voltage
+	return np.argmin((voltage-voltageClasses)**2)
+
+
+def insanity_check(number, min_value, max_value):
+	''' To check whether the value is out of given range'''
+	if number > max_value:
+		return max_value
+	if number < min_value:
+		return min_value
+	else:
+		return number
+
+def cluster_report(classes, means, spreads):
+	"""Table of the clusters (letter, mean and spread of both signals)"""
+	return tabulate(
+		list(zip([string.ascii_uppercase[Class] for Class in classes],
+			means[:,0],
+			spreads[:,0],
+			means[:,1],
+			spreads[:,1])),
+		headers=['cluster','signal1(V)','error1(V)','signal2(V)','error2(V)']
+	)
+
+def raw_key(result, assignment):
+	"""
+	Raw key of the decoded pulses (process_clustered_signals) with the cluster letters of
+	H, D, V, A and noise. Returns the polarisations, and the key in binary and hex.
+	"""
+	rawKey = np.array(polarisations(result, assignment), dtype=int)
+	rawKey_bin_string = ''.join(['1' if pol>=2 else '0' for pol in rawKey]) #0-->0, 1-->0, 2-->1, 3-->1
+	rawKey_hex = tohex(int("0b"+rawKey_bin_string, 2), len(rawKey)) if len(rawKey) else ''
+	return rawKey, rawKey_bin_string, rawKey_hex
+
+def decode_file(filename, mask_hex=None, assignment=default_assignment, cipher_hex=None, noise=noise_level, init=None):
+	"""
+	Decodes one capture (.dat or .cap), as Start, Decode! and Apply (and Solve when
+	cipher_hex is given) in the GUI. Returns a dict of the results.
+	"""
+	signals = ec.load_signals(filename)
+	dev1, dev2 = tally(signals[:,0], signals[:,1], noise)
+	labels2D, classes, means, spreads = kclassify2D(dev1, dev2, numClasses=5, init=init)
+	result = process_clustered_signals(labels2D)
+	out = {'file': str(filename), 'samples': len(signals), 'pulses': len(result),
+		'clusters': [{'cluster': string.ascii_uppercase[Class], 'signal1': float(m[0]), 'error1': float(e[0]),
+			'signal2': float(m[1]), 'error2': float(e[1])} for Class, m, e in zip(classes, means, spreads)],
+		'cluster_report': cluster_report(classes, means, spreads)}
+
+	if cipher_hex:
+		# The assignment with the most readable decrypted message
+		results = asearch.search(result, mask_hex or '', cipher_hex, workers=1)
+		if results:
+			assignment = results[0]['assignment']
+			out.update({'key': results[0]['key'], 'round': results[0]['offset'], 'message': results[0]['message'],
+				'printable': results[0]['printable']})
+	out['assignment'] = assignment
+	rawKey, rawKey_bin_string, rawKey_hex = raw_key(result, assignment)
+	out.update({'raw_key': ''.join([str(pol) for pol in rawKey]), 'raw_key_bin': rawKey_bin_string, 'raw_key_hex': rawKey_hex})
+
+	if mask_hex:
+		matchbs_bin = np.binary_repr(int(mask_hex, 16), width=4*len(mask_hex))
+		maskedKey = apply_mask_n16(rawKey_bin_string, matchbs_bin)
+		out.update({'mask': mask_hex, 'sifted_key_bin': maskedKey,
+			'sifted_key_hex': tohex(int(maskedKey[:32],2),len(matchbs_bin)) if maskedKey else ''})
+	return out
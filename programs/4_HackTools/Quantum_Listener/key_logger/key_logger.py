@@ -2,30 +2,48 @@
 Description: Python wrapper program to eavesdrop on the quantum channel for Eve.
 
 Usage: Start the program and wait. The photodiode readings will be logged into a .dat
-file. The .dat file is automatically named with the current time.
+file. The .dat file is automatically named with the current time. With --binary, the
+readings are logged into a .cap capture file instead (with a .idx index of the pulses,
+see eve_capture.py), which loads much faster for long captures. With --stream, the
+Arduino sends the readings continuously (STREAM command of ArduinoEve.ino) instead of
+being asked for every reading with VOLTS?, and they are decoded in blocks.
 
 Options:
 
   -h, --help       show this help message and exit
   --serial SERIAL  Sets the serial address of the Arduino
+  --binary         Logs into a binary .cap capture instead of a .dat text file
+  --stream [MS]    Streams the readings, one every MS ms (default 0: as fast as the serial line allows)
+  --no-reset       Opens the serial port without resetting the Arduino (DTR kept low)
 
 Author: Qcumber 2018
 
 Version: 1.0
 '''
 
-import serial
 import sys
 import time
+import pathlib
 from datetime import datetime
 import argparse # For running the script with options
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[3])) # Shared modules in programs/
+import serial_transport as st
+import eve_capture as ec
 
 my_parser = argparse.ArgumentParser()
 my_parser.add_argument('--serial', action='store', type=str, required=True, help='Sets the serial address of the Arduino')
+my_parser.add_argument('--binary', action='store_true', help='Logs into a binary .cap capture instead of a .dat text file')
+my_parser.add_argument('--stream', action='store', type=int, nargs='?', const=0, metavar='MS', help='Streams the readings, one every MS ms (default 0: as fast as the serial line allows)')
+my_parser.add_argument('--no-reset', action='store_true', help='Opens the serial port without resetting the Arduino (DTR kept low)')
 
 # Get the serial address
 args = my_parser.parse_args()
 serial_addr = vars(args).get('serial')
+binary = vars(args).get('binary')
+stream_interval = vars(args).get('stream')
+no_reset = vars(args).get('no_reset') # Keeps the Arduino running (no auto-reset)
 
 print("Eavesdropping... will record any voltages into a file")
 print("To exit the program, use Ctrl+C \n")
@@ -36,6 +54,10 @@ print("To exit the program, use Ctrl+C \n")
 baudrate1 = 38400      # Default in Arduino
 timeout1 = 0.1        # Serial timeout (in s).
 refresh_rate= 0.05     # Minimum offset around 10 ms
+reply_timeout = 5     # Deadline for the Arduino reply (in s).
+stream_block = 768    # Bytes of stream decoded at once (256 readings, 0.2 s at full rate)
+print_every = 1       # Time between two status lines when streaming (in s).
+light_level = ec.LIGHT_LEVEL # Readings above this are light, for the index of the pulses (in ADC counts).
 
 # Serial 2
 baudrate2 = 38400    # Default in Arduino
@@ -46,40 +68,93 @@ timeout2 = 0          # Serial timeout (in s).
 # by the other device's response time.
 
 # Opens the receiver side serial port
-ardu = serial.Serial(serial_addr, baudrate1, timeout=timeout1)
-
-# Waiting until the serial device is open (for some computer models)
-time.sleep(2)
+# Waits until the Arduino has booted and answers *IDN? (instead of a fixed 2 s wait)
+ardu = st.open_ready(serial_addr, baudrate1, timeout=timeout1, reset=not no_reset)
 print("Ready!\n")
 
 # The filename is the current time
 filename_tmp =  str(datetime.now().time())[:8]
 tmp1 = filename_tmp.split(":")
-filename = "".join(tmp1) + '.dat'
+filename = "".join(tmp1) + ('.cap' if binary else '.dat')
 print(filename)
 print("Logging the voltages into:", filename)
 
+# The file stays open while logging
+if binary:
+    capture = ec.CaptureWriter(filename, threshold=light_level)
+else:
+    myfile = open(filename, "a+")
+
 ardu.reset_input_buffer()   # Clear previous buffer
 time_start = time.time()    # Get the starting time
 
+def log_readings(v1, v2, t):
+    # Writes a block of readings (arrays) to the file
+    if binary:
+        capture.append_many(v1, v2, t)
+    else:
+        myfile.write("".join([f"{a} {b} \n" for a, b in zip(v1, v2)]))
+        myfile.flush()
+
+def close_all():
+    if binary:
+        capture.close()
+    else:
+        myfile.close()
+    ardu.close()
+    print ("\nThank you for using the program!")
+
+if stream_interval is not None:
+    ardu.write(f"STREAM {stream_interval} ".encode())
+    reply = ardu.read_reply(reply_timeout)
+    if reply != "OK":
+        print("The Arduino does not stream (reply: " + reply + "), please update ArduinoEve.ino")
+        close_all()
+        sys.exit()
+    rest = b''                  # Unfinished frame
+    time_last = time.time()     # Arrival of the previous block
+    time_print = time_last
+    count = 0
+    while True:
+        try:
+            data = ardu.read_packet(stream_block, reply_timeout)
+            time_now = time.time()
+            v1, v2, rest = ec.decode_stream(rest + data)
+            # The readings of a block are spread evenly since the previous block
+            t = time_last + (time_now - time_last) * np.arange(1, len(v1) + 1) / max(len(v1), 1)
+            time_last = time_now
+            log_readings(v1, v2, t)
+            count += len(v1)
+            if len(v1) and time_now - time_print >= print_every:
+                print(f"{time_now-time_start:.3f} {v1[-1]:>3} {v2[-1]:>3}  ({count} readings)")
+                time_print = time_now
+        except KeyboardInterrupt:
+            # Stop the stream and keep what is still on the way
+            ardu.write("STOP ".encode())
+            data = rest
+            while not data.endswith(b'OK\r\n'):
+                data += ardu.read_packet(stream_block, reply_timeout)
+            v1, v2, rest = ec.decode_stream(data)
+            log_readings(v1, v2, time.time())
+            print(f"\n{count + len(v1)} readings logged")
+            close_all()
+            sys.exit()  # Exits the program
+
 while True:
     try:
         ardu.write("VOLTS? ".encode())
-        # Block until receive the reply
-        while True:
-            if ardu.in_waiting:
-                # Might not work exactly as expected yet, depending on the \r and \n the Arduino spits out
-                byte_response1 = ardu.readline()
-                byte_response2 = ardu.readline()
-                volt_now1 = byte_response1.decode().strip()
-                volt_now2 = byte_response2.decode().strip()
-                break
+        # Block until receive the reply (one line per photodiode)
+        volt_now1 = ardu.read_reply(reply_timeout)
+        volt_now2 = ardu.read_reply(reply_timeout)
         print(f"{time.time()-time_start:.3f} {volt_now1:>3} {volt_now2:>3}")
         # Write to a file
-        with open(filename, "a+") as myfile:
+        if binary:
+            capture.append(int(volt_now1), int(volt_now2))
+        else:
             myfile.write(volt_now1 + " " + volt_now2 + " " + "\n")
+            myfile.flush()  # For the live decoding (and nothing is lost on Ctrl+C)
         # Wait until the next time
         time.sleep(refresh_rate)
     except KeyboardInterrupt:
-        print ("\nThank you for using the program!")
+        close_all()
         sys.exit()  # Exits the program 
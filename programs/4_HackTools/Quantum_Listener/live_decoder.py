@@ -0,0 +1,256 @@
+'''
+Description: Live version of the interceptor decoding. Instead of loading a
+finished .dat file, the photodiode readings are decoded while they are logged:
+new readings are assigned to the clusters found so far (which keep following
+the signal, see cluster2d.OnlineKMeans), and every pulse is decoded as soon as
+it is over, with the same rules as runInterceptor.py:
+  - readings where only one photodiode sees light are set to the noise level
+    (tally),
+  - the noise is the largest cluster, and always cluster A,
+  - a pulse is a run of signal (not noise) readings, decoded as the most
+    common cluster of the run (process_clustered_signals),
+  - the first pulse of every 17 is the sync pulse and is dropped.
+The clusters are found once enough readings with light have come in, or
+start from the centroids saved by an earlier run (--centroids).
+
+Usage: Follow the file written by key_logger.py, or read Eve's Arduino
+directly (the readings are then also logged, like key_logger.py):
+
+        python live_decoder.py --file key_logger/153012.dat --assign DBECA
+        python live_decoder.py --serial /dev/ttyACM0 --assign DBECA
+
+The assignment gives the cluster letters of H, D, V, A and noise (as typed in
+the GUI). runInterceptor.py also decodes live with its 'Live' button.
+
+Options: python live_decoder.py [-h]
+
+        -h, --help           show this help message and exit
+        --file FILE          Follows this .dat or .cap file (written by key_logger.py)
+        --serial SERIAL      Reads Eve's Arduino at this serial address instead
+        --assign LETTERS     Sets the cluster letters of H, D, V, A and noise (e.g. DBECA)
+        --centroids FILE     Starts from the centroids saved in this file, and saves them at the end
+        --warmup N           Sets the number of readings with light needed to find the clusters (default 100)
+        --noise N            Sets the reading above which there is light (default 0.0025)
+        --no-reset           Opens the serial port without resetting the Arduino (DTR kept low)
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import os
+import sys
+import time
+import string
+import pathlib
+import argparse # For running the script with options
+from collections import Counter
+from datetime import datetime
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2])) # Shared modules in programs/
+import eve_capture as ec
+
+import cluster2d
+from decoding import find_noise
+
+num_classes = 5       # Noise and the four polarisations
+frame_pulses = 17     # Sync pulse + 16 bit sequence
+noise_level = 0.0025  # Readings above this are light (as self.noise in runInterceptor.py)
+warmup = 100          # Readings with light needed to find the clusters
+memory = 1000         # Weight of the past readings in the centroids
+poll_time = 0.2       # Time between two looks at the file (in s)
+refresh_rate = 0.05   # Time between two VOLTS? readings (in s), as key_logger.py
+
+class OnlineDecoder(object):
+    # Decodes Eve's readings (n x 2) batch after batch, into cluster labels (A = noise = 0)
+
+    def __init__(self, centroids=None, noise=noise_level, warmup=warmup, memory=memory):
+        self.noise = noise
+        self.warmup = warmup
+        self.memory = memory
+        self.kmeans = None
+        self.scale = None
+        self.noise_xy = None
+        self.pending = np.empty((0, 2))   # Readings waiting for the clusters
+        self.run = []                     # Labels of the pulse being received
+        self.runs = 0                     # Pulses seen so far (sync pulses included)
+        if centroids is not None:
+            # Saved centroids: scale (2 values), noise levels (2 values), centroids (5 x 2)
+            saved = np.asarray(centroids, dtype=float).reshape(-1, 2)
+            self.scale, self.noise_xy = saved[0], saved[1]
+            # Letters as in runInterceptor.py (older files kept the order of the k-means start)
+            order = cluster2d.angle_order(saved[2:] * self.scale)
+            self.kmeans = cluster2d.OnlineKMeans(saved[2:][order], np.full(len(saved) - 2, memory), memory)
+
+    @property
+    def centroids(self):
+        """Centroids in the units of the readings (None before the clusters are found)"""
+        return None if self.kmeans is None else self.kmeans.centroids * self.scale
+
+    def saved(self):
+        """The state to give back to OnlineDecoder(centroids=...) for the next capture"""
+        return np.vstack((self.scale, self.noise_xy, self.kmeans.centroids))
+
+    def tally(self, xy):
+        # When only one of the photodiodes sees light, both are set to the noise level
+        noTally = np.logical_xor(xy[:, 0] > self.noise, xy[:, 1] > self.noise)
+        xy[noTally] = self.noise_xy
+        return xy
+
+    def start(self, xy):
+        # Finds the clusters on the first readings, the largest one (noise) becomes A, and the
+        # others are ordered by their direction, as in runInterceptor.py (cluster2d.angle_order)
+        self.noise_xy = np.array([find_noise(xy[:, 0]), find_noise(xy[:, 1])])
+        xy = self.tally(xy)
+        # Scale both photodiodes alike (normalize in kclassify2D)
+        self.scale = np.sqrt((xy ** 2).mean(axis=0))
+        self.scale[self.scale == 0] = 1
+        centroids, labels = cluster2d.classify(xy / self.scale, num_classes)
+        counts = np.bincount(labels, minlength=num_classes)
+        order = cluster2d.angle_order(centroids * self.scale, np.argmax(counts))
+        self.kmeans = cluster2d.OnlineKMeans(centroids[order], counts[order], self.memory)
+
+    def update(self, xy):
+        """
+        Feeds new readings (n x 2). Returns the labels of the pulses that are
+        over (sync pulses dropped).
+        """
+        xy = np.array(xy, dtype=float).reshape(-1, 2)
+        if self.kmeans is None:
+            self.pending = np.vstack((self.pending, xy))
+            # Wait for some pulses, the capture usually starts in the dark
+            if np.count_nonzero((self.pending > self.noise).any(axis=1)) < self.warmup:
+                return []
+            xy, self.pending = self.pending, None
+            self.start(xy.copy())
+        labels = self.kmeans.partial_fit(self.tally(xy) / self.scale)
+        # Split into runs of signal readings: a pulse is over when the noise is back
+        signal = labels != 0
+        edges = np.flatnonzero(np.diff(signal.astype(int))) + 1
+        decoded = []
+        for part in np.split(labels, edges):
+            if part[0] != 0:
+                self.run.extend(part.tolist())
+            elif self.run:
+                decoded += self.endRun()
+        return decoded
+
+    def flush(self):
+        """Ends the pulse being received (e.g. at the end of a file)"""
+        return self.endRun() if self.run else []
+
+    def endRun(self):
+        # Most common cluster of the pulse, unless it is a sync pulse
+        label = Counter(self.run).most_common(1)[0][0]
+        self.run = []
+        self.runs += 1
+        if (self.runs - 1) % frame_pulses == 0:
+            return []
+        return [label]
+
+class FileFollower(object):
+    # Reads the lines added to a .dat file, or the records added to a .cap capture (like tail -f)
+
+    def __init__(self, filename):
+        self.capture = ec.CaptureReader(filename) if pathlib.Path(filename).suffix == '.cap' else None
+        self.file = open(filename, 'r') if self.capture is None else None
+        self.partial = ''
+
+    def read(self):
+        """Returns the new complete readings (n x 2)"""
+        if self.capture is not None:
+            records = self.capture.read()
+            return np.c_[records['v1'], records['v2']].astype(float)
+        text = self.partial + self.file.read()
+        lines = text.split('\n')
+        self.partial = lines.pop()  # Not finished yet
+        values = [line.split()[:2] for line in lines if len(line.split()) >= 2]
+        return np.array(values, dtype=float).reshape(-1, 2)
+
+    def close(self):
+        (self.file if self.capture is None else self.capture).close()
+
+def polarisations(labels, assignment):
+    """
+    Converts cluster labels to polarisations, with the letters of H, D, V, A
+    and noise (e.g. 'DBECA'). Labels that are not assigned are dropped.
+    """
+    polAssignment = [string.ascii_uppercase.index(c) for c in assignment.upper()[:4]]
+    return [polAssignment.index(label) for label in labels if label in polAssignment]
+
+def main():
+    my_parser = argparse.ArgumentParser()
+    my_parser.add_argument('--file', action='store', type=str, help='Follows this .dat or .cap file (written by key_logger.py)')
+    my_parser.add_argument('--serial', action='store', type=str, help="Reads Eve's Arduino at this serial address instead")
+    my_parser.add_argument('--assign', action='store', type=str, help='Sets the cluster letters of H, D, V, A and noise (e.g. DBECA)')
+    my_parser.add_argument('--centroids', action='store', type=str, help='Starts from the centroids saved in this file, and saves them at the end')
+    my_parser.add_argument('--warmup', action='store', type=int, default=warmup, help=f'Sets the number of readings with light needed to find the clusters (default {warmup})')
+    my_parser.add_argument('--noise', action='store', type=float, default=noise_level, help=f'Sets the reading above which there is light (default {noise_level})')
+    my_parser.add_argument('--no-reset', action='store_true', help='Opens the serial port without resetting the Arduino (DTR kept low)')
+    args = my_parser.parse_args()
+    if (args.file is None) == (args.serial is None):
+        my_parser.error('give either --file or --serial')
+    if args.assign is not None and len(args.assign) != 5:
+        my_parser.error('--assign needs 5 letters (H, D, V, A and noise)')
+
+    centroids = None
+    if args.centroids is not None and os.path.exists(args.centroids):
+        centroids = np.loadtxt(args.centroids)
+        print("Starting from the centroids in", args.centroids)
+    decoder = OnlineDecoder(centroids, noise=args.noise, warmup=args.warmup)
+
+    if args.file is not None:
+        source = FileFollower(args.file)
+        read = source.read
+    else:
+        import serial_transport as st
+        source = st.open_ready(args.serial, 38400, timeout=0.1, reset=not args.no_reset) # Waits until the Arduino answers *IDN?
+        filename = "".join(str(datetime.now().time())[:8].split(":")) + '.dat'
+        print("Logging the voltages into:", filename)
+        logfile = open(filename, "a+")
+        def read():
+            # One VOLTS? reading, logged like key_logger.py
+            source.write("VOLTS? ".encode())
+            volts = [source.read_reply(5), source.read_reply(5)]
+            logfile.write(volts[0] + " " + volts[1] + " " + "\n")
+            logfile.flush()
+            time.sleep(refresh_rate)
+            return np.array([volts], dtype=float)
+
+    print("Decoding... to exit the program, use Ctrl+C \n")
+    labels = []
+    def show(new_labels):
+        # Prints the pulses as they come, one line per 16 bit round
+        for label in new_labels:
+            labels.append(label)
+            print(string.ascii_uppercase[label], end='', flush=True)
+            if len(labels) % 16 == 0:
+                round_labels = labels[-16:]
+                if args.assign is not None:
+                    pols = polarisations(round_labels, args.assign)
+                    bits = ''.join(['1' if pol >= 2 else '0' for pol in pols]) # 0(H), 1(D) -> 0, 2(V), 3(A) -> 1
+                    print(f"  pol: {''.join(map(str, pols))}  bits: {bits}", end='')
+                print(flush=True)
+    try:
+        while True:
+            xy = read()
+            if len(xy) == 0:
+                time.sleep(poll_time)
+                continue
+            show(decoder.update(xy))
+    except KeyboardInterrupt:
+        show(decoder.flush())
+        print(f"\n{len(labels)} pulses decoded")
+        if args.assign is not None:
+            pols = polarisations(labels, args.assign)
+            print("Raw key (bin):", ''.join(['1' if pol >= 2 else '0' for pol in pols]))
+        if args.centroids is not None and decoder.kmeans is not None:
+            np.savetxt(args.centroids, decoder.saved())
+            print("Centroids saved into", args.centroids)
+        print("Thank you for using the program!")
+    finally:
+        source.close()
+
+if __name__=='__main__':
+    main()
@@ -1,247 +1,58 @@
 """
 Description: GUI for clustering algorithm for `Q'KD hacking. Modified code from Qcamp2018. Some parts were inspired from pulse fitting.
 
-Usage: Select the .dat file obtained from key_logger.py. Press 'Start' on the GUI to run the clustering algorithm, 'Decode!' to obtain
+Usage: python runInterceptor.py, or python runInterceptor.py --batch [options] to decode captures without the GUI
+(see interceptor_batch.py).
+
+Select the .dat (or .cap) file obtained from key_logger.py. Press 'Start' on the GUI to run the clustering algorithm, 'Decode!' to obtain
 the raw key, and 'Apply' with the sifted basis from listener.py to obtain the sifted key. There are four possible keys depending on 
 your polarization assignments in the 'Decode!' section. Only one of these keys will return a decrypted message that makes sense.
+'Solve' tries all the assignments with the mask and the intercepted ciphertext (hex), and keeps the one whose decrypted message is
+the most readable (see assignment_search.py).
+'Live' follows the selected file while key_logger.py is still writing it, and decodes the pulses as they come (see live_decoder.py).
+The cluster centres found by 'Start' are saved into key_logger/centroids.txt, and the next 'Start' begins from them (delete the
+file after changing the setup). live_decoder.py --centroids reads the same file.
 
 Author: Qcumber 2018, JH 2022
 
 Version 1.0
 """
 
+import os
 import sys
 import glob
-#import os
+import pathlib
 #import time
 import string
-import matplotlib.pyplot as plt
+
+if __name__ == '__main__' and '--batch' in sys.argv:
+	# Headless: no Qt needed (see interceptor_batch.py)
+	import interceptor_batch
+	sys.argv.remove('--batch')
+	sys.exit(interceptor_batch.main())
 
 from PyQt5 import uic
 from PyQt5.QtWidgets import QMainWindow, QApplication
 from PyQt5.QtCore import QTimer
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import normalize
 from tabulate import tabulate
-from collections import Counter
 
 import pyqtgraph as pg
 import numpy as np
 
-#ui_path = os.path.dirname(os.path.abspath(__file__))
-#form_class = uic.loadUiType(os.path.join(ui_path, "guiInterceptor.ui"))[0]
-
-form_class = uic.loadUiType("guiInterceptor.ui")[0]
-
-def find_noise(x):
-	"""guesses the noise floor as the most frequently occuring value"""
-	noise = Counter(x).most_common(1)[0][0]
-	#print(f'noise:{noise}')
-	return noise
-
-def tohex(val, nbits):
-	# Function to convert to hex, with a predefined nbits
-	return hex((val + (1 << nbits)) % (1 << nbits))
-
-def apply_mask_16(unkey_bin,matchbs_bin):
-	"""
-	Applies mask matchbs_hex to unkey_bin
-	"""
-	# Performing sifting process
-	# matchbs_bin = np.binary_repr((int(matchbs_hex, 0)), width=16)
-	siftmask_bin = ''
-	for i in range(16): # 16 bits
-		if matchbs_bin[i] == '0' :
-			siftmask_bin += 'X'
-		elif matchbs_bin[i] == '1':
-			siftmask_bin += unkey_bin[i]
-	#print "\nMatched key bits:",\
-	#    siftmask_bin[:4], siftmask_bin[4:8], siftmask_bin[8:12], siftmask_bin[12:16]
-	# Remove all the X'es
-	siftkey_bin = ''
-	siftkey_len = 0
-	for bit in siftmask_bin:
-		if bit == 'X':
-			pass
-		else:
-			siftkey_bin += bit
-			siftkey_len += 1
-	#siftkey_bin = siftkey_bin.zfill(16) # pad to make length 16 bit
-	return siftkey_bin
-
-def apply_mask_n16(unkey_bin,matchbs_bin):
-	"""
-	Sifts n x 16 bit binary unkey_bin in groups of 16.
-	"""
-	# print len(matchbs_bin)
-	siftkey_vec = []
-	#print len(matchbs_bin)
-	for n in np.arange(len(matchbs_bin)//16):
-		masked = apply_mask_16(unkey_bin[n*16:(n+1)*16],matchbs_bin[n*16:(n+1)*16])
-		#print(n, '\t', masked)
-		siftkey_vec.append(masked)
-	# print siftkey_vec
-	siftkey_bin = ''.join(siftkey_vec)
-	return siftkey_bin
-
-def kclassify(data, numClasses=5):
-	"""
-	Classify 1-dimensional data into classes using KMeans algorithm
-	5 classes are a default, refering to noise, and the four polarisations to be detected.
-
-	Returns
-	labels: list of classes to which each data point belongs to, len(data) long
-	means: list of class means, len(np.unique(labels)) long
-	"""
-	# Classify
-	km = KMeans(n_clusters=numClasses)
-	km.fit(data.reshape(-1,1))
-	km.predict(data.reshape(-1,1))
-	labels = km.labels_
-
-	# Class Means
-	means = []
-	# spreads = []
-	for label in np.unique(labels):
-		means.append(np.mean(data[labels==label]))
-		# spreads.append(np.std(data[labels==label]))
-	return np.array(labels), np.array(means)
-
-def kclassify2D(x: np.ndarray,y: np.ndarray, numClasses=5):
-	"""
-	Classify 2-dimensional data into classes using KMeans algorithm
-	5 classes are a default, refering to noise, and the four polarisations to be detected.
-	"""
-
-	data=np.c_[x,y].reshape([-1,2])
-
-	# Normalise
-	x = normalize(x.reshape([-1,1]),axis=0)
-	y = normalize(y.reshape([-1,1]),axis=0)
-
-	dataNormed=np.array(list(zip(x,y))).reshape([-1,2])
-	# Classify
-	km = KMeans(n_clusters=numClasses, algorithm="lloyd")
-	km.fit(dataNormed)
-	km.predict(dataNormed)
-	labels = km.labels_
-	# Making sure noise is classified as group A (index 0)
-	# Identify noise as the group with the largest size
-	# This may result in rare bugs where noise signals is not the mode, but unlikely
-	# Leaving in debug print commands for future debugging use
-	bincount = np.bincount(labels)
-	noise = np.argmax(bincount)
-	if noise != 0:
-		#print('Enetered wrong noise block.')
-		#print(f'labels: {labels}')
-
-		# Identify group wrongly classified as A
-		old_A_idx = np.where(labels == 0)
-		new_A_idx = np.where(labels == noise)
-		#print(f'old_A_idx: {old_A_idx}')
-		#print(f'new_A_idx: {new_A_idx}')
-
-		# Swap values with wrongly classified group
-		labels[new_A_idx] = 0
-		labels[old_A_idx] = noise
-
-		#print(f'new labels: {labels}')
-
-
-	# Class & Means, Spreads
-	means = []
-	means2 = []
-	spreads = []
-	spreads2 = []
-	classes = np.unique(labels)
-
-	for label in classes:
-		means.append(np.mean(data[:,0][labels==label]))
-		means2.append(np.mean(data[:,1][labels==label]))
-		spreads.append(np.std(data[:,0][labels==label]))
-		spreads2.append(np.std(data[:,1][labels==label]))
-	# print('kmeans labels = {}'.format(list(labels)))
-	return np.array(list(labels)), np.array(classes), np.c_[means,means2], np.c_[spreads,spreads2]
-
-def hist(signals, numbins=200):
-	"""
-	Returns bin-centered histogram
-	"""
-	freq, bins = np.histogram(signals,numbins)
-	step = bins[1]-bins[0]
-	bins = bins[:-1]+step/2
-	return freq, bins, step
-
-def remove_adjacent_duplicates(a):
-	undup = []
-	# a = np.array(a)
-	# print 'shape = {}'.format(a.shape)
-	for i in np.arange(len(a)):
-		if i==0: #no previous element to compare with, first element gets included automatically
-			undup.append(a[i])
-		else:
-			if a[i] != a[i-1]:
-				undup.append(a[i])
-	return np.array(undup)
-
-def manualClassify(voltage, voltageClasses):
-	"""
-	returns the class in aClasses that matches most to an element in a
-	voltageClasses = [0,v0,v1,v2,v3]
-	"""
-	# relabels indices 1,2,3,4 to polarisation labels 0,1,2,3
-	# polarisationLabels = [0,0,1,2,3]
-	# argmin finds the element position in voltageClasses that best matches voltage
-	return np.argmin((voltage-voltageClasses)**2)
-
-
-def remove_header(signals,numConstant=3):
-	"""
-	Removes the header that has the signature of a high voltage being numConstant number of points
-	"""
-	ds = np.diff(signals)
-	# Finds non-zero signal regions
-	starts = np.where(ds>0)[0]
-	stops = np.where(ds<0)[0]
-
-	#print((starts, '\n', stops))
-
-	# plt.figure()
-	# plt.scatter(starts,stops)
-	# plt.show()
-	# Finds header regions
-	header_starts=starts[stops-starts>numConstant]+1
-	header_stops=stops[stops-starts>numConstant]
-
-	# Removes header regions
-	headerless_signal = [signal for i, signal in enumerate(signals) if not np.any((i>=header_starts)&(i<=header_stops))]
-	return headerless_signal
-
-def process_clustered_signals(signals):
-
-	# Find nonzero entries in an array
-	nonzero_idx = np.nonzero(signals)[0]
-	#print(nonzero_idx) # Debug
-
-	consecutives_idx = np.split(nonzero_idx, np.where(np.diff(nonzero_idx) != 1)[0]+1)
-	result_list = []
-	for groups_idx in consecutives_idx:
-		result =  Counter(signals[groups_idx]).most_common(1)[0][0]
-		result_list.append(result)
-
-	# Remove the initialisation signals (idx 0, 17, etc)
-	del result_list[0::17]
-
-	return (result_list)
-
-def insanity_check(number, min_value, max_value):
-	''' To check whether the value is out of given range'''
-	if number > max_value:
-		return max_value
-	if number < min_value:
-		return min_value
-	else:
-		return number
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2])) # Shared modules in programs/
+import eve_capture as ec
+
+import live_decoder as ld # Live decoding (in this folder)
+import assignment_search as asearch # Automatic polarisation assignment (in this folder)
+from decoding import tally, process_clustered_signals # Vectorised decoding (in this folder)
+from interceptor_core import tohex, apply_mask_n16, kclassify2D, load_centroids, save_centroids, cluster_report # Decoding without the GUI (in this folder)
+
+ui_path = os.path.dirname(os.path.abspath(__file__))
+form_class = uic.loadUiType(os.path.join(ui_path, "guiInterceptor.ui"))[0]
+
+live_points = 500 # Number of readings shown in live mode
+key_logger_path = pathlib.Path(__file__).resolve().parent / 'key_logger' # Captures of key_logger.py
+centroids_file = str(key_logger_path / 'centroids.txt') # Cluster centres of the last capture (warm start)
 
 class MyWindowClass(QMainWindow, form_class):
 
@@ -267,8 +78,14 @@ class MyWindowClass(QMainWindow, form_class):
 		self.lineMask.textChanged.connect(self.lineMask_textChanged)
 		self.buttonApplyMask.clicked.connect(self.buttonApplyMask_clicked)
 		self.fileBox.view().pressed.connect(self.fileBox_clicked)
+		self.buttonLive.clicked.connect(self.buttonLive_clicked)
+		self.buttonSolve.clicked.connect(self.buttonSolve_clicked)
+
+		# Live mode timer
+		self.liveTimer = QTimer()
+		self.liveTimer.timeout.connect(self.liveTimer_timeout)
 
-		self.files = glob.glob('key_logger/*.dat')
+		self.files = glob.glob(str(key_logger_path / '*.dat')) + glob.glob(str(key_logger_path / '*.cap'))
 		self.fileBox.addItems(np.sort(self.files))
 
 		# Set Display Options
@@ -301,34 +118,20 @@ class MyWindowClass(QMainWindow, form_class):
 
 		# Import file
 		self.file = str(self.fileBox.currentText())
-		self.signals = np.loadtxt(self.file)
+		self.signals = ec.load_signals(self.file) # .dat (text) or .cap (binary capture)
 		self.dev1, self.dev2 = self.signals[:,0], self.signals[:,1]
 		self.signal_plot.plot(self.dev1,symbol='o',symbolPen='g',pen='g', symbolSize=5)
 		self.signal_plot.plot(self.dev2,symbol='o',symbolPen='y',pen='y', symbolSize=5)
 		# Remove points that don't tally
-		def tally(x,y,noise=self.noise):
-			"""
-			ensures that when x is a signal, y is a signal too
-			otherwise, set both x and y to the noise level
-			"""
-			x = np.array(x)
-			y = np.array(y)
-			noiseX = find_noise(x)
-			noiseY = find_noise(y)
-
-			noTally = np.logical_xor(x>noise,y>noise)
-			#self.signal_plot.plot((noTally))
-
-			for i in np.where(noTally):
-				x[i] = noiseX
-				y[i] = noiseY
-
-			return x, y
-
-		self.dev1, self.dev2 = tally(self.dev1,self.dev2)
-
-		# KMeans
-		self.labels2D, self.classes, self.voltageClasses2D, self.voltageSpreads2D = kclassify2D(self.dev1,self.dev2,numClasses=5)
+		self.dev1, self.dev2 = tally(self.dev1,self.dev2,self.noise)
+
+		# KMeans, starting from the clusters of the last capture
+		init = load_centroids(centroids_file)
+		if init is not None and len(init) != 5:
+			init = None
+		self.labels2D, self.classes, self.voltageClasses2D, self.voltageSpreads2D = kclassify2D(self.dev1,self.dev2,numClasses=5,init=init)
+		if len(self.classes) == 5:
+			save_centroids(centroids_file, self.dev1, self.dev2, self.voltageClasses2D)
 		#print (self.labels2D)
 
 
@@ -363,14 +166,7 @@ class MyWindowClass(QMainWindow, form_class):
 		np.set_printoptions(precision=2)
 		# print(tabulate(zip(self.classes, self.voltageClasses2D, self.voltageSpreads2D)))
 
-		classificationTable = tabulate(
-			list(zip(self.alphabeticalClasses,
-				self.voltageClasses2D[:,0],
-				self.voltageSpreads2D[:,0],
-				self.voltageClasses2D[:,1],
-				self.voltageSpreads2D[:,1])),
-			headers=['cluster','signal1(V)','error1(V)','signal2(V)','error2(V)']
-		)
+		classificationTable = cluster_report(self.classes, self.voltageClasses2D, self.voltageSpreads2D)
 		self.text_ClusterReport.setText(classificationTable)
 
 
@@ -438,6 +234,95 @@ class MyWindowClass(QMainWindow, form_class):
 		self.raw_key_bin.setText('{}'.format(self.rawKey_bin_string))
 		self.raw_key_hex.setText('{}'.format(rawKey_hex))
 
+	def buttonLive_clicked(self):
+		"""
+		Follows the selected file while key_logger.py writes it, and decodes every pulse as it is over.
+		The clusters are found on the first readings, then follow the new ones.
+		"""
+		if not self.buttonLive.isChecked():
+			self.liveTimer.stop()
+			self.liveFile.close()
+			return
+
+		self.file = str(self.fileBox.currentText())
+		self.liveFile = ld.FileFollower(self.file)
+		self.liveDecoder = ld.OnlineDecoder(noise=self.noise)
+		self.liveLabels = []
+		self.liveSignals = np.empty((0,2))
+
+		# Clear plots
+		self.signal_plot.clear()
+		self.histo_plot.clear()
+		self.liveCurve1 = self.signal_plot.plot(symbol='o',symbolPen='r',pen='r',symbolBrush='r',name='Sig 1', symbolSize=5)
+		self.liveCurve2 = self.signal_plot.plot(symbol='o',symbolPen='b',pen='b',symbolBrush='b',name='Sig 2', symbolSize=5)
+		self.liveScatter = self.histo_plot.plot(pen=None, symbol='o', symbolBrush=pg.mkBrush('r'))
+		self.liveTimer.start(int(ld.poll_time*1000))
+
+	def liveTimer_timeout(self):
+		# New readings from the file
+		signals = self.liveFile.read()
+		if len(signals) == 0:
+			return
+		self.liveSignals = np.vstack((self.liveSignals, signals))[-live_points:]
+		self.liveCurve1.setData(self.liveSignals[:,0])
+		self.liveCurve2.setData(self.liveSignals[:,1])
+		self.liveScatter.setData(self.liveSignals[:,0], self.liveSignals[:,1])
+
+		# Decode the pulses that are over
+		self.liveLabels += self.liveDecoder.update(signals)
+		if self.liveDecoder.centroids is None:
+			return # Still collecting the readings to find the clusters
+		self.alphabeticalClasses = list(string.ascii_uppercase)[:len(self.liveDecoder.centroids)]
+		self.text_ClusterReport.setText(tabulate(
+			list(zip(self.alphabeticalClasses, self.liveDecoder.centroids[:,0], self.liveDecoder.centroids[:,1])),
+			headers=['cluster','signal1(V)','signal2(V)']
+		))
+
+		# Polarisations with the current assignment (H, D, V, A, noise)
+		assignment = ''.join([str(edit.text()) for edit in (self.lineEdit_0, self.lineEdit_1, self.lineEdit_2, self.lineEdit_3, self.lineEdit_4)])
+		try:
+			pols = ld.polarisations(self.liveLabels, assignment)
+		except ValueError:
+			return # Not a cluster letter (yet)
+		if not pols:
+			return
+		rawKey_string = ''.join([str(pol) for pol in pols])
+		self.rawKey_bin_string = ''.join(['1' if pol>=2 else '0' for pol in pols]) #0-->0, 1-->0, 2-->1, 3-->1
+		self.raw_key.setText('{} ({}={:.1f} x 16 bits)'.format(rawKey_string,len(pols),len(pols)*1./16))
+		self.raw_key_bin.setText('{}'.format(self.rawKey_bin_string))
+		self.raw_key_hex.setText('{}'.format(tohex(int("0b"+self.rawKey_bin_string, 2), len(pols))))
+
+	def buttonSolve_clicked(self):
+		"""
+		Finds the polarisation assignment by decrypting the intercepted message with every possible key.
+		The best assignment is filled in and decoded, the best candidates are listed.
+		"""
+		if not hasattr(self, 'labels2D'):
+			self.text_SolveReport.setText('Press Start first')
+			return
+		try:
+			results = asearch.search(process_clustered_signals(self.labels2D),
+				str(self.lineMask.text()), str(self.lineCipher.text()))
+		except ValueError as e:
+			self.text_SolveReport.setText('The mask and the ciphertext must be hex ({})'.format(e))
+			return
+		if not results:
+			self.text_SolveReport.setText('No key: the mask is longer than the raw key, or has fewer than 32 matched bits')
+			return
+
+		# Fill in and decode the best assignment (H, D, V, A, noise)
+		best = results[0]
+		for edit, letter in zip((self.lineEdit_0, self.lineEdit_1, self.lineEdit_2, self.lineEdit_3, self.lineEdit_4), best['assignment']):
+			edit.setText(letter)
+		self.buttonDecode_clicked()
+		if best['offset'] == 0:
+			self.buttonApplyMask_clicked()
+
+		self.text_SolveReport.setText(tabulate(
+			[(r['assignment'], r['offset'], r['key'], '{:.0%}'.format(r['printable']), repr(r['message'][:40])) for r in results[:4]],
+			headers=['assignment','round','key','printable','message']
+		))
+
 	def lineMask_textChanged(self,text):
 		"""Counts number of bits entered"""
 		# self.text_maskNumBits.setText('{}'.format(len(text)))
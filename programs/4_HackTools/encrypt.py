@@ -1,38 +1,81 @@
 '''
 Description: Python wrapper program to encrypt a message using the secure key
-generated by recv/send_32bitQKD.py. The key is expanded with Mersenne Twister PRNG.
+generated by recv/send_32bitQKD.py. The key is expanded with Mersenne Twister PRNG
+(see keystream.py).
 
-Usage: Start the program and follow the printed insructions.
+Usage: Start the program and follow the printed insructions. Files (or pipes)
+of any size can be encrypted with --in / --out, e.g.
+python encrypt.py --key 1a2b3c4d --in log.dat --out log.enc --binary
+
+Options: python encrypt.py [-h] [--key KEY] [--in IN] [--out OUT] [--binary]
+
+        -h, --help   show this help message and exit
+        --key KEY    Sets the secure key (in 32 bit hex) instead of asking for it
+        --in IN      Encrypts this file instead of a typed message ("-" for stdin)
+        --out OUT    Writes the encrypted file here (default: stdout)
+        --binary     Writes raw bytes instead of hex (with --in / --out)
 
 Author: Qcumber 2018
 
 Version: 1.0
 '''
 
-import numpy as np
-import random
+import sys
+import pathlib
+import argparse # For running the script with options
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent)) # Shared modules in programs/
+import keystream as kst
+
+my_parser = argparse.ArgumentParser()
+my_parser.add_argument('--key', action='store', type=str, help='Sets the secure key (in 32 bit hex) instead of asking for it')
+my_parser.add_argument('--in', action='store', type=str, help='Encrypts this file instead of a typed message ("-" for stdin)')
+my_parser.add_argument('--out', action='store', type=str, help='Writes the encrypted file here (default: stdout)')
+my_parser.add_argument('--binary', action='store_true', help='Writes raw bytes instead of hex (with --in / --out)')
+args = my_parser.parse_args()
+
+key = vars(args).get('key')
+in_file = vars(args).get('in')
+out_file = vars(args).get('out')
+if key is not None and kst.parse_key(key) is None:
+    my_parser.error('--key must be the secure key in 32 bit hex (8 hex digits, e.g. 1a2b3c4d)')
+
+if in_file is not None or out_file is not None:
+    # File mode: the messages go to stderr, stdout may be the encrypted data
+    if key is None:
+        my_parser.error('--key (32 bit hex) is needed to encrypt a file')
+    fin = sys.stdin.buffer if in_file in (None, '-') else open(in_file, 'rb')
+    fout = sys.stdout.buffer if out_file in (None, '-') else open(out_file, 'wb')
+    try:
+        count = kst.crypt_stream(fin, fout, kst.parse_key(key), hex_out=not args.binary)
+    finally:
+        if fin is not sys.stdin.buffer:
+            fin.close()
+        if fout is not sys.stdout.buffer:
+            fout.close()
+    print(f"Encrypted {count} bytes", file=sys.stderr)
+    sys.exit()
 
-print("\nWelcome to encrypt! Please enter the secure key (in 32 bit hex):")
+print("\nWelcome to encrypt!")
 
-key = input()
-if len(key) == 8:
-    # Convert to int representation
-    key_int = int("0x"+key, 0)
-    # Using the key as the seed
-    random.seed(key_int)
+if key is None:
+    print("Please enter the secure key (in 32 bit hex):")
+    key = input()
+key_int = kst.parse_key(key) # Int representation (None if it is not 32 bit hex)
+if key_int is not None:
     # Ask user for the message
     print("\nPlease write down the message to encrypt below:")
     message = input()
-    # Get an array of expanded key. Each element corresponds to a byte
-    expKey_arr = [int(random.getrandbits(8)) for i in range(len(message))]
-    # Get the XORed message
-    xorMessage = [ord(message[i])^expKey_arr[i] for i in range(len(message))]
-    # Get the hex representation for the message
-    xorMessage_hex = [hex(xorMessage[i])[2:].zfill(2) for i in range(len(message))]
-    # Performing some cosmetics and obtain the encrypted Message
-    encryptedMessage = ''.join(xorMessage_hex)
+    try:
+        # One byte per character
+        message_bytes = message.encode('latin-1')
+    except UnicodeEncodeError:
+        print("The message can only contain Latin-1 characters. Please try again")
+        sys.exit()
+    # XOR with the expanded key (using the key as the seed), and get the hex representation
+    encryptedMessage = kst.crypt(message_bytes, key_int).hex()
     print("\nThe encrypted message is:")
     print(encryptedMessage)
     print("\nTask completed. Thank you for using the program!")
 else :
-    print("The key is not 4 bytes. Please try again")
+    print("The key is not 4 bytes in hex. Please try again")
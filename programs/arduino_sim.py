@@ -0,0 +1,971 @@
+'''
+Description: Software stand-in for the kit's Arduinos. Each simulated board
+runs the command loop of its firmware (ArduinoQuantum.ino, ArduinoClassical.ino,
+ArduinoEve.ino) in a thread, and the boards are connected by a model of the
+optical (quantum) channel and of the IR (classical) channel:
+  - quantum channel: Malus' law with a finite visibility, attenuation, ADC
+    background and noise, the zero angle of every polariser mount, and an
+    optional Eve (a tap on the beam and/or intercept-resend),
+  - classical channel: 4 byte IR packets between the Classical Arduinos
+    (including Eve's), with an optional packet loss.
+The serial ports can be pseudo terminals (for the unmodified programs) or
+in-process objects that behave like serial.Serial.
+
+Usage: python arduino_sim.py --pty [options], then give the printed serial
+addresses to the programs (e.g. send_32bitQKD.py --cserial /dev/pts/3 ...).
+Pseudo terminals are only available on Linux and macOS. In Python:
+
+        import arduino_sim as sim
+        ports = sim.make_bench(visibility=0.9)  # SimSerial for every board
+        device = serial_transport.SerialTransport(ports['alice_q'])
+
+By default everything runs at full speed (--time-scale 0), which is fine for
+programs that wait for the replies (e.g. qkd_orchestrator.py). Programs that
+synchronise with fixed sleeps (e.g. send_32bitQKD.py / recv_32bitQKD.py) need
+the timing of the real firmware: use --time-scale 1 (a 16 bit round takes
+about 5 s).
+
+Options: python arduino_sim.py [-h]
+
+        -h, --help            show this help message and exit
+        --pty                 Opens a pseudo terminal for every board and prints its address
+        --visibility V        Sets the polarisation visibility (default 0.95)
+        --power P             Sets the detector reading for the full beam, in ADC counts (default 800)
+        --background B        Sets the detector reading without light (default 20)
+        --noise N             Sets the detector noise, in ADC counts (default 5)
+        --loss L              Sets the fraction of light lost between Alice and Bob (default 0)
+        --eve-tap T           Sets the fraction of light going to Eve's detectors (default 0)
+        --eve-intercept       Eve measures every pulse and sends her result to Bob
+        --ir-loss L           Sets the fraction of IR packets lost (default 0)
+        --zero ALICE BOB      Sets the zero angle of Alice's and Bob's polariser mounts (default 0 0)
+        --time-scale S        Scales the firmware timing, 0 is full speed (default 0)
+        --seed SEED           Seeds the random numbers (for reproducible runs)
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import os
+import sys
+import math
+import time
+import random
+import argparse # For running the script with options
+import itertools
+import threading
+import serial
+
+# Firmware timing (in s), see ArduinoQuantum.ino and ArduinoClassical.ino
+seqLength = 16          # Polarisation sequence length (16 bit)
+seqStepTime = 0.3       # Time between each steps
+seqSyncBlink = 0.3      # Sync pulse (ON, then OFF)
+seqReadTime = 0.15      # Time in a step when the receiver reads the photodiode
+seqInitTarget = 1       # Initialisation polarisation for seq (D)
+serialTimeout = 0.1     # Serial.setTimeout
+streamFrameTime = 3 * 10 / 38400    # One STREAM frame (3 bytes) on the serial line
+quantumFrameTime = 2 * 10 / 38400   # One STREAM frame of ArduinoQuantum.ino (2 bytes)
+streamBatchTime = 0.01  # STREAM frames are sent in batches of this duration
+motorSpeed = 180        # Motor speed (in deg/s)
+irPacketTime = 0.075    # One NEC packet + gap
+blinkTime = 1.0         # SBLINK / RBLINK parameters
+blinkNum = 20
+blinkObTime = 10.0
+blinkRsTime = 0.2
+
+''' Channels '''
+
+frame_ids = itertools.count(1)
+
+class Frame(object):
+    # One TXSEQ transmission on the quantum channel
+
+    def __init__(self, angles, sync_angle, time_scale):
+        self.id = next(frame_ids)
+        self.start = time.monotonic()
+        self.angles = angles            # Physical polarisation of every pulse
+        self.sync_angle = sync_angle    # Physical polarisation of the sync pulse
+        self.time_scale = time_scale
+
+    def pulseTime(self, i):
+        # Start of pulse i, relative to the start of the frame (unscaled)
+        return 2 * seqSyncBlink + i * seqStepTime
+
+    def duration(self):
+        return self.time_scale * self.pulseTime(seqLength)
+
+    def readDone(self):
+        # The receiver has read the last pulse (before the sender is done)
+        return self.start + self.time_scale * (self.pulseTime(seqLength - 1) + seqReadTime)
+
+    def angleAt(self, t):
+        # Polarisation of the light at time t (None when dark)
+        if self.time_scale <= 0:
+            return None
+        t = (t - self.start) / self.time_scale
+        if 0 <= t < seqSyncBlink:
+            return self.sync_angle
+        i = int((t - 2 * seqSyncBlink) // seqStepTime)
+        if t >= 2 * seqSyncBlink and i < seqLength:
+            return self.angles[i]
+        return None
+
+class OpticalChannel(object):
+    # Free space link from Alice's laser to Bob's (and Eve's) photodiodes.
+    # Angles are physical polarisation angles (in degrees), i.e. the motor
+    # angle minus the zero angle of the mount.
+
+    def __init__(self, visibility=0.95, power=800, background=20, noise=5, loss=0.0,
+                 eve_tap=0.0, eve_intercept=False, sync_window=0.3, rng=None):
+        self.visibility = visibility
+        self.power = power
+        self.background = background
+        self.noise = noise
+        self.loss = loss
+        self.eve_tap = eve_tap
+        self.eve_intercept = eve_intercept
+        self.sync_window = sync_window  # A receiver catches a frame until its sync pulse is over (in s)
+        self.rng = rng if rng is not None else random.Random()
+        self.alice = None
+        self.frames = []
+        self._cond = threading.Condition()
+
+    def malus(self, pol, analyser):
+        # Transmission through an analyser, with a finite visibility
+        return self.visibility * math.cos(math.radians(pol - analyser)) ** 2 + (1 - self.visibility) / 2
+
+    def adc(self, level):
+        # Photodiode reading (analogRead, 0 - 1023)
+        reading = level + self.background + self.rng.gauss(0, self.noise)
+        return int(min(1023, max(0, round(reading))))
+
+    def angleAt(self, t):
+        # Polarisation of Alice's light at time t (None when dark)
+        if self.alice is None:
+            return None
+        if self.alice.laser:
+            return self.alice.physicalAngle()
+        with self._cond:
+            frames = list(self.frames)
+        for frame in reversed(frames):
+            angle = frame.angleAt(t)
+            if angle is not None:
+                return angle
+        return None
+
+    def bobReading(self, analyser, t=None):
+        # Bob's photodiode behind his polariser (VOLT?, CATCH)
+        angle = self.angleAt(time.monotonic() if t is None else t)
+        if angle is None:
+            return self.adc(0)
+        return self.adc(self.power * (1 - self.loss) * (1 - self.eve_tap) * self.malus(angle, analyser))
+
+    def eveReading(self, analyser, t=None):
+        # One of Eve's photodiodes (each one gets half of the tapped light)
+        angle = self.angleAt(time.monotonic() if t is None else t)
+        if angle is None or (self.eve_tap <= 0 and not self.eve_intercept):
+            return self.adc(0)
+        share = 0.5 if self.eve_intercept else self.eve_tap / 2
+        return self.adc(self.power * share * self.malus(angle, analyser))
+
+    def transmit(self, angles, sync_angle, time_scale):
+        # Alice starts a TXSEQ frame
+        frame = Frame(angles, sync_angle, time_scale)
+        with self._cond:
+            self.frames = self.frames[-3:] + [frame]
+            self._cond.notify_all()
+        return frame
+
+    def catchFrame(self, since, last_id, closing):
+        # Bob waits for the sync pulse of a frame (lasCatch in RXSEQ)
+        with self._cond:
+            while not closing():
+                for frame in self.frames:
+                    if frame.id > last_id and frame.start + max(self.sync_window, frame.time_scale * seqSyncBlink) >= since:
+                        return frame
+                self._cond.wait(0.1)
+        return None
+
+    def measureFrame(self, frame, analysers):
+        # Bob's readings for every pulse of a frame (RXSEQ)
+        values = []
+        for angle, analyser in zip(frame.angles, analysers):
+            level = self.power * (1 - self.loss)
+            if self.eve_intercept:
+                # Eve measures in a random basis and sends what she found
+                basis = 45 * self.rng.randrange(2)
+                found = self.rng.random() < self.malus(angle, basis)
+                angle = basis if found else basis + 90
+            else:
+                level *= 1 - self.eve_tap
+            values.append(self.adc(level * self.malus(angle, analyser)))
+        return values
+
+class IRChannel(object):
+    # IR link between the Classical Arduinos (everyone hears every packet)
+
+    def __init__(self, loss=0.0, rng=None):
+        self.loss = loss
+        self.rng = rng if rng is not None else random.Random()
+        self.listeners = set()
+        self.leds = set()   # Boards with their IR LED on
+        self._lock = threading.Lock()
+
+    def listen(self, device):
+        with self._lock:
+            self.listeners.add(device)
+
+    def unlisten(self, device):
+        with self._lock:
+            self.listeners.discard(device)
+
+    def send(self, sender, value):
+        with self._lock:
+            listeners = [dev for dev in self.listeners if dev is not sender]
+        for dev in listeners:
+            if self.rng.random() >= self.loss:
+                dev.deliver(value)
+
+''' Simulated boards '''
+
+class SimDevice(object):
+    # Firmware loop of one board, fed through feed() and answering through the host callback
+
+    idn = None
+    unknown = "Unknown command\r\n"
+
+    def __init__(self, name, time_scale=0.0):
+        self.name = name
+        self.time_scale = time_scale
+        self.start = time.monotonic()
+        self._in = bytearray()
+        self._cond = threading.Condition()
+        self._host = None
+        self._closing = False
+        # self.commands (command name -> method) is set by the subclass
+        self._thread = threading.Thread(target=self.loop, daemon=True)
+        self._thread.start()
+
+    # Host side
+
+    def connect(self, host):
+        # host(data) receives everything the board prints
+        with self._cond:
+            self._host = host
+            self._in.clear()
+
+    def disconnect(self, host):
+        with self._cond:
+            if self._host is host:
+                self._host = None
+
+    def feed(self, data):
+        with self._cond:
+            self._in += data
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+
+    # Arduino side (Serial, millis, delay)
+
+    def closing(self):
+        return self._closing
+
+    def millis(self):
+        return int((time.monotonic() - self.start) * 1000)
+
+    def delay(self, seconds):
+        # Firmware delay, scaled (interrupted when the board is closed)
+        if self.time_scale > 0 and seconds > 0:
+            self.waitUntil(time.monotonic() + seconds * self.time_scale)
+
+    def waitUntil(self, t):
+        # Waits until time.monotonic() reaches t
+        remaining = t - time.monotonic()
+        if remaining > 0:
+            with self._cond:
+                self._cond.wait_for(self.closing, remaining)
+
+    def write(self, data):
+        # Serial.write (raw bytes)
+        with self._cond:
+            host = self._host
+        if host is not None:
+            host(bytes(data))
+
+    def print(self, text):
+        self.write(str(text).encode())
+
+    def println(self, text):
+        self.print(str(text) + "\r\n")
+
+    def waitAvailable(self):
+        # while (!Serial.available());
+        with self._cond:
+            self._cond.wait_for(lambda: self._in or self._closing)
+            return not self._closing
+
+    def readByte(self):
+        # Serial.read() (-1 if nothing there)
+        with self._cond:
+            if not self._in:
+                return -1
+            b = self._in[0]
+            del self._in[0]
+            return b
+
+    def readBytes(self, length):
+        # Serial.readBytes, with the serial timeout between the bytes
+        data = bytearray()
+        with self._cond:
+            while len(data) < length:
+                if not self._cond.wait_for(lambda: self._in or self._closing, serialTimeout) or self._closing:
+                    break
+                data.append(self._in[0])
+                del self._in[0]
+        return bytes(data)
+
+    def readBytesUntil(self, terminator=' ', length=15):
+        # Serial.readBytesUntil (the terminator is dropped)
+        data = bytearray()
+        with self._cond:
+            while len(data) < length:
+                if not self._cond.wait_for(lambda: self._in or self._closing, serialTimeout) or self._closing:
+                    break
+                b = self._in[0]
+                del self._in[0]
+                if b == ord(terminator):
+                    break
+                data.append(b)
+        return data.decode(errors='replace')
+
+    def readValue(self):
+        # Listen again for the value of a command (e.g. SETANG X)
+        self.waitAvailable()
+        return self.readBytesUntil(' ', 15)
+
+    def loop(self):
+        while self.waitAvailable():
+            serbuf = self.readBytesUntil(' ', 15)
+            command = self.commands.get(serbuf.upper()) # strcasecmp
+            if command is None:
+                self.print(self.unknown)
+            else:
+                command()
+
+    @staticmethod
+    def atoi(text):
+        digits = ""
+        for c in text.strip():
+            if c.isdigit() or (c in "+-" and not digits):
+                digits += c
+            else:
+                break
+        try:
+            return int(digits)
+        except ValueError:
+            return 0
+
+    @staticmethod
+    def formatFloat(value):
+        # Serial.println(float) prints 2 decimals
+        return f"{value:.2f}"
+
+class PolarizerMotor(object):
+    # Motor with a polariser, mounted with its zero at zero_angle
+
+    def __init__(self, device, zero_angle=0.0):
+        self.device = device
+        self.zero_angle = zero_angle
+        self.angle = 0.0
+
+    def moveTo(self, target):
+        # gotoAngle / approachAngle: moves and waits for the motor
+        self.device.delay(abs(target - self.angle) / motorSpeed)
+        self.angle = float(target)
+
+    def readAngle(self):
+        return int(round(self.angle)) % 360
+
+    def physicalAngle(self):
+        return self.angle - self.zero_angle
+
+class SimQuantum(SimDevice):
+    # ArduinoQuantum.ino (Alice or Bob)
+
+    idn = "Quantum"
+
+    def __init__(self, name, channel, zero_angle=0.0, time_scale=0.0, rng=None):
+        self.channel = channel
+        self.rng = rng if rng is not None else random.Random()
+        self.motor = PolarizerMotor(self, zero_angle)
+        self.eeprom = {'angleTarget': 0, 'polOffset': 0}
+        self.polSeq = [0] * seqLength
+        self.catchTh = 200
+        self.laser = False
+        self.last_frame = 0
+        self.commands = {
+            'HELP': self.help, 'SETANG': self.setAng, 'ANG?': self.ang, 'SETPOL': self.setPol,
+            'POL?': self.pol, 'SETHOF': self.setHof, 'HOF?': self.hof, 'POLSEQ': self.polSeqCmd,
+            'RNDSEQ': self.rndSeq, 'RNDBAS': self.rndBas, 'SEQ?': self.seq, 'LASON': self.lasOn,
+            'LASOFF': self.lasOff, 'VOLT?': self.volt, 'RUNSEQ': self.runSeq, 'TXSEQ': self.txSeq,
+            'RXSEQ': self.rxSeq, 'CATCH': self.catch, 'TH?': self.th, 'SETTH': self.setTh,
+            '*IDN?': self.idnCmd, 'SCAN': self.scan, 'STOP': self.stop, 'STREAM': self.stream}
+        SimDevice.__init__(self, name, time_scale)
+
+    def physicalAngle(self):
+        return self.motor.physicalAngle()
+
+    def moveStepper(self):
+        self.motor.moveTo(self.eeprom['angleTarget'])
+
+    def polToSeq(self, polSeqMod):
+        # Rotate at most 90 degrees between steps (see polToSeq in the firmware)
+        fold = 0
+        for i in range(seqLength):
+            self.polSeq[i] = polSeqMod[i] + 4 * fold
+            if i < seqLength - 1:
+                if polSeqMod[i] == 3 and polSeqMod[i+1] == 0:
+                    fold += 1
+                if polSeqMod[i] == 0 and polSeqMod[i+1] == 3:
+                    fold -= 1
+
+    def help(self):
+        self.print("Quantum Key Construction\nHELP        \t    Print help statement\n"
+                   "SETANG X    \t    Set angle to X (in degrees)\nANG?        \t    Ask for current angle\n"
+                   "SETPOL X    \t    Set polarisation to X -> 0(H), 1(D), 2(V), 3(A)\n"
+                   "POL?        \t    Ask for current polarisation\nSETHOF X    \t    Set angle offset for H polarisation\n"
+                   "HOF?        \t    Ask for the angle offset for H polarisation\nPOLSEQ X..  \t    Set polarisation sequence as X..\n"
+                   "RNDSEQ      \t    Set random polarisation sequence\nRNDBAS      \t    Set random polarisation basis\n"
+                   "SEQ?        \t    Ask for sequence\nLASON       \t    Turn on laser\nLASOFF      \t    Turn off laser\n"
+                   "VOLT?       \t    Ask for sensor voltage\nRUNSEQ      \t    Run the sequence (generic)\n"
+                   "TXSEQ       \t    Run the sequence (as a sender)\nRXSEQ       \t    Run the sequence (as a receiver)\n"
+                   "CATCH       \t    Wait for laser light and display time\nTH?         \t    Gets detector threshold for CATCH - 200=1V\n"
+                   "SETTH X     \t    Set laser detection threshold (0-1023) - 200=1V\n"
+                   "*IDN?       \t    Gets device name (Quantum/Classical)\n"
+                   "SCAN X Y Z  \t    Scan the angle from X to Y in steps of Z, print angle and voltage\n"
+                   "STREAM X    \t    Stream the sensor readings every X ms (0: as fast as possible)\n"
+                   "STOP        \t    Stop the scan or the stream (any command does)\n")
+
+    def setAng(self):
+        self.eeprom['angleTarget'] = self.atoi(self.readValue())
+        self.moveStepper()
+        self.println("OK")
+
+    def ang(self):
+        self.println(self.motor.readAngle())
+
+    def setPol(self):
+        valbuf = self.readValue()
+        setPolTo = ord(valbuf[0]) - 48 if valbuf else -48 # Only the first char
+        if setPolTo < 0 or setPolTo > 3:
+            self.println("Input error detected.")
+            setPolTo = 0
+        self.eeprom['angleTarget'] = setPolTo * 45 + self.eeprom['polOffset']
+        self.moveStepper()
+        self.println("OK")
+
+    def pol(self):
+        self.println(self.formatFloat((self.eeprom['angleTarget'] - self.eeprom['polOffset']) / 45.))
+
+    def setHof(self):
+        self.eeprom['polOffset'] = self.atoi(self.readValue())
+        self.println("OK")
+
+    def hof(self):
+        self.println(self.eeprom['polOffset'])
+
+    def polSeqCmd(self):
+        self.waitAvailable()
+        polseqbuf = self.readBytesUntil(' ', seqLength).ljust(seqLength, '\0')
+        polSeqMod = []
+        for c in polseqbuf:
+            polnow = ord(c) - 48
+            if polnow == -48:   # Nulls are zeros
+                polnow = 0
+            if polnow < 0 or polnow > 3:
+                self.println("Input error detected.")
+                polnow = 0
+            polSeqMod.append(polnow)
+        self.polToSeq(polSeqMod)
+        self.println("OK")
+
+    def rndSeq(self):
+        self.polToSeq([self.rng.randrange(4) for i in range(seqLength)])
+        self.println("OK")
+
+    def rndBas(self):
+        self.polToSeq([self.rng.randrange(2) for i in range(seqLength)])
+        self.println("OK")
+
+    def seq(self):
+        self.print("".join([str(p % 4) for p in self.polSeq]) + "\n")
+
+    def lasOn(self):
+        self.laser = True
+        self.println("LASER ON!")
+
+    def lasOff(self):
+        self.laser = False
+        self.println("LASER OFF!")
+
+    def reading(self):
+        if self.channel.alice is self:
+            return self.channel.adc(0)   # Alice's photodiode sees no light
+        return self.channel.bobReading(self.physicalAngle())
+
+    def volt(self):
+        self.println(self.reading())
+
+    def seqAngles(self):
+        return [p * 45 + self.eeprom['polOffset'] - self.motor.zero_angle for p in self.polSeq]
+
+    def goToInit(self):
+        self.eeprom['angleTarget'] = seqInitTarget * 45 + self.eeprom['polOffset']
+        self.moveStepper()
+
+    def runSequence(self, mode):
+        self.goToInit()
+        if mode == 1:
+            frame = self.channel.transmit(self.seqAngles(), self.physicalAngle(), self.time_scale)
+            self.waitUntil(frame.start + frame.duration())
+        elif mode == 2:
+            frame = self.channel.catchFrame(time.monotonic(), self.last_frame, self.closing)
+            if frame is None:
+                return
+            self.last_frame = frame.id
+            self.waitUntil(frame.readDone())
+            values = self.channel.measureFrame(frame, self.seqAngles())
+        else:
+            self.delay(2 * seqSyncBlink + seqLength * seqStepTime)
+        self.goToInit()
+        if mode == 2:
+            self.print("".join([f"{val} " for val in values]) + "\n")
+
+    def runSeq(self):
+        self.runSequence(0)
+        self.println("OK")
+
+    def txSeq(self):
+        self.runSequence(1)
+        self.println("OK")
+
+    def rxSeq(self):
+        self.runSequence(2)
+
+    def catch(self):
+        # Waits for light above the threshold (polled, as analogRead in lasCatch)
+        while self.reading() < self.catchTh:
+            with self._cond:
+                if self._cond.wait_for(self.closing, 0.005):
+                    return
+        self.print(self.millis())
+        self.println(" ms is when the light triggers.")
+
+    def th(self):
+        self.println(self.catchTh)
+
+    def setTh(self):
+        self.catchTh = self.atoi(self.readValue())
+        self.println("OK")
+
+    def idnCmd(self):
+        self.println(self.idn)
+
+    def scan(self):
+        start = self.atoi(self.readValue())
+        stop = self.atoi(self.readValue())
+        step = abs(self.atoi(self.readValue()))
+        if step == 0:
+            self.println("Input error detected.")
+            step = 1
+        if stop < start:
+            step = -step    # Scanning backwards
+        stopped = False
+        for angle in range(start, stop + (1 if step > 0 else -1), step):
+            with self._cond:
+                stopped = bool(self._in) or self._closing # Any command stops the scan
+            if stopped:
+                break
+            self.eeprom['angleTarget'] = angle
+            self.moveStepper()
+            self.println(f"{angle} {self.reading()}")
+        if self.closing():
+            return
+        if stopped:
+            self.readBytesUntil(' ', 15) # The command that stopped the scan (e.g. STOP)
+        self.println("OK")
+
+    def stream(self):
+        interval = self.atoi(self.readValue())
+        self.println("OK")
+        # The frames are paced by the serial line, also at full speed (time scale 0)
+        period = max(interval / 1000, quantumFrameTime) * (self.time_scale if self.time_scale > 0 else 1)
+        next_t = time.monotonic()
+        while not self.closing():
+            with self._cond:
+                if self._in:
+                    break   # Any command stops the stream
+            now = time.monotonic()
+            frames = bytearray()
+            while next_t <= now:
+                value = self.reading()
+                frames += bytes([0x80 | (value >> 3), value & 0x07])
+                next_t += period
+            self.write(frames)
+            self.waitUntil(now + streamBatchTime)
+        if self.closing():
+            return
+        self.readBytesUntil(' ', 15) # The command that stopped the stream (e.g. STOP)
+        self.println("OK")
+
+    def stop(self):
+        self.println("OK") # Not scanning or streaming, nothing to stop
+
+class SimEve(SimDevice):
+    # ArduinoEve.ino (two motors with polarisers in front of two photodiodes)
+
+    idn = "QuantumEve"
+
+    def __init__(self, name, channel, zero_angles=(0.0, 0.0), time_scale=0.0):
+        self.channel = channel
+        self.motors = [PolarizerMotor(self, zero_angles[0]), PolarizerMotor(self, zero_angles[1])]
+        self.eeprom = {'angleTarget1': 0, 'angleTarget2': 0, 'polOffset1': 0, 'polOffset2': 0}
+        self.commands = {
+            'HELP': self.help, 'SETANG1': lambda: self.setAng(1), 'ANG1?': lambda: self.ang(1),
+            'SETPOL1': lambda: self.setPol(1), 'POL1?': lambda: self.pol(1), 'VOLTS?': self.volts,
+            'SETANG2': lambda: self.setAng(2), 'ANG2?': lambda: self.ang(2),
+            'SETPOL2': lambda: self.setPol(2), 'POL2?': lambda: self.pol(2), '*IDN?': self.idnCmd,
+            'HOF1?': lambda: self.hof(1), 'SETHOF1': lambda: self.setHof(1),
+            'HOF2?': lambda: self.hof(1), # Reads offset 1, as in the firmware
+            'SETHOF2': lambda: self.setHof(2), 'STREAM': self.stream, 'STOP': self.stop}
+        SimDevice.__init__(self, name, time_scale)
+
+    def help(self):
+        self.print("Quantum Key Construction\nHELP        \t    Print help statement\n"
+                   "SETANG1 X    \t    Set angle to X (in degrees)\nANG1?        \t    Ask for current angle\n"
+                   "SETPOL1 X    \t    Set polarisation to X -> 0(H), 1(D), 2(V), 3(A)\n"
+                   "POL1?        \t    Ask for current polarisation\nVOLTS?       \t    Ask for sensor voltage\n"
+                   "SETANG2 X    \t    Set angle to X (in degrees)\nANG2?        \t    Ask for current angle\n"
+                   "SETPOL2 X    \t    Set polarisation to X -> 0(H), 1(D), 2(V), 3(A)\n"
+                   "POL2?        \t    Ask for current polarisation\nVOLT2?       \t   (Deprecated) Ask for sensor voltage\n"
+                   "*IDN?       \t    Gets device name (Quantum/Classical)\n"
+                   "STREAM X     \t    Stream both sensor readings every X ms (0: as fast as possible)\n"
+                   "STOP         \t    Stop the stream (any command does)\n")
+
+    def setAng(self, n):
+        self.eeprom[f'angleTarget{n}'] = self.atoi(self.readValue())
+        self.motors[n-1].moveTo(self.eeprom[f'angleTarget{n}'])
+        self.println("OK")
+
+    def ang(self, n):
+        self.println(self.motors[n-1].readAngle())
+
+    def setPol(self, n):
+        valbuf = self.readValue()
+        setPolTo = ord(valbuf[0]) - 48 if valbuf else -48
+        if setPolTo < 0 or setPolTo > 3:
+            self.println("Input error detected.")
+            setPolTo = 0
+        self.eeprom[f'angleTarget{n}'] = setPolTo * 45 + self.eeprom[f'polOffset{n}']
+        self.motors[n-1].moveTo(self.eeprom[f'angleTarget{n}'])
+        self.println("OK")
+
+    def pol(self, n):
+        self.println(self.formatFloat((self.eeprom[f'angleTarget{n}'] - self.eeprom[f'polOffset{n}']) / 45.))
+
+    def volts(self):
+        t = time.monotonic()
+        self.println(self.channel.eveReading(self.motors[0].physicalAngle(), t))
+        self.println(self.channel.eveReading(self.motors[1].physicalAngle(), t))
+
+    def stream(self):
+        interval = self.atoi(self.readValue())
+        self.println("OK")
+        # The frames are paced by the serial line, also at full speed (time scale 0)
+        period = max(interval / 1000, streamFrameTime) * (self.time_scale if self.time_scale > 0 else 1)
+        next_t = time.monotonic()
+        while not self.closing():
+            with self._cond:
+                if self._in:
+                    break   # Any command stops the stream
+            now = time.monotonic()
+            frames = bytearray()
+            while next_t <= now:
+                v1 = self.channel.eveReading(self.motors[0].physicalAngle(), next_t)
+                v2 = self.channel.eveReading(self.motors[1].physicalAngle(), next_t)
+                frames += bytes([0x80 | (v1 >> 3), ((v1 & 0x07) << 4) | (v2 >> 6), v2 & 0x3F])
+                next_t += period
+            self.write(frames)
+            self.waitUntil(now + streamBatchTime)
+        if self.closing():
+            return
+        self.readBytesUntil(' ', 15) # The command that stopped the stream (e.g. STOP)
+        self.println("OK")
+
+    def stop(self):
+        self.println("OK") # Not streaming, nothing to stop
+
+    def hof(self, n):
+        self.println(self.eeprom[f'polOffset{n}'])
+
+    def setHof(self, n):
+        self.eeprom[f'polOffset{n}'] = self.atoi(self.readValue())
+        self.println("OK")
+
+    def idnCmd(self):
+        self.println(self.idn)
+
+class SimClassical(SimDevice):
+    # ArduinoClassical.ino (IR LED and IR receiver)
+
+    idn = "Classical"
+    unknown = "Unknown command\n"
+
+    def __init__(self, name, channel, time_scale=0.0):
+        self.channel = channel
+        self._ir = []
+        self.commands = {
+            'HELP': self.help, 'LEDON': self.ledOn, 'LEDOFF': self.ledOff, 'SBLINK': self.sBlink,
+            'RBLINK': self.rBlink, 'SEND': self.send, 'RECV': self.recv, '*IDN?': self.idnCmd}
+        SimDevice.__init__(self, name, time_scale)
+
+    def deliver(self, value):
+        # An IR packet reaches the receiver
+        with self._cond:
+            self._ir.append(value)
+            self._cond.notify_all()
+
+    def help(self):
+        self.print("Classical Communications Channel\nHELP       Print help statement\n"
+                   "LEDON      Turn on IR LED\nLEDOFF     Turn off IR LED\nSBLINK     Send blinking feature\n"
+                   "RBLINK     Recv blinking feature\nSEND X     Send a short message X (4 bytes)\n"
+                   "RECV       Receive a short message (4 bytes)\n*IDN?      Get device identifier (Classical/Quantum)")
+
+    def ledOn(self):
+        self.channel.leds.add(self)
+        self.println("LED ON!")
+
+    def ledOff(self):
+        self.channel.leds.discard(self)
+        self.println("LED OFF!")
+
+    def sBlink(self):
+        for i in range(blinkNum):
+            self.channel.leds.add(self)
+            self.delay(blinkTime)
+            self.channel.leds.discard(self)
+            self.delay(blinkTime)
+        self.println("Task done.")
+
+    def rBlink(self):
+        timeEnd = time.monotonic() + blinkObTime * self.time_scale
+        while time.monotonic() < timeEnd and not self._closing:
+            if self.channel.leds - {self}:
+                self.println("BLINK!")
+                self.delay(blinkRsTime)
+            else:
+                self.delay(0.01)
+        self.println("Task done.")
+
+    def send(self):
+        self.waitAvailable()
+        strbuf = self.readBytes(4).ljust(4, b'\0')
+        value = 0
+        for i, b in enumerate(strbuf):
+            b = b - 256 if b >= 128 else b # char is signed on the Arduino
+            value |= (b << (24 - 8 * i)) & 0xFFFFFFFF
+        self.delay(irPacketTime)
+        self.channel.send(self, value)
+
+    def recv(self):
+        with self._cond:
+            self._ir.clear()    # IrReceiver.resume()
+        self.channel.listen(self)
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._ir or self._in or self._closing)
+                    if self._closing:
+                        return
+                    if self._ir:
+                        value = self._ir.pop(0)
+                        break
+                    readout = self._in[0]
+                    del self._in[0]
+                if readout == 35: # Escape character is #
+                    self.println("Listening interrupted!")
+                    return
+        finally:
+            self.channel.unlisten(self)
+        self.print(f"{value:X}") # Print HEX characters (no new line)
+
+    def idnCmd(self):
+        self.println(self.idn)
+
+''' Serial ports '''
+
+class SimSerial(object):
+    # In-process serial port connected to a simulated board (like serial.Serial)
+
+    def __init__(self, device, timeout=None):
+        self.device = device
+        self.port = f"sim://{device.name}"
+        self.baudrate = 38400
+        self.timeout = timeout
+        self.is_open = True
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        device.connect(self._receive)
+
+    def _receive(self, data):
+        with self._cond:
+            self._buffer += data
+            self._cond.notify_all()
+
+    def _check(self):
+        if not self.is_open:
+            raise serial.SerialException(f"{self.port} is closed")
+
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def isOpen(self):
+        return self.is_open
+
+    def write(self, data):
+        self._check()
+        self.device.feed(bytes(data))
+        return len(data)
+
+    def read(self, size=1):
+        with self._cond:
+            self._check()
+            self._cond.wait_for(lambda: len(self._buffer) >= size or not self.is_open, self.timeout)
+            self._check()
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def readline(self):
+        with self._cond:
+            self._check()
+            self._cond.wait_for(lambda: b'\n' in self._buffer or not self.is_open, self.timeout)
+            self._check()
+            end = self._buffer.index(b'\n') + 1 if b'\n' in self._buffer else len(self._buffer)
+            line = bytes(self._buffer[:end])
+            del self._buffer[:end]
+        return line
+
+    def readlines(self):
+        lines = []
+        while True:
+            line = self.readline()
+            if not line:
+                return lines
+            lines.append(line)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._buffer.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+        self.device.disconnect(self._receive)
+
+class PtyPort(object):
+    # Pseudo terminal connected to a simulated board (Linux and macOS)
+
+    def __init__(self, device):
+        import pty, tty
+        self.device = device
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        device.connect(lambda data: os.write(self.master, data))
+        self._thread = threading.Thread(target=self._forward, daemon=True)
+        self._thread.start()
+
+    def _forward(self):
+        while True:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                return
+            if data:
+                self.device.feed(data)
+
+''' Bench '''
+
+def make_devices(visibility=0.95, power=800, background=20, noise=5, loss=0.0, eve_tap=0.0,
+                 eve_intercept=False, ir_loss=0.0, zero=(0.0, 0.0), time_scale=0.0, seed=None):
+    """
+    Builds the boards of a bench (Alice, Bob and Eve), connected by the
+    optical and IR channels. Returns a dict of boards named like the
+    qkd_orchestrator.py options: alice_c, alice_q, bob_c, bob_q, eve_c, eve_q.
+    """
+    rng = random.Random(seed)
+    optical = OpticalChannel(visibility, power, background, noise, loss, eve_tap, eve_intercept,
+                             rng=random.Random(rng.random()))
+    ir = IRChannel(ir_loss, rng=random.Random(rng.random()))
+    devices = {
+        'alice_c': SimClassical("alice_c", ir, time_scale),
+        'alice_q': SimQuantum("alice_q", optical, zero[0], time_scale, random.Random(rng.random())),
+        'bob_c': SimClassical("bob_c", ir, time_scale),
+        'bob_q': SimQuantum("bob_q", optical, zero[1], time_scale, random.Random(rng.random())),
+        'eve_c': SimClassical("eve_c", ir, time_scale),
+        'eve_q': SimEve("eve_q", optical, time_scale=time_scale)}
+    optical.alice = devices['alice_q']
+    return devices
+
+def make_bench(**kwargs):
+    """Same as make_devices, but returns an open SimSerial for every board"""
+    return {name: SimSerial(device) for name, device in make_devices(**kwargs).items()}
+
+def main():
+    my_parser = argparse.ArgumentParser()
+    my_parser.add_argument('--pty', action='store_true', help='Opens a pseudo terminal for every board and prints its address')
+    my_parser.add_argument('--visibility', action='store', type=float, default=0.95, help='Sets the polarisation visibility (default 0.95)')
+    my_parser.add_argument('--power', action='store', type=float, default=800, help='Sets the detector reading for the full beam, in ADC counts (default 800)')
+    my_parser.add_argument('--background', action='store', type=float, default=20, help='Sets the detector reading without light (default 20)')
+    my_parser.add_argument('--noise', action='store', type=float, default=5, help='Sets the detector noise, in ADC counts (default 5)')
+    my_parser.add_argument('--loss', action='store', type=float, default=0.0, help='Sets the fraction of light lost between Alice and Bob (default 0)')
+    my_parser.add_argument('--eve-tap', action='store', type=float, default=0.0, help="Sets the fraction of light going to Eve's detectors (default 0)")
+    my_parser.add_argument('--eve-intercept', action='store_true', help='Eve measures every pulse and sends her result to Bob')
+    my_parser.add_argument('--ir-loss', action='store', type=float, default=0.0, help='Sets the fraction of IR packets lost (default 0)')
+    my_parser.add_argument('--zero', action='store', type=float, nargs=2, default=[0.0, 0.0], metavar=('ALICE', 'BOB'), help="Sets the zero angle of Alice's and Bob's polariser mounts (default 0 0)")
+    my_parser.add_argument('--time-scale', action='store', type=float, default=0.0, help='Scales the firmware timing, 0 is full speed (default 0)')
+    my_parser.add_argument('--seed', action='store', type=int, help='Seeds the random numbers (for reproducible runs)')
+    args = my_parser.parse_args()
+    if not args.pty:
+        my_parser.error('nothing to do (use --pty to open the serial ports)')
+
+    devices = make_devices(args.visibility, args.power, args.background, args.noise, args.loss,
+                           args.eve_tap, args.eve_intercept, args.ir_loss, tuple(args.zero),
+                           args.time_scale, args.seed)
+    ports = {name: PtyPort(device) for name, device in devices.items()}
+    print("Simulated Arduinos (use Ctrl+C to exit):")
+    for name, port in ports.items():
+        print(f"  {name:8} {devices[name].idn:11} {port.path}")
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print ("\nThank you for using the program!")
+        sys.exit()
+
+if __name__=='__main__':
+    main()
@@ -1,12 +1,9 @@
-import time
-import serial
+import serial_transport as st
 
 porto = 'COM7'
 
-dev = serial.Serial(porto, baudrate=38400, timeout=0.1)
-
 print("Opening the serial port...")
-time.sleep(2) # Ports take longer to fully open on some systems.
+dev = st.open_ready(porto, baudrate=38400, timeout=0.1) # Waits until the Arduino answers *IDN?
 print("Done\n")
 
 # Flushing buffers
@@ -17,11 +14,8 @@ print("Flushed")
 
 dev.write("help ".encode())
 
-while True:
-    if dev.in_waiting:
-        response = dev.readlines()[0].decode().strip().split()[0]
-        print(response)
-        break
+response = dev.read_reply().split()[0]
+print(response)
 
 dev.close()
 print("Finished\n")
@@ -0,0 +1,220 @@
+'''
+Description: Binary capture format for Eve's photodiode readings
+(key_logger.py --binary). Every reading is a fixed width record (time in ms
+since the start, and the two ADC readings as uint16), so a capture can be
+opened with np.memmap instead of being parsed as text. Next to the capture,
+an index file lists where every group of light readings (a pulse) starts and
+stops, so a transmission round can be found without reading the whole file.
+
+    .cap file: 32 byte header (b'QCAPTURE', version, header size, start time)
+               followed by 8 byte records (t: uint32 ms, v1: uint16, v2: uint16)
+    .idx file: 16 byte records (start, stop: uint64), the record numbers of the
+               first reading of a pulse and of the first reading after it
+
+The STREAM command of ArduinoEve.ino sends the readings as 3 byte frames
+(1aaaaaaa 0aaabbbb 00bbbbbb, a and b the two 10 bit readings), decoded in
+bulk by decode_stream.
+
+Usage: Imported by key_logger.py, runInterceptor.py and live_decoder.py (the
+programs/ folder has to be on the import path).
+
+        with CaptureWriter('153012.cap') as capture:
+            capture.append(v1, v2)
+            capture.append_many(v1_array, v2_array, t_array)
+        v1, v2, rest = decode_stream(rest + data)   # Bytes from STREAM
+        records = load('153012.cap')            # np.memmap, records['v1'] ...
+        index = load_index('153012.cap')
+        records = round_records(records, index, 2)   # The third 16 bit round
+        signals = load_signals(filename)        # .cap or .dat, as n x 2 array
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import os
+import time
+import struct
+import pathlib
+import numpy as np
+
+MAGIC = b'QCAPTURE'
+VERSION = 1
+HEADER = struct.Struct('<8sHHd12x')     # Magic, version, header size, start time (s since epoch)
+RECORD = np.dtype([('t', '<u4'), ('v1', '<u2'), ('v2', '<u2')])
+INDEX = np.dtype([('start', '<u8'), ('stop', '<u8')])
+FLUSH_EVERY = 20        # Records written before the file is flushed (for live readers)
+FRAME_PULSES = 17       # Sync pulse + 16 bit sequence
+STREAM_FRAME = 3        # Bytes per reading pair sent by STREAM
+LIGHT_LEVEL = 50        # Readings above this are light (in ADC counts, above the dark level of the photodiodes)
+
+def index_path(path):
+    """Path of the index file that goes with a capture"""
+    return str(pathlib.Path(path).with_suffix('.idx'))
+
+class CaptureWriter(object):
+    # Appends readings to a capture (and its index) through one open file
+
+    def __init__(self, path, threshold=LIGHT_LEVEL, start_time=None):
+        # Readings above threshold are light (part of a pulse)
+        self.path = path
+        self.threshold = threshold
+        self.start_time = time.time() if start_time is None else start_time
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, HEADER.size, self.start_time))
+        self.file.flush()   # Readers can open the capture right away
+        self.index = open(index_path(path), 'wb')
+        self.count = 0          # Records written
+        self.pulse_start = None # Record number of the first reading of the current pulse
+
+    def append(self, v1, v2, t=None):
+        """Writes one reading (t in s since the epoch, now by default)"""
+        t = time.time() if t is None else t
+        ms = max(0, int(round((t - self.start_time) * 1000)))
+        self.file.write(struct.pack('<IHH', ms, v1, v2))
+        # Pulse boundaries for the index
+        light = v1 > self.threshold or v2 > self.threshold
+        if light and self.pulse_start is None:
+            self.pulse_start = self.count
+        elif not light and self.pulse_start is not None:
+            self.index.write(struct.pack('<QQ', self.pulse_start, self.count))
+            self.pulse_start = None
+        self.count += 1
+        if self.count % FLUSH_EVERY == 0:
+            self.flush()
+
+    def append_many(self, v1, v2, t=None):
+        """Writes an array of readings (t: array or single time, in s since the epoch)"""
+        v1 = np.asarray(v1, dtype=np.uint16)
+        v2 = np.asarray(v2, dtype=np.uint16)
+        if len(v1) == 0:
+            return
+        t = time.time() if t is None else t
+        records = np.zeros(len(v1), dtype=RECORD)
+        records['t'] = np.maximum(0, np.round((np.asarray(t) - self.start_time) * 1000))
+        records['v1'] = v1
+        records['v2'] = v2
+        self.file.write(records.tobytes())
+        # Pulse boundaries for the index, continuing the pulse of the previous call
+        light = (v1 > self.threshold) | (v2 > self.threshold)
+        edges = np.diff(np.concatenate(([self.pulse_start is not None], light)).astype(np.int8))
+        starts = np.flatnonzero(edges == 1) + self.count
+        stops = np.flatnonzero(edges == -1) + self.count
+        if self.pulse_start is not None:
+            starts = np.concatenate(([self.pulse_start], starts))
+        index = np.zeros(len(stops), dtype=INDEX)
+        index['start'] = starts[:len(stops)]
+        index['stop'] = stops
+        self.index.write(index.tobytes())
+        self.pulse_start = int(starts[-1]) if len(starts) > len(stops) else None
+        self.count += len(v1)
+        self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+
+    def close(self):
+        if self.pulse_start is not None:
+            self.index.write(struct.pack('<QQ', self.pulse_start, self.count))
+            self.pulse_start = None
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_header(path):
+    """Returns the version and the start time of a capture"""
+    with open(path, 'rb') as f:
+        magic, version, size, start_time = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a capture file")
+    return {'version': version, 'header_size': size, 'start_time': start_time}
+
+def load(path):
+    """
+    Maps the records of a capture (read only, nothing is loaded until used).
+    Only whole records are mapped, so a capture that is still being written
+    can be opened.
+    """
+    header = read_header(path)
+    count = (os.path.getsize(path) - header['header_size']) // RECORD.itemsize
+    if count <= 0:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode='r', offset=header['header_size'], shape=(count,))
+
+def build_index(records, threshold=LIGHT_LEVEL):
+    """Pulse boundaries (start, stop) of the records, as written by CaptureWriter"""
+    light = (records['v1'] > threshold) | (records['v2'] > threshold)
+    edges = np.diff(np.concatenate(([0], light.astype(np.int8), [0])))
+    index = np.zeros(np.count_nonzero(edges == 1), dtype=INDEX)
+    index['start'] = np.flatnonzero(edges == 1)
+    index['stop'] = np.flatnonzero(edges == -1)
+    return index
+
+def load_index(path, threshold=LIGHT_LEVEL):
+    """Pulse boundaries of a capture, from its index file (or rebuilt if it is missing)"""
+    if os.path.exists(index_path(path)):
+        return np.fromfile(index_path(path), dtype=INDEX)
+    return build_index(load(path), threshold)
+
+def round_records(records, index, n, frame_pulses=FRAME_PULSES):
+    """
+    Records of the n-th transmission round (sync pulse + 16 pulses), counted
+    from the first pulse of the capture.
+    """
+    pulses = index[n*frame_pulses:(n+1)*frame_pulses]
+    if len(pulses) == 0:
+        return records[:0]
+    return records[int(pulses['start'][0]):int(pulses['stop'][-1])]
+
+def load_signals(path):
+    """The two photodiode readings (n x 2) of a capture, or of a .dat file from the text logger"""
+    if pathlib.Path(path).suffix == '.cap':
+        records = load(path)
+        return np.c_[records['v1'], records['v2']].astype(float)
+    return np.loadtxt(path).reshape(-1, 2)
+
+def decode_stream(data):
+    """
+    Decodes the frames sent by the STREAM command. Returns the readings of
+    both photodiodes (uint16 arrays) and the bytes of an unfinished frame at
+    the end, to be put in front of the next data. Bytes that are not part of a
+    frame (e.g. the OK at the end of the stream) are skipped.
+    """
+    data = np.frombuffer(data, dtype=np.uint8)
+    heads = np.flatnonzero(data & 0x80)
+    rest = b''
+    if len(heads) and heads[-1] + STREAM_FRAME > len(data):
+        rest = data[heads[-1]:].tobytes()
+        heads = heads[:-1]
+    # A frame is a head byte followed by two bytes without the top bit
+    heads = heads[((data[heads + 1] | data[heads + 2]) & 0x80) == 0]
+    a = data[heads].astype(np.uint16)
+    b = data[heads + 1].astype(np.uint16)
+    c = data[heads + 2].astype(np.uint16)
+    v1 = ((a & 0x7F) << 3) | (b >> 4)
+    v2 = ((b & 0x0F) << 6) | c
+    return v1, v2, rest
+
+class CaptureReader(object):
+    # Reads the records added to a capture that is being written (like tail -f)
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.file.seek(read_header(path)['header_size'])
+        self.partial = b''
+
+    def read(self):
+        """Returns the new whole records"""
+        data = self.partial + self.file.read()
+        cut = len(data) - len(data) % RECORD.itemsize
+        self.partial = data[cut:]
+        return np.frombuffer(data[:cut], dtype=RECORD)
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,109 @@
+'''
+Description: Shared key sifting helpers for our BB84 QKD implementation.
+Keys, bases and match masks are handled as bit arrays (NumPy uint8, one bit
+per element, most significant bit first), so any number of 16 bit rounds can
+be matched and sifted in a single call instead of walking '0'/'1' strings.
+
+Usage: Imported by send_32bitQKD.py, recv_32bitQKD.py, qkd_orchestrator.py,
+bb84_montecarlo.py, keysift_hint.py and runInterceptor.py (the programs/
+folder has to be on the import path).
+
+        bits = to_bits('0110')            # from a binary string
+        bits = hex_to_bits('a5f0', 16)    # from a hex string
+        match = match_bases(basA, basB)   # XNOR of the two basis choices
+        key = sift(val, match)            # keep the bits with matched basis
+        res = threshold_bits(volts, 300)  # Bob's readings -> measured bits
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import numpy as np
+
+def to_bits(value, nbits=None):
+    """
+    Converts a key into a bit array. Accepts a binary string ('0'/'1'),
+    an int (needs nbits, negative values wrap around like tohex) or
+    anything array-like holding 0s and 1s.
+    """
+    if isinstance(value, str):
+        bits = np.frombuffer(value.encode(), dtype=np.uint8) - ord('0')
+    elif isinstance(value, (int, np.integer)):
+        if nbits is None:
+            raise ValueError("nbits is needed to convert an int to bits")
+        nbytes = (nbits + 7) // 8
+        value = int(value) % (1 << nbits)
+        packed = np.frombuffer(value.to_bytes(nbytes, 'big'), dtype=np.uint8)
+        bits = np.unpackbits(packed)[8*nbytes - nbits:]
+    else:
+        bits = np.asarray(value, dtype=np.uint8)
+    if np.any(bits > 1):
+        raise ValueError("Key contains values other than 0 and 1")
+    return bits
+
+def hex_to_bits(hex_str, nbits=None):
+    """
+    Converts a hex string into a bit array, nbits wide (4 bits per hex
+    character by default).
+    """
+    if nbits is None:
+        nbits = 4 * len(hex_str)
+    return to_bits(int(hex_str, 16), nbits)
+
+def to_str(bits):
+    """Converts a bit array back into a binary string"""
+    return (np.asarray(bits, dtype=np.uint8) + ord('0')).tobytes().decode()
+
+def bits_to_hex(bits):
+    """
+    Converts a bit array into a zero padded hex string (without 0x),
+    one hex character per 4 bits.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    nbits = len(bits)
+    # Pad in front to full bytes, so that packbits keeps the value right aligned
+    padded = np.concatenate((np.zeros(-nbits % 8, dtype=np.uint8), bits))
+    hex_str = np.packbits(padded).tobytes().hex()
+    return hex_str[len(hex_str) - (nbits + 3) // 4:]
+
+def match_bases(basA, basB):
+    """
+    Compares two basis choices bit by bit (negative of exclusive OR).
+    1 means matched basis, 0 means different basis.
+    """
+    basA = to_bits(basA)
+    basB = to_bits(basB)
+    if len(basA) != len(basB):
+        raise ValueError("Basis choices have different lengths")
+    return basA ^ basB ^ 1
+
+def threshold_bits(values, threshold):
+    """
+    Converts Bob's photodiode readings (RXSEQ) into measured bits:
+    higher than threshold -> 0, lower than (or at) threshold -> 1.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    return (values <= threshold).astype(np.uint8)
+
+def sift(values, match):
+    """Keeps only the value bits where the basis is matched"""
+    values = to_bits(values)
+    match = to_bits(match)
+    if len(values) != len(match):
+        raise ValueError("Key and match mask have different lengths")
+    return values[match.astype(bool)]
+
+def sift_mask_str(values, match):
+    """
+    Returns the matched key bits as a string, with an X for every
+    position where the basis does not match (for printing).
+    """
+    values = to_bits(values)
+    match = to_bits(match)
+    chars = np.where(match.astype(bool), values + ord('0'), ord('X'))
+    return chars.astype(np.uint8).tobytes().decode()
+
+def sift_str(value_str, match_str):
+    """String in, string out version of sift (binary strings)"""
+    return to_str(sift(value_str, match_str))
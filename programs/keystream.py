@@ -0,0 +1,101 @@
+'''
+Description: Key expansion for encrypt.py / decrypt.py. The secure key from
+recv/send_32bitQKD.py seeds the Mersenne Twister PRNG (Python's random), and
+the keystream is XORed with the message. The keystream is generated in large
+blocks instead of one getrandbits(8) call per byte: getrandbits(8) keeps the
+top 8 bits of one 32 bit MT output, so the same bytes are found in every 4th
+byte of getrandbits(32*n). Messages encrypted byte by byte by the earlier
+versions still decrypt.
+
+Usage: Imported by encrypt.py and decrypt.py (the programs/ folder has to be
+on the import path).
+
+        key_int = parse_key('1a2b3c4d')                   # None if it is not 8 hex digits
+        data = crypt(message.encode('latin-1'), key_int)  # Encrypts or decrypts
+        crypt_stream(fin, fout, key_int)                  # Files of any size, in chunks
+        crypt_stream(fin, fout, key_int, hex_out=True)    # Writes hex text
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import random
+import string
+import numpy as np
+
+CHUNK_SIZE = 1 << 16    # Bytes of keystream generated at once
+KEY_DIGITS = 8          # Hex digits of the 32 bit secure key
+
+class KeyStream(object):
+    # Expanded key, one byte per message byte (same as random.seed(key); random.getrandbits(8) ...)
+
+    def __init__(self, key):
+        # key: int, or hex string (e.g. the 32 bit key from the QKD programs)
+        if isinstance(key, str):
+            key = int(key, 16)
+        self.prng = random.Random(key)
+
+    def read(self, n):
+        """Returns the next n bytes of the keystream"""
+        out = bytearray()
+        while len(out) < n:
+            size = min(n - len(out), CHUNK_SIZE)
+            # One 32 bit MT output per byte, the first one in the lowest bits: keep the top byte of each
+            words = self.prng.getrandbits(32 * size).to_bytes(4 * size, 'little')
+            out += words[3::4]
+        return bytes(out)
+
+    def xor(self, data):
+        """Encrypts (or decrypts) the next len(data) bytes"""
+        data = np.frombuffer(data, dtype=np.uint8)
+        key = np.frombuffer(self.read(len(data)), dtype=np.uint8)
+        return (data ^ key).tobytes()
+
+def parse_key(text):
+    """The secure key (int) from its 8 hex digits, None if text is not a 32 bit hex key"""
+    # Not int(text, 16) alone: it also takes a sign, a 0x prefix, underscores and spaces
+    if len(text) != KEY_DIGITS or not all(c in string.hexdigits for c in text):
+        return None
+    return int(text, 16)
+
+def crypt(data, key):
+    """Encrypts (or decrypts) data (bytes) with a fresh keystream from key"""
+    return KeyStream(key).xor(data)
+
+def hex_chunks(fin, chunk_size=CHUNK_SIZE):
+    """
+    Reads hex text from the binary file object fin and yields it as bytes,
+    about chunk_size bytes at a time (whitespace and line breaks are ignored).
+    """
+    leftover = b''
+    while True:
+        text = fin.read(2 * chunk_size)
+        if not text:
+            break
+        text = leftover + bytes(text).translate(None, b' \t\r\n')
+        cut = len(text) - len(text) % 2  # A byte can be split between two reads
+        leftover = text[cut:]
+        yield bytes.fromhex(text[:cut].decode('ascii'))
+    if leftover:
+        raise ValueError("Odd number of hex digits")
+
+def crypt_stream(fin, fout, key, chunk_size=CHUNK_SIZE, hex_in=False, hex_out=False):
+    """
+    Encrypts (or decrypts) the binary file object fin into fout, chunk_size
+    bytes at a time. hex_in / hex_out read / write hex text instead of raw
+    bytes. Returns the number of bytes encrypted.
+    """
+    stream = KeyStream(key)
+    if hex_in:
+        chunks = hex_chunks(fin, chunk_size)
+    else:
+        chunks = iter(lambda: fin.read(chunk_size), b'')
+    count = 0
+    for chunk in chunks:
+        data = stream.xor(chunk)
+        fout.write(data.hex().encode() if hex_out else data)
+        count += len(chunk)
+    if hex_out and count:
+        fout.write(b'\n')
+    return count
@@ -1,70 +1,33 @@
 '''
-Description: Script to return a list of open serial ports and their Arduino identities using the *IDN? command. If an unknown
-serial device is connected, or does not respond to *IDN?, the script will move on to the next device after 10 tries.
+Description: Script to return a list of open serial ports and their Arduino identities using the *IDN? command. All the ports
+are asked at once, and the identities are remembered (see port_discovery.py), so only new or moved boards are asked again.
+A serial device that does not respond to *IDN? is listed without an identity.
 
 Usage: Run program and wait for it to return the list.
 
+Options:
+
+  -h, --help       show this help message and exit
+  --refresh        Asks every port again, instead of using the remembered identities
+
 Author: JH 2022
 
 Version: 1.0
 '''
 
-import time
-import serial
-import glob
-import sys
-from tqdm import tqdm
+import argparse # For running the script with options
 
-def serial_ports():
-	""" Lists serial port names
+import port_discovery as pd
 
-		:raises EnvironmentError:
-			On unsupported or unknown platforms
-		:returns:
-			A list of the serial ports available on the system
-	"""
-	if sys.platform.startswith('win'):
-		ports = ['COM%s' % (i + 1) for i in range(256)]
-	elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-		# this excludes your current terminal "/dev/tty"
-		ports = glob.glob('/dev/tty[A-Za-z]*')
-	elif sys.platform.startswith('darwin'):
-		ports = glob.glob('/dev/tty.*')
-	else:
-		raise EnvironmentError('Unsupported platform')
+my_parser = argparse.ArgumentParser()
+my_parser.add_argument('--refresh', action='store_true', help='Asks every port again, instead of using the remembered identities')
+args = my_parser.parse_args()
 
-	result = []
-	for port in ports:
-		try:
-			s = serial.Serial(port)
-			s.close()
-			result.append(port)
-		except (OSError, serial.SerialException):
-			pass
-	return result
-
-ports = serial_ports()
-print(f'The open ports are: {ports}')
+ports = pd.list_ports()
+print(f'The open ports are: {[port.device for port in ports]}')
 print('Identifying ports, please wait...')
 
-for index, port in enumerate(ports):
-    try:
-        # Adds Classical/Quantum identifier based on HELP text
-        dev = serial.Serial(port, baudrate=38400, timeout=0.1)
-        time.sleep(2) # Time for arduino ports to fully open
-        dev.reset_input_buffer()
-        dev.reset_output_buffer()
-        dev.write("*IDN? ".encode())
-        for i in tqdm(range(10)):
-            if dev.in_waiting:
-                response = dev.readlines()[0].decode().strip()
-                ports[index] += " (" + response + ")"
-                break
-            time.sleep(0.05)
-        dev.close()
-    except:
-        pass
+ports = pd.port_labels(ports, refresh=vars(args).get('refresh'))
 
 print('Ports identified!')
 print(ports)
-
@@ -0,0 +1,112 @@
+'''
+Description: Finds the kit's Arduinos on the serial ports. The ports are
+listed with pyserial (only the ports that exist, instead of trying COM1 -
+COM256), and the unknown ones are asked for their identity (*IDN?) all at
+once in a pool of threads. Every Arduino resets when its port is opened, so
+each probe keeps asking until the board has booted (serial_transport.open_ready),
+instead of a fixed 2 s sleep per board. The identities are cached in a JSON file, keyed on the USB
+VID:PID and serial number of the board: a board already known on the same
+port is not opened again, so the GUIs start without waiting.
+
+Usage: Imported by list_arduinos.py, runReceiver.py and runSender.py (the
+programs/ folder has to be on the import path).
+
+        ports = discover()            # [(port, identity or None), ...]
+        labels = port_labels()        # ['/dev/ttyACM0 (QuantumEve)', ...]
+        ports = discover(refresh=True)  # Probe every port again
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import os
+import sys
+import json
+import pathlib
+import concurrent.futures
+import serial
+import serial.tools.list_ports
+
+import serial_transport as st
+
+CACHE_FILE = os.path.join(str(pathlib.Path.home()), '.qcumber_ports.json')
+BAUDRATE = 38400        # Default in Arduino
+PROBE_TIMEOUT = 4       # Time given to a board to boot and reply (in s)
+MAX_WORKERS = 16        # Ports probed at the same time
+
+def list_ports():
+    """The serial ports of the system, as pyserial ListPortInfo (device, vid, pid, serial_number ...)"""
+    ports = serial.tools.list_ports.comports()
+    if sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
+        # The built-in serial ports (/dev/ttyS*) are never Arduinos
+        ports = [p for p in ports if p.vid is not None or not p.device.startswith('/dev/ttyS')]
+    return sorted(ports, key=lambda p: p.device)
+
+def port_key(port):
+    """Cache key of a port: the USB identity of the board (the port name without one)"""
+    if getattr(port, 'vid', None) is not None:
+        return f"{port.vid:04X}:{port.pid:04X}:{port.serial_number or ''}"
+    return getattr(port, 'device', port)
+
+def probe(device, timeout=PROBE_TIMEOUT):
+    """Asks the board on device for its identity (*IDN?). Returns None if it does not reply."""
+    try:
+        board = st.open_ready(device, BAUDRATE, timeout=0.1, ready_timeout=timeout)
+    except (OSError, ValueError, serial.SerialException):
+        return None # Busy, not an Arduino, or no reply
+    board.close()
+    return board.identity
+
+def load_cache(cache_file=CACHE_FILE):
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache, cache_file=CACHE_FILE):
+    try:
+        with open(cache_file, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except OSError:
+        pass # The cache only saves time
+
+def discover(ports=None, refresh=False, cache_file=CACHE_FILE, timeout=PROBE_TIMEOUT):
+    """
+    Returns [(port, identity)] for every serial port (identity is None when
+    the device does not reply). ports: port names or ListPortInfo (all the
+    ports of the system by default). Only the ports that are not in the cache
+    (or moved) are probed, every one of them with refresh.
+    """
+    ports = list_ports() if ports is None else ports
+    cache = {} if cache_file is None else load_cache(cache_file)
+    identities = {}
+    unknown = []
+    for port in ports:
+        device = getattr(port, 'device', port)
+        entry = cache.get(port_key(port))
+        if not refresh and entry is not None and entry.get('port') == device:
+            identities[device] = entry.get('identity')
+        else:
+            unknown.append(port)
+
+    if unknown:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(unknown))) as pool:
+            replies = pool.map(lambda p: probe(getattr(p, 'device', p), timeout), unknown)
+            for port, identity in zip(unknown, replies):
+                device = getattr(port, 'device', port)
+                identities[device] = identity
+                if identity is not None:
+                    cache[port_key(port)] = {'port': device, 'identity': identity}
+                else:
+                    cache.pop(port_key(port), None) # Busy, or not an Arduino: asked again next time
+        if cache_file is not None:
+            save_cache(cache, cache_file)
+
+    return [(getattr(p, 'device', p), identities[getattr(p, 'device', p)]) for p in ports]
+
+def port_labels(ports=None, refresh=False, cache_file=CACHE_FILE):
+    """Port names with the identity of the board, e.g. '/dev/ttyACM0 (QuantumEve)'"""
+    return [device if identity is None else f"{device} ({identity})"
+            for device, identity in discover(ports, refresh, cache_file)]
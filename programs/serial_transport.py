@@ -0,0 +1,188 @@
+'''
+Description: Serial port wrapper with a background reader thread. Incoming
+bytes are collected by the thread, and the program blocks on a condition
+variable (instead of polling `in_waiting` in a loop) until a reply is there
+or its deadline has passed. A dead or hung Arduino raises
+serial.SerialTimeoutException instead of spinning forever.
+
+Usage: Imported by the Python wrappers (the programs/ folder has to be on the
+import path).
+
+        device = SerialTransport(serial_addr)
+        device.write('SEQ? ')
+        reply_str = device.read_reply(timeout=5)    # One line, stripped
+        hex_string = device.read_packet(8)          # Raw bytes (e.g. IR packets)
+
+        device = open_ready(serial_addr)            # Opens and waits until the Arduino replies
+        device = open_ready(serial_addr, reset=False)   # Without the auto-reset (DTR kept low)
+
+The Arduino resets when its port is opened (the DTR line), and does not listen
+while its bootloader runs. Instead of a fixed 2 s sleep, open_ready asks *IDN?
+every READY_POLL s and returns as soon as the board replies (at once if the
+board did not reset). reset=False opens the port with DTR low, so a board that
+is already running is not reset (this works on Windows; on Linux and macOS
+the driver may still pulse DTR when the port is opened).
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import threading
+import time
+import serial
+
+REPLY_TIMEOUT = 5   # Default deadline for a reply (in s).
+READY_TIMEOUT = 5   # Time given to a board to boot after the port is opened (in s).
+READY_POLL = 0.25   # Time between two *IDN? while waiting for the board (in s).
+
+class SerialTransport(object):
+    # Serial port with a reader thread and blocking reads with deadlines
+
+    def __init__(self, port, baudrate=38400, timeout=0.1, reset=True):
+        # timeout is also the quiet gap that ends a raw packet (see read_packet)
+        # port is a serial address, or an open serial-like object (e.g. arduino_sim.SimSerial)
+        # reset=False keeps DTR low when the port is opened (no auto-reset of the Arduino)
+        if isinstance(port, str):
+            self.serial = serial.Serial(None, baudrate, timeout=timeout)
+            self.serial.port = port
+            if not reset:
+                self.serial.dtr = False
+            self.serial.open()
+        else:
+            self.serial = port
+            self.serial.timeout = timeout
+        self.port = self.serial.port
+        self.timeout = timeout
+        self.identity = None    # Reply to *IDN? (see open_ready)
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._error = None
+        self._closing = False
+        self._thread = threading.Thread(target=self._reader, daemon=True)
+        self._thread.start()
+
+    def _reader(self):
+        # Blocks inside serial.read (up to the serial timeout), so it does not spin
+        while not self._closing:
+            try:
+                data = self.serial.read(self.serial.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError, AttributeError) as e:
+                # TypeError/AttributeError: port closed underneath the read
+                with self._cond:
+                    if not self._closing:
+                        self._error = serial.SerialException(f"{self.port}: {e}")
+                    self._cond.notify_all()
+                return
+            if data:
+                with self._cond:
+                    self._buffer += data
+                    self._cond.notify_all()
+
+    def _wait_for(self, ready, timeout):
+        # Waits (with the condition held) until ready() is true, or raise at the deadline
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not ready():
+            if self._error is not None:
+                raise self._error
+            if self._closing:
+                raise serial.SerialException(f"{self.port} is closed")
+            if deadline is None:
+                self._cond.wait(1)  # Wake up now and then, so Ctrl+C gets through (Windows)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise serial.SerialTimeoutException(f"No reply from {self.port} within {timeout} s")
+                self._cond.wait(remaining)
+
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    @property
+    def is_open(self):
+        return self.serial.is_open and not self._closing
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        return self.serial.write(data)
+
+    def read_reply(self, timeout=REPLY_TIMEOUT):
+        """
+        Returns the next line (decoded, without \\r\\n). timeout=None waits forever.
+        """
+        with self._cond:
+            self._wait_for(lambda: b'\n' in self._buffer, timeout)
+            end = self._buffer.index(b'\n') + 1
+            line = bytes(self._buffer[:end])
+            del self._buffer[:end]
+        return line.decode(errors='replace').strip()
+
+    def read_packet(self, size=8, timeout=None, gap=None):
+        """
+        Returns up to size raw bytes, like `if device.in_waiting: device.read(size)`:
+        waits for the first byte (until the deadline), then for the rest until the
+        line has been quiet for gap (self.timeout by default). timeout=None waits forever.
+        """
+        gap = self.timeout if gap is None else gap
+        with self._cond:
+            self._wait_for(lambda: len(self._buffer) > 0, timeout)
+            while len(self._buffer) < size and self._error is None:
+                count = len(self._buffer)
+                self._cond.wait(gap)
+                if len(self._buffer) == count:
+                    break   # Nothing more is coming
+            packet = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return packet
+
+    def wait_ready(self, timeout=READY_TIMEOUT, poll=READY_POLL):
+        """
+        Asks *IDN? every poll s until the Arduino replies, and returns its identity.
+        Raises serial.SerialTimeoutException if it has not replied after timeout.
+        """
+        deadline = time.monotonic() + timeout
+        attempts = 0
+        while True:
+            self.reset_input_buffer()
+            self.write('*IDN? ')
+            attempts += 1
+            try:
+                reply = self.read_reply(min(poll, max(deadline - time.monotonic(), 0.01)))
+            except serial.SerialTimeoutException:
+                if time.monotonic() >= deadline:
+                    raise serial.SerialTimeoutException(f"No reply from {self.port} within {timeout} s")
+                continue # Still booting
+            if attempts > 1:
+                time.sleep(poll) # Let the late replies to the earlier attempts come in
+            self.reset_input_buffer()
+            return reply
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self.serial.reset_input_buffer()
+            self._buffer.clear()
+
+    def reset_output_buffer(self):
+        self.serial.reset_output_buffer()
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self.serial.close()
+        self._thread.join(timeout=1)
+
+def open_ready(port, baudrate=38400, timeout=0.1, reset=True, ready_timeout=READY_TIMEOUT):
+    """
+    Opens port and waits until the Arduino replies to *IDN? (see wait_ready).
+    Returns the SerialTransport, with the identity in its identity attribute.
+    """
+    device = SerialTransport(port, baudrate, timeout=timeout, reset=reset)
+    try:
+        device.identity = device.wait_ready(ready_timeout)
+    except BaseException:
+        device.close()
+        raise
+    return device
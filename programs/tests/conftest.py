@@ -0,0 +1,17 @@
+'''
+Description: Shared setup of the tests. The programs import their shared modules
+from programs/ (and from their own folder), so both are put on the path here.
+
+Usage: python -m pytest programs/tests
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import sys
+import pathlib
+
+PROGRAMS = pathlib.Path(__file__).resolve().parents[1]
+for folder in (PROGRAMS, PROGRAMS / '2_QuantumKey' / 'AlignmentGUI', PROGRAMS / '3_QKDComm'):
+    sys.path.insert(0, str(folder))
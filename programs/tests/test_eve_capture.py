@@ -0,0 +1,54 @@
+'''
+Description: Tests of the capture format of Eve's readings (eve_capture.py).
+
+Usage: python -m pytest programs/tests/test_eve_capture.py
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import numpy as np
+
+import eve_capture as ec
+
+def readings(pulses=5, width=6, gap=10, dark=20, noise=5, light=300, seed=0):
+    # Pulses of light between dark readings (never exactly 0, as real photodiodes)
+    rng = np.random.default_rng(seed)
+    v = np.full(pulses * (gap + width) + gap, float(dark))
+    for n in range(pulses):
+        v[gap + n*(gap + width):(n + 1)*(gap + width)] = light
+    v1 = np.clip(np.round(v + rng.normal(0, noise, len(v))), 0, 1023)
+    v2 = np.clip(np.round(v / 2 + dark / 2 + rng.normal(0, noise, len(v))), 0, 1023)
+    return v1.astype(np.uint16), v2.astype(np.uint16)
+
+def expected_index(pulses=5, width=6, gap=10):
+    starts = gap + np.arange(pulses) * (gap + width)
+    return starts, starts + width
+
+def test_index_with_dark_level(tmp_path):
+    v1, v2 = readings()
+    path = str(tmp_path / 'capture.cap')
+    with ec.CaptureWriter(path) as capture:
+        capture.append_many(v1[:37], v2[:37], 0) # A block boundary in the middle of a pulse
+        capture.append_many(v1[37:], v2[37:], 0)
+    starts, stops = expected_index()
+    index = ec.load_index(path)
+    assert list(index['start']) == list(starts)
+    assert list(index['stop']) == list(stops)
+    records = ec.load(path)
+    assert list(records['v1']) == list(v1)
+    rebuilt = ec.build_index(records)
+    assert list(rebuilt['start']) == list(starts)
+    assert list(rebuilt['stop']) == list(stops)
+
+def test_index_one_reading_at_a_time(tmp_path):
+    v1, v2 = readings(pulses=3)
+    path = str(tmp_path / 'capture.cap')
+    with ec.CaptureWriter(path) as capture:
+        for a, b in zip(v1, v2):
+            capture.append(int(a), int(b))
+    starts, stops = expected_index(pulses=3)
+    index = ec.load_index(path)
+    assert list(index['start']) == list(starts)
+    assert list(index['stop']) == list(stops)
@@ -0,0 +1,57 @@
+'''
+Description: Runs send_32bitQKD.py and recv_32bitQKD.py with --pipeline on the
+simulated Arduinos (arduino_sim.py --pty, firmware timing), and checks that
+the key files hold exactly --key-bits bits (the extra pipelined round is not
+written into them). Takes about 30 s.
+
+Usage: python -m pytest programs/tests/test_key_file.py
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import os
+import sys
+import subprocess
+import pytest
+
+from conftest import PROGRAMS
+
+KEY_BITS = 20
+
+@pytest.fixture
+def bench():
+    # Pseudo terminals for the simulated boards, {'alice_c': '/dev/pts/3', ...}
+    sim = subprocess.Popen([sys.executable, str(PROGRAMS / 'arduino_sim.py'), '--pty', '--time-scale', '1', '--seed', '1'],
+                           stdout=subprocess.PIPE, text=True)
+    try:
+        ports = {}
+        sim.stdout.readline() # Title
+        while len(ports) < 6:
+            name, kind, address = sim.stdout.readline().split()
+            ports[name] = address
+        yield ports
+    finally:
+        sim.terminate()
+        sim.wait()
+
+@pytest.mark.skipif(os.name != 'posix', reason='pseudo terminals are only available on Linux and macOS')
+def test_pipelined_key_file_length(bench, tmp_path):
+    folder = PROGRAMS / '3_QKDComm'
+    options = ['--pipeline', '--key-bits', str(KEY_BITS)]
+    recv = subprocess.Popen([sys.executable, str(folder / 'recv_32bitQKD.py'), '--cserial', bench['bob_c'], '--qserial', bench['bob_q'],
+                             '--threshold', '300', '--key-file', str(tmp_path / 'bob.txt')] + options,
+                            stdout=subprocess.DEVNULL)
+    try:
+        subprocess.run([sys.executable, str(folder / 'send_32bitQKD.py'), '--cserial', bench['alice_c'], '--qserial', bench['alice_q'],
+                        '--key-file', str(tmp_path / 'alice.txt')] + options,
+                       stdout=subprocess.DEVNULL, timeout=120, check=True)
+        assert recv.wait(timeout=30) == 0
+    finally:
+        recv.kill()
+    keyA = (tmp_path / 'alice.txt').read_text()
+    keyB = (tmp_path / 'bob.txt').read_text()
+    assert len(keyA) == KEY_BITS
+    assert len(keyB) == KEY_BITS
+    assert set(keyA) <= {'0', '1'}
@@ -0,0 +1,44 @@
+'''
+Description: Tests of the Malus' law fit (malus_fit.py).
+
+Usage: python -m pytest programs/tests/test_malus_fit.py
+
+Author: Qcumber 2026
+
+Version: 1.0
+'''
+
+import numpy as np
+import pytest
+
+import malus_fit as mf
+
+def test_fit_without_noise():
+    angles = np.arange(0, 180, 10.0)
+    volts = 0.1 + 1 + 0.8 * np.cos(np.radians(angles - 30) * 2)
+    result = mf.fit(angles, volts, background=0.1)
+    assert result['phase'] == pytest.approx(30)
+    assert result['visibility'] == pytest.approx(0.8)
+    assert result['rejected'] == 0
+
+def test_fit_after_max_rounds():
+    # Outliers of decreasing size at the same angle: each one pulls the fit
+    # towards the next, so every round of rejection finds a new one
+    angles = np.arange(0, 180, 10.0)
+    rng = np.random.default_rng(0)
+    volts = 1 + 0.9 * np.cos(np.radians(angles - 30) * 2) + rng.normal(0, 0.001, len(angles))
+    ladder = 1000 * 3.0 ** -np.arange(8)
+    angles = np.r_[angles, np.full(len(ladder), 40.0)]
+    volts = np.r_[volts, 1 + 0.9 * np.cos(np.radians(10) * 2) + ladder]
+
+    result = mf.fit(angles, volts)
+    kept = result['kept']
+    assert mf.fit(angles[kept], volts[kept])['rejected'] > 0 # Not converged within MAX_ROUNDS
+    # The fit is the one of the points it keeps
+    residuals = volts[kept] - mf.model(angles[kept], result)
+    assert result['rms'] == pytest.approx(np.sqrt(np.mean(residuals**2)))
+    refit = mf.fit(angles[kept], volts[kept], clip=None)
+    assert result['rms'] == pytest.approx(refit['rms'])
+    assert result['visibility'] == pytest.approx(refit['visibility'])
+    assert result['visibility_error'] == pytest.approx(refit['visibility_error'])
+    assert result['rejected'] == len(volts) - kept.sum()